@@ -0,0 +1,68 @@
+"""Per-call latency of make_wmata_request: one client per call vs the pooled client.
+
+Usage: python benchmarks/bench_http_client.py [--calls 200] [--latency 0.0]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_wmata import FakeWMATA
+
+
+async def per_call_client(url: str) -> dict | None:
+    """The pre-pooling implementation: a fresh AsyncClient for every request"""
+    import httpx
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, headers={"api_key": ""}, timeout=30.0)
+        response.raise_for_status()
+        return response.json()
+
+
+async def measure(fetch, url: str, calls: int) -> list[float]:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        data = await fetch(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert data and "Trains" in data
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean {statistics.mean(timings):7.3f} ms   "
+          f"p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+async def main(calls: int, latency: float) -> None:
+    with FakeWMATA(latency=latency) as server:
+        os.environ["WMATA_API_BASE"] = server.base_url
+        import wmata
+
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+        url = f"{wmata.WMATA_API_BASE}/StationPrediction.svc/json/GetPrediction/B03"
+        before = await measure(per_call_client, url, calls)
+        after = await measure(wmata.make_wmata_request, url, calls)
+        await wmata.close_http_client()
+
+    print(f"{calls} sequential GetPrediction calls, injected latency {latency * 1000:.1f} ms")
+    report("client per call", before)
+    report("pooled client", after)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="server-side delay in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.latency))
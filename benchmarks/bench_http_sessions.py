@@ -0,0 +1,131 @@
+"""Load test the streamable HTTP mode: many concurrent MCP sessions against one server process.
+
+Starts `python wmata.py --transport streamable-http` against the fake WMATA
+server, then opens --clients sessions at once. Each session initializes,
+calls a few tools and closes. Reports sessions per second, session and tool
+call latency, and how many upstream calls all those sessions cost between
+them, which shows the client, cache and rate budget being shared.
+
+Usage: python benchmarks/bench_http_sessions.py [--clients 100,200] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["WMATA_DATA_DIR"] = tempfile.mkdtemp(prefix="wmata-bench-")
+
+import fixtures
+import httpx
+import wmata
+from fake_wmata import FakeWMATA
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+
+STATIONS = ["Metro Center", "Union Station", "Gallery Place", "Rosslyn", "Dupont Circle", "Pentagon",
+            "Silver Spring", "Vienna", "Navy Yard", "Foggy Bottom"]
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    sys.exit(f"server did not start listening on port {port}")
+
+
+async def session(url: str, http: httpx.AsyncClient, i: int, tool_ms: list[float]) -> float:
+    """One client session; returns its duration in milliseconds"""
+    start = time.perf_counter()
+    async with streamable_http_client(url, http_client=http) as (read, write, _), \
+            ClientSession(read, write) as client:
+        await client.initialize()
+        origin, destination = STATIONS[i % len(STATIONS)], STATIONS[(i + 3) % len(STATIONS)]
+        for tool, arguments in (("get_train_prediction", {"station": origin}),
+                                ("get_service_alerts", {}),
+                                ("plan_trip", {"from_station": origin, "to_station": destination})):
+            call_start = time.perf_counter()
+            result = await client.call_tool(tool, arguments)
+            tool_ms.append((time.perf_counter() - call_start) * 1000)
+            if result.isError:
+                raise RuntimeError(f"{tool} failed: {result.content}")
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(url: str, clients: int) -> None:
+    tool_ms: list[float] = []
+    # One pooled client for every session, so the load generator is not what gets measured;
+    # each session keeps a GET stream open, so the pool must not cap connections
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=300.0),
+                                 limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)) as http:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(session(url, http, i, tool_ms) for i in range(clients)),
+                                       return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    session_ms = sorted(r for r in results if isinstance(r, float))
+    failures = [r for r in results if not isinstance(r, float)]
+    tool_ms.sort()
+    print(f"{clients:>7} {len(session_ms) / elapsed:12.1f} {percentile(session_ms, 0.5):9.1f} "
+          f"{percentile(session_ms, 0.95):9.1f} {percentile(tool_ms, 0.5):9.1f} {percentile(tool_ms, 0.95):9.1f} "
+          f"{percentile(tool_ms, 0.99):9.1f} {len(failures):8}")
+    if failures:
+        print(f"        first failure: {failures[0]!r}")
+
+
+async def main(client_counts: list[int], latency: float) -> None:
+    logging.disable(logging.WARNING)
+    fixtures.static_snapshot().save(wmata.STATIC_DATA_PATH)
+    wmata.StationMatrix.from_response(fixtures.station_to_station()).save(wmata.MATRIX_PATH)
+
+    with FakeWMATA(fixtures.server_fixtures(), latency=latency) as server:
+        port = free_port()
+        # The benchmark measures the server, not WMATA's rate limit
+        env = {**os.environ, "WMATA_API_BASE": server.base_url, "WMATA_API_KEY": "bench",
+               "WMATA_RATE_LIMIT_PER_SECOND": "1000000", "WMATA_RATE_LIMIT_BURST": "1000000",
+               "WMATA_DAILY_QUOTA": "1000000"}
+        process = subprocess.Popen([sys.executable, "wmata.py", "--transport", "streamable-http",
+                                    "--port", str(port), "--log-level", "WARNING"], cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            url = f"http://127.0.0.1:{port}/mcp"
+            print(f"one server process, {latency * 1000:.0f} ms upstream latency, 3 tool calls per session")
+            print(f"{'clients':>7} {'sessions/s':>12} {'sess p50':>9} {'sess p95':>9} "
+                  f"{'tool p50':>9} {'tool p95':>9} {'tool p99':>9} {'failures':>8}   (ms)")
+            for clients in client_counts:
+                before = sum(server.calls.values())
+                await run(url, clients)
+                print(f"        upstream calls for {clients} sessions: {sum(server.calls.values()) - before}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", default="100,200", help="comma-separated concurrent session counts")
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.clients.split(",")], args.latency))
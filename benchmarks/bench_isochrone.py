@@ -0,0 +1,57 @@
+"""Travel time matrix: build cost and reachability / meet-up query latency.
+
+Builds the dense station-to-station matrix from the rail network once, then
+times --queries reachability queries from one and three origins and
+meet-up searches for groups of five, all on random stations, with and
+without NumPy.
+
+Usage: python benchmarks/bench_isochrone.py [--queries 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["WMATA_DATA_DIR"] = tempfile.mkdtemp(prefix="wmata-bench-")
+
+import fixtures
+import wmata
+
+
+def timed(label: str, queries: int, query) -> None:
+    start = time.perf_counter()
+    for i in range(queries):
+        query(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {elapsed / queries * 1e6:9.1f} us per query")
+
+
+def main(queries: int) -> None:
+    wmata.install_static_data(fixtures.static_snapshot())
+    wmata.install_station_matrix(wmata.StationMatrix.from_response(fixtures.station_to_station()))
+    start = time.perf_counter()
+    wmata.RAIL_NETWORK.precompute()
+    print(f"all-pairs shortest paths             {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    rng = random.Random(1)
+    for label, numpy_module in (("numpy", wmata._numpy()), ("pure Python", False)):
+        wmata._numpy_module = numpy_module
+        start = time.perf_counter()
+        times = wmata.TravelTimes(wmata.RAIL_NETWORK)
+        print(f"\n{label}: {len(times.codes)} stations, matrix built in {(time.perf_counter() - start) * 1000:.1f} ms")
+        origins = [[rng.choice(times.codes) for _ in range(5)] for _ in range(queries)]
+        timed("reachable within 20 min, 1 origin", queries, lambda i: times.reachable(origins[i][:1], 20))
+        timed("reachable within 20 min, 3 origins", queries, lambda i: times.reachable(origins[i][:3], 20))
+        timed("meet-up for 5 people", queries, lambda i: times.meetup(origins[i], 5))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.queries)
@@ -0,0 +1,53 @@
+"""Overhead of the metrics instrumentation on tool calls and upstream requests.
+
+Usage: python benchmarks/bench_metrics.py [--number 200000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import wmata
+
+
+async def plain_tool(station: str) -> str:
+    return station
+
+
+async def call_many(fn, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await fn("A01")
+    return (time.perf_counter() - start) / number * 1e9
+
+
+def main(number: int) -> None:
+    # Registers a throwaway tool on the server; harmless in a benchmark process
+    instrumented = wmata.instrumented_tool(name="bench_noop")(plain_tool)
+    plain_ns = asyncio.run(call_many(plain_tool, number))
+    instrumented_ns = asyncio.run(call_many(instrumented, number))
+    print(f"{number} calls of a no-op async tool")
+    print(f"plain tool call          {plain_ns:8.1f} ns")
+    print(f"instrumented tool call   {instrumented_ns:8.1f} ns   (+{instrumented_ns - plain_ns:.1f} ns per call)")
+
+    histogram = wmata.Histogram()
+    observe_ns = timeit.timeit(lambda: histogram.observe(0.042), number=number) / number * 1e9
+    upstream_ns = timeit.timeit(lambda: wmata.metrics.record_upstream("GetPrediction", "200", 0.042, 4096),
+                                number=number) / number * 1e9
+    print(f"Histogram.observe        {observe_ns:8.1f} ns")
+    print(f"record_upstream          {upstream_ns:8.1f} ns")
+
+    snapshot_us = timeit.timeit(wmata.metrics.snapshot, number=1000) / 1000 * 1e6
+    prometheus_us = timeit.timeit(wmata.metrics.prometheus, number=1000) / 1000 * 1e6
+    print(f"metrics.snapshot()       {snapshot_us:8.1f} us (per resource read)")
+    print(f"metrics.prometheus()     {prometheus_us:8.1f} us (per resource read)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200000)
+    main(parser.parse_args().number)
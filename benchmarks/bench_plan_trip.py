@@ -0,0 +1,67 @@
+"""Trip planning latency: the plan_trip tool vs the four tools it replaces, called one after another.
+
+Every upstream call gets --latency seconds from the fake server and the
+response cache is cleared before each trip, so the sequential tools pay the
+latency once per tool and plan_trip pays it once per trip.
+
+Usage: python benchmarks/bench_plan_trip.py [--trips 20] [--latency 0.1]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_wmata import FakeWMATA
+
+TRIPS = [("Shady Grove", "Rosslyn"), ("Union Station", "Pentagon"), ("Vienna", "Navy Yard"),
+         ("Silver Spring", "Foggy Bottom"), ("Gallery Place", "Huntington")]
+
+
+async def main(trips: int, latency: float) -> None:
+    os.environ["WMATA_DATA_DIR"] = tempfile.mkdtemp(prefix="wmata-bench-")
+    # The benchmark measures the server, not WMATA's rate limit
+    for name in ("WMATA_RATE_LIMIT_PER_SECOND", "WMATA_RATE_LIMIT_BURST", "WMATA_DAILY_QUOTA"):
+        os.environ.setdefault(name, "1000000")
+    logging.disable(logging.INFO)
+    import fixtures
+    import wmata
+
+    with FakeWMATA(fixtures.server_fixtures(), latency=latency) as server:
+        wmata.WMATA_API_BASE = server.base_url
+        # The fare matrix is normally loaded at startup; fetch it up front so both sides use it
+        await wmata.get_station_matrix()
+
+        async def sequential(origin: str, destination: str) -> None:
+            await wmata.mcp.call_tool("get_station_to_station_info",
+                                      {"from_station": origin, "to_station": destination})
+            await wmata.mcp.call_tool("get_service_alerts", {})
+            await wmata.mcp.call_tool("get_train_prediction", {"station": origin})
+            await wmata.mcp.call_tool("get_elevator_outages", {"station": origin})
+
+        async def combined(origin: str, destination: str) -> None:
+            await wmata.mcp.call_tool("plan_trip", {"from_station": origin, "to_station": destination})
+
+        print(f"{trips} trips, {latency * 1000:.0f} ms upstream latency, cold cache per trip")
+        for label, plan in (("4 tools in sequence", sequential), ("plan_trip", combined)):
+            samples = []
+            for i in range(trips):
+                wmata.response_cache.clear()
+                start = time.perf_counter()
+                await plan(*TRIPS[i % len(TRIPS)])
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<20} median {statistics.median(samples):8.1f} ms   max {max(samples):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trips", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(main(args.trips, args.latency))
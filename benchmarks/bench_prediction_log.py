@@ -0,0 +1,95 @@
+"""Prediction log: recording cost, size on disk and query latency over weeks of data.
+
+Records one day of GetPrediction/All snapshots (one a minute, with varying
+minutes and car counts) through PredictionLog.load, then copies that day's
+columns forward with shifted times until the log holds --days days. Reports
+the cost of logging one snapshot, the bytes per row and on disk, and the
+latency of the wait time and train length queries over the whole log.
+
+Usage: python benchmarks/bench_prediction_log.py [--days 28] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["WMATA_DATA_DIR"] = tempfile.mkdtemp(prefix="wmata-bench-")
+
+import fixtures
+import numpy as np
+import wmata
+
+
+def snapshots(count: int, seed: int = 1):
+    """GetPrediction/All responses with each train's minutes and cars varied"""
+    base = fixtures.predictions()["Trains"]
+    rng = random.Random(seed)
+    for _ in range(count):
+        trains = []
+        for train in base:
+            minutes = rng.randint(-1, 15)
+            trains.append({**train, "Min": "BRD" if minutes < 0 else "ARR" if minutes == 0 else str(minutes),
+                           "Car": rng.choice(("6", "8", "8"))})
+        yield {"Trains": trains}
+
+
+def timed(repeat: int, query) -> float:
+    """Median milliseconds of a query"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(days: int, repeat: int) -> None:
+    directory = os.path.join(os.environ["WMATA_DATA_DIR"], "prediction_log")
+    log = wmata.PredictionLog(directory, wmata.PREDICTION_LOG_RING_ROWS, 60.0)
+    first_day = (int(time.time()) // 86400 - days) * 86400
+    load_seconds = 0.0
+    for i, snapshot in enumerate(snapshots(1440)):
+        start = time.perf_counter()
+        log.load(snapshot, at=first_day + i * 60)
+        load_seconds += time.perf_counter() - start
+    log.close()
+    rows_per_day = log.disk_rows
+    print(f"recording: {load_seconds / 1440 * 1000:.2f} ms per snapshot of {rows_per_day // 1440} predictions")
+
+    # Copy the first day forward; rows stay in time order
+    for name, code in log.COLUMNS.items():
+        path = os.path.join(directory, f"{name}.col")
+        day = np.fromfile(path, dtype=code)
+        with open(path, "ab") as f:
+            for n in range(1, days):
+                (day + n * 86400 if name == "time" else day).astype(code).tofile(f)
+    log = wmata.PredictionLog(directory, wmata.PREDICTION_LOG_RING_ROWS, 60.0)
+    size = sum(os.path.getsize(os.path.join(directory, f"{name}.col")) for name in log.COLUMNS)
+    print(f"log: {days} days, {log.rows:,} rows, {size / 2 ** 20:.0f} MiB on disk "
+          f"({size / log.rows:.0f} bytes per row)")
+
+    since = first_day
+    metro_center = wmata.STATIONS.codes("C01")
+    queries = {
+        "average wait, Metro Center RD 8-9am": lambda: log.wait_stats(since, metro_center, "RD", (480, 540)),
+        "average wait, Metro Center all day": lambda: log.wait_stats(since, metro_center),
+        "train lengths, whole system": lambda: log.train_lengths(since),
+        "train lengths, BL weekdays 7-10am": lambda: log.train_lengths(since, None, "BL", (420, 600), True),
+        "average wait, last 7 days only": lambda: log.wait_stats(since + (days - 7) * 86400, metro_center, "RD"),
+    }
+    for label, query in queries.items():
+        print(f"{label:<40} {timed(repeat, query):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.days, args.repeat)
@@ -0,0 +1,91 @@
+"""Record one pass of every tool against the fake WMATA server, then replay it offline.
+
+The record pass calls each tool --requests times with WMATA_RECORD set and
+reports the archive's size against the raw JSON it holds. The fake server is
+then shut down and the same calls are answered from the archive with
+WMATA_REPLAY_SPEED=0, with the response cache cleared before every call so
+each one reaches the archive. Reports how long opening the archive took,
+replayed tool calls per second and how many upstream lookups missed.
+
+Usage: python benchmarks/bench_replay.py [--requests 50] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_tools import cases
+from fake_wmata import FakeWMATA
+
+
+async def call_every_tool(wmata, requests: int, clear_cache: bool) -> int:
+    calls = 0
+    for i in range(requests):
+        for tool, arguments in cases(i).items():
+            if clear_cache:
+                wmata.response_cache.clear()
+            await wmata.mcp.call_tool(tool, arguments)
+            calls += 1
+    return calls
+
+
+async def main(requests: int, latency: float) -> None:
+    data_dir = tempfile.mkdtemp(prefix="wmata-bench-")
+    os.environ["WMATA_DATA_DIR"] = data_dir
+    # Recording needs enough rate budget to finish quickly; replay never touches it
+    for name in ("WMATA_RATE_LIMIT_PER_SECOND", "WMATA_RATE_LIMIT_BURST", "WMATA_DAILY_QUOTA"):
+        os.environ.setdefault(name, "1000000")
+    logging.disable(logging.INFO)
+    import fixtures
+    import wmata
+
+    archive = os.path.join(data_dir, "traffic.wmra")
+    wmata.RECORD_PATH = archive
+    with FakeWMATA(fixtures.server_fixtures(), latency=latency) as server:
+        wmata.WMATA_API_BASE = server.base_url
+        await wmata.get_station_matrix()
+        start = time.perf_counter()
+        calls = await call_every_tool(wmata, requests, clear_cache=True)
+        elapsed = time.perf_counter() - start
+        upstream = sum(server.calls.values())
+    records = wmata.traffic_recorder.records
+    wmata.traffic_recorder.file.close()
+    print(f"record: {calls} tool calls in {elapsed:.1f} s, {upstream} upstream calls, {records} records")
+
+    raw_bytes = 0
+    replay = wmata.TrafficReplay(archive, 0)
+    for _, entries in replay.index.values():
+        raw_bytes += sum(len(json.dumps(replay._body(offset, length), separators=(",", ":")))
+                         for offset, length, _ in entries if length)
+    size = os.path.getsize(archive)
+    print(f"archive: {size / 1024:.0f} KiB for about {raw_bytes / 1024:.0f} KiB of responses "
+          f"({raw_bytes / size:.1f}x smaller), {len(replay.index)} distinct requests")
+
+    # Offline from here: the fake server is gone and the base URL points at the real API
+    wmata.WMATA_API_BASE = "https://api.wmata.com"
+    wmata.RECORD_PATH, wmata.traffic_recorder = None, None
+    wmata.REPLAY_PATH, wmata.REPLAY_SPEED = archive, 0.0
+    start = time.perf_counter()
+    wmata.open_traffic_archive()
+    print(f"replay: archive indexed in {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    calls = await call_every_tool(wmata, requests, clear_cache=True)
+    elapsed = time.perf_counter() - start
+    stats = wmata.traffic_replay.stats()
+    print(f"replay: {calls} tool calls in {elapsed:.2f} s ({calls / elapsed:.0f} calls/s), "
+          f"{stats['hits']} upstream lookups answered, {stats['misses']} missed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency))
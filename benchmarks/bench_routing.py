@@ -0,0 +1,41 @@
+"""Route every origin/destination station pair through the rail network graph.
+
+Usage: python benchmarks/bench_routing.py
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import wmata
+
+
+def main() -> None:
+    start = time.perf_counter()
+    network = wmata.RailNetwork(wmata.LINE_SEQUENCES, wmata.STATIONS)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    network.precompute()
+    precompute_ms = (time.perf_counter() - start) * 1000
+
+    codes = sorted(set(wmata.STATION_MAPPING.values()))
+    pairs = [(a, b) for a in codes for b in codes if a != b]
+    transfers = Counter()
+    start = time.perf_counter()
+    for a, b in pairs:
+        route = network.route(a, b)
+        transfers[route.transfers if route else None] += 1
+    route_s = time.perf_counter() - start
+
+    print(f"{len(network.nodes)} nodes, {sum(map(len, network.adjacency))} directed edges, {len(codes)} stations")
+    print(f"graph build        {build_ms:8.2f} ms")
+    print(f"all-pairs tables   {precompute_ms:8.2f} ms (once, on first route)")
+    print(f"{len(pairs)} routes     {route_s * 1000:8.2f} ms total, {route_s / len(pairs) * 1e6:.1f} us per route")
+    print("transfers per route:", dict(sorted(transfers.items(), key=lambda item: str(item[0]))))
+
+
+if __name__ == "__main__":
+    main()
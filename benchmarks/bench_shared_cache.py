@@ -0,0 +1,85 @@
+"""Upstream calls made by several local wmata.py processes, with and without the shared cache.
+
+Starts 1, 2, 4 and 8 worker processes against the fake WMATA server. Each
+worker calls the real-time tools in a loop for --duration seconds with a
+short cache TTL, the way several stdio servers on one machine would. Without
+the shared cache upstream calls grow with the number of processes; with it
+they should stay about where one process is.
+
+Usage: python benchmarks/bench_shared_cache.py [--processes 1,2,4,8] [--duration 5] [--ttl 1]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STATIONS = ["Metro Center", "Union Station", "Gallery Place", "Rosslyn"]
+
+
+async def work(start_at: float, duration: float) -> None:
+    """Worker process: call the real-time tools until the shared deadline"""
+    logging.disable(logging.INFO)
+    import wmata
+
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    i = 0
+    while time.time() < start_at + duration:
+        await wmata.mcp.call_tool("get_train_prediction", {"station": STATIONS[i % len(STATIONS)]})
+        await wmata.mcp.call_tool("get_service_alerts", {})
+        i += 1
+        await asyncio.sleep(0.01)
+    print(i)
+
+
+def run(processes: int, duration: float, env: dict) -> tuple[int, int]:
+    """Tool call loops completed and upstream calls made by a batch of workers"""
+    from fake_wmata import FakeWMATA
+    import fixtures
+
+    with FakeWMATA(fixtures.server_fixtures()) as server:
+        # Workers import wmata (about a second each) before the common start time
+        start_at = time.time() + 1.5 + processes * 0.5
+        workers = [subprocess.Popen([sys.executable, __file__, "--worker", str(start_at), str(duration)],
+                                    env={**env, "WMATA_API_BASE": server.base_url},
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                   for _ in range(processes)]
+        loops = sum(int(worker.communicate()[0].strip() or 0) for worker in workers)
+        return loops, sum(server.calls.values())
+
+
+def main(process_counts: list[int], duration: float, ttl: float) -> None:
+    data_dir = tempfile.mkdtemp(prefix="wmata-bench-")
+    base_env = {**os.environ, "WMATA_DATA_DIR": data_dir, "WMATA_API_KEY": "bench",
+                "WMATA_CACHE_TTLS": f"GetPrediction={ttl},Incidents={ttl}",
+                "WMATA_RATE_LIMIT_PER_SECOND": "1000000", "WMATA_RATE_LIMIT_BURST": "1000000",
+                "WMATA_DAILY_QUOTA": "1000000"}
+    print(f"{duration:.0f} s per run, cache TTL {ttl:g} s for predictions and incidents")
+    print(f"{'processes':>9} {'shared':>7} {'tool loops':>11} {'upstream calls':>15} {'calls/s':>8}")
+    for processes in process_counts:
+        for shared in (False, True):
+            env = dict(base_env)
+            if shared:
+                env["WMATA_SHARED_CACHE"] = "1"
+                env["WMATA_SHARED_CACHE_PATH"] = os.path.join(data_dir, f"shared-{processes}.sqlite")
+            loops, calls = run(processes, duration, env)
+            print(f"{processes:>9} {'yes' if shared else 'no':>7} {loops:>11} {calls:>15} {calls / duration:>8.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        asyncio.run(work(float(sys.argv[2]), float(sys.argv[3])))
+        sys.exit()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", default="1,2,4,8", help="comma-separated process counts")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--ttl", type=float, default=1.0)
+    args = parser.parse_args()
+    main([int(n) for n in args.processes.split(",")], args.duration, args.ttl)
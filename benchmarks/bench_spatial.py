@@ -0,0 +1,65 @@
+"""Nearest station/entrance queries: vectorized NumPy haversine vs the pure-Python fallback.
+
+Usage: python benchmarks/bench_spatial.py [--queries 10000] [--points 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures
+import wmata
+
+
+def build(numpy: bool, stations, entrances):
+    # The module picks its backend on first use; reset it to compare both
+    wmata._numpy_module = None if numpy else False
+    return wmata.build_spatial_indexes(stations, entrances)
+
+
+def per_query_us(index, number: int) -> float:
+    return timeit.timeit(lambda: index.nearest(38.8983, -77.0281, 5), number=number) / number * 1e6
+
+
+def main(queries: int, points: int) -> None:
+    stations = fixtures.stations()["Stations"]
+    entrances = fixtures.entrances()["Entrances"]
+    rng = random.Random(0)
+    # A denser synthetic set, e.g. bus stops, to show how the scan scales
+    many = [{"Lat": 38.9 + rng.uniform(-0.2, 0.2), "Lon": -77.03 + rng.uniform(-0.25, 0.25), "Name": str(i)}
+            for i in range(points)]
+
+    print(f"{len(stations)} stations, {len(entrances)} entrances, {points} synthetic points")
+    for label, numpy in (("numpy", True), ("python", False)):
+        station_index, entrance_index = build(numpy, stations, entrances)
+        _, many_index = build(numpy, [], many)
+        print(f"{label:<7} k=5 query: stations {per_query_us(station_index, 2000):8.1f} us   "
+              f"entrances {per_query_us(entrance_index, 2000):8.1f} us   "
+              f"{points} points {per_query_us(many_index, 200):9.1f} us")
+
+    _, entrance_index = build(True, stations, entrances)
+    lats = [38.9 + rng.uniform(-0.1, 0.1) for _ in range(queries)]
+    lons = [-77.03 + rng.uniform(-0.15, 0.15) for _ in range(queries)]
+    start = time.perf_counter()
+    for lat, lon in zip(lats, lons):
+        entrance_index.nearest(lat, lon, 3)
+    looped = time.perf_counter() - start
+    start = time.perf_counter()
+    for chunk in range(0, queries, 1000):
+        entrance_index.nearest_many(lats[chunk:chunk + 1000], lons[chunk:chunk + 1000], 3)
+    batched = time.perf_counter() - start
+    print(f"bulk {queries} queries over entrances, k=3: one at a time {looped * 1000:8.1f} ms   "
+          f"nearest_many {batched * 1000:8.1f} ms ({looped / batched:4.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--points", type=int, default=10000)
+    args = parser.parse_args()
+    main(args.queries, args.points)
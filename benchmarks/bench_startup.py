@@ -0,0 +1,108 @@
+"""Startup cost: time to the first initialize response, peak RSS, and snapshot loading.
+
+The handshake runs `python wmata.py` the way Claude Desktop does, sends an
+MCP initialize request over stdio and times the response. With --budget-ms
+or --budget-rss-mb the script exits non-zero when the median handshake or
+the peak RSS goes over budget, so it can guard startup in CI.
+
+Usage: python benchmarks/bench_startup.py [--repeat 20] [--budget-ms 1000] [--budget-rss-mb 96]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["WMATA_DATA_DIR"] = tempfile.mkdtemp(prefix="wmata-bench-")
+
+import fixtures
+import wmata
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2025-03-26", "capabilities": {},
+               "clientInfo": {"name": "bench_startup", "version": "1.0"}},
+}
+
+
+def handshake() -> tuple[float, float]:
+    """Milliseconds from spawning the server to its initialize response, and its peak RSS in MiB"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "wmata.py"], cwd=ROOT, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    process.stdin.write((json.dumps(INITIALIZE) + "\n").encode())
+    process.stdin.flush()
+    response = json.loads(process.stdout.readline())
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.get("id") == 1 and "result" in response, response
+    # Closing stdin ends the stdio session; wait4 reports the child's own peak RSS (KiB on Linux)
+    process.stdin.close()
+    _, _, usage = os.wait4(process.pid, 0)
+    process.returncode = 0
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main(repeat: int, budget_ms: float | None, budget_rss_mb: float | None) -> None:
+    snapshot = fixtures.static_snapshot()
+    snapshot.save(wmata.STATIC_DATA_PATH)
+    matrix = wmata.StationMatrix.from_response(fixtures.station_to_station())
+    matrix.save(wmata.MATRIX_PATH)
+
+    runs = max(3, repeat // 4)
+    floor_samples, import_samples = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import mcp.server.fastmcp"], cwd=ROOT, check=True)
+        floor_samples.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import wmata"], cwd=ROOT, check=True)
+        import_samples.append((time.perf_counter() - start) * 1000)
+    handshakes = [handshake() for _ in range(runs)]
+    handshake_ms = statistics.median(elapsed for elapsed, _ in handshakes)
+    peak_rss = max(rss for _, rss in handshakes)
+
+    print(f"snapshot: {len(snapshot.stations)} stations, {len(snapshot.entrances)} entrances, "
+          f"{os.path.getsize(wmata.STATIC_DATA_PATH) / 1024:.0f} KiB; "
+          f"matrix {os.path.getsize(wmata.MATRIX_PATH) / 1024:.0f} KiB")
+    print(f"import mcp.server.fastmcp  {statistics.median(floor_samples):8.2f} ms (process start + MCP SDK, the floor)")
+    print(f"python -c 'import wmata'   {statistics.median(import_samples):8.2f} ms (process start + imports)")
+    print(f"initialize response        {handshake_ms:8.2f} ms (python wmata.py over stdio)")
+    print(f"peak RSS                   {peak_rss:8.2f} MiB")
+    print(f"load snapshot              {timed(lambda: wmata.StaticDataSnapshot.load(wmata.STATIC_DATA_PATH), repeat):8.2f} ms")
+    print(f"load matrix                {timed(lambda: wmata.StationMatrix.load(wmata.MATRIX_PATH), repeat):8.2f} ms")
+    print(f"install snapshot + indexes {timed(lambda: wmata.install_static_data(snapshot), repeat):8.2f} ms")
+    print(f"load_static_data (total)   {timed(wmata.load_static_data, repeat):8.2f} ms")
+
+    over = []
+    if budget_ms is not None and handshake_ms > budget_ms:
+        over.append(f"initialize response {handshake_ms:.0f} ms > {budget_ms:.0f} ms")
+    if budget_rss_mb is not None and peak_rss > budget_rss_mb:
+        over.append(f"peak RSS {peak_rss:.1f} MiB > {budget_rss_mb:.0f} MiB")
+    if over:
+        sys.exit("over startup budget: " + "; ".join(over))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, help="fail if the median initialize response is slower")
+    parser.add_argument("--budget-rss-mb", type=float, help="fail if peak RSS is higher")
+    args = parser.parse_args()
+    main(args.repeat, args.budget_ms, args.budget_rss_mb)
@@ -0,0 +1,51 @@
+"""Station lookup cost: linear scans over STATION_MAPPING vs the StationRegistry indexes.
+
+Usage: python benchmarks/bench_station_lookup.py [--number 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import wmata
+
+CASES = {
+    "code -> name": (
+        "next((name for name, code in STATION_MAPPING.items() if code == target), target)",
+        "STATIONS.name(target, target)",
+    ),
+    "is station code": (
+        "target in STATION_MAPPING.values()",
+        "STATIONS.is_code(target)",
+    ),
+}
+
+
+def main(number: int) -> None:
+    # The last station in the mapping is the worst case for a linear scan
+    target = list(wmata.STATION_MAPPING.values())[-1]
+    namespace = {
+        "STATION_MAPPING": wmata.STATION_MAPPING,
+        "STATIONS": wmata.STATIONS,
+        "target": target,
+    }
+    print(f"{len(wmata.STATION_MAPPING)} stations, target {target}, {number} lookups each")
+    for label, (before, after) in CASES.items():
+        before_ns = timeit.timeit(before, globals=namespace, number=number) / number * 1e9
+        after_ns = timeit.timeit(after, globals=namespace, number=number) / number * 1e9
+        print(f"{label:<16} scan {before_ns:9.1f} ns   registry {after_ns:7.1f} ns   "
+              f"({before_ns / after_ns:5.1f}x)")
+
+    build = timeit.timeit(
+        lambda: wmata.StationRegistry(wmata.STATION_MAPPING, wmata.STATION_LINES, wmata.TRANSFER_STATION_CODES),
+        number=200,
+    ) / 200 * 1e6
+    print(f"registry build   {build:9.1f} us (once, at import)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    main(parser.parse_args().number)
@@ -0,0 +1,45 @@
+"""Station search latency for exact names, aliases, prefixes, typos and ambiguous queries.
+
+Usage: python benchmarks/bench_station_search.py [--number 2000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import wmata
+
+QUERIES = {
+    "exact name": "Foggy Bottom-GWU",
+    "alias": "DCA",
+    "prefix": "dupont",
+    "typo": "rosslin",
+    "typo, two words": "dupont circel",
+    "ambiguous": "center",
+}
+
+
+def main(number: int) -> None:
+    index = wmata.STATION_SEARCH
+    index.ensure_built()
+    print(f"{len(index.terms)} search terms, {number} lookups each")
+    for label, query in QUERIES.items():
+        uncached = timeit.timeit(lambda: index._search(query, 5), number=number) / number * 1e6
+        cached = timeit.timeit(lambda: index.search(query, 5), number=number) / number * 1e6
+        resolved = wmata.get_station_code(query) or "ambiguous"
+        top = ", ".join(f"{m.code} {m.score:.2f}" for m in index.search(query, 3))
+        print(f"{label:<16} {query!r:<20} uncached {uncached:7.1f} us   cached {cached:5.2f} us   "
+              f"-> {resolved:<9} [{top}]")
+
+    build = timeit.timeit(
+        lambda: wmata.StationSearchIndex(wmata.STATIONS, wmata.STATION_ALIASES).ensure_built(), number=20
+    ) / 20 * 1e3
+    print(f"index build      {build:.2f} ms (once, on first search)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    main(parser.parse_args().number)
@@ -0,0 +1,132 @@
+"""Load test every tool against the fake WMATA server at increasing concurrency.
+
+Each tool is called --requests times per concurrency level through
+FastMCP's call_tool, so argument validation is included. The response cache
+is cleared before each level; the static snapshot and fare matrix are
+fetched once up front, as the server does at startup, unless --cold.
+
+Usage: python benchmarks/bench_tools.py [--concurrency 1,4,16,64] [--requests 200]
+           [--latency 0.02] [--error-rate 0.0] [--fixtures DIR] [--cold]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_wmata import FakeWMATA, load_fixtures
+
+STATIONS = ["Metro Center", "Union Station", "Gallery Place", "L'Enfant Plaza", "Rosslyn", "Dupont Circle",
+            "Foggy Bottom", "Pentagon", "Silver Spring", "Vienna", "Shady Grove", "Navy Yard"]
+
+
+def cases(i: int) -> dict:
+    """Arguments for each tool on the i-th call, cycling through stations"""
+    a, b, c = (STATIONS[(i + k) % len(STATIONS)] for k in (0, 5, 9))
+    return {
+        "get_train_prediction": {"station": a},
+        "get_multi_station_predictions": {"stations": [a, b, c]},
+        "get_station_to_station_info": {"from_station": a, "to_station": b},
+        "plan_trip": {"from_station": a, "to_station": c},
+        "get_fare_matrix": {"origins": [a, b], "destinations": [b, c, a]},
+        "get_service_alerts": {},
+        "get_service_alert_changes": {"since": ""},
+        "get_elevator_outages": {"station": a} if i % 2 else {},
+        "get_trains_between": {"from_station": ["Rosslyn", "Gallery Place", "Pentagon"][i % 3],
+                               "to_station": ["Foggy Bottom", "Fort Totten", "L'Enfant Plaza"][i % 3]},
+        "get_line_headways": {"line": ["RD", "BL", "OR", "SV", "GR", "YL"][i % 6]},
+        "get_station_info": {"station": b},
+        "get_all_stations": {},
+        "search_stations": {"query": ["metro cntr", "galery", "union", "navy yd"][i % 4]},
+        "get_reachable_stations": {"stations": [a] if i % 2 else [a, c], "minutes": 10 + i % 20},
+        "find_meetup_station": {"stations": [a, b, c, STATIONS[(i + 2) % len(STATIONS)]]},
+        "find_nearest_stations": {"latitude": 38.8983 + (i % 7) * 0.004, "longitude": -77.0281 - (i % 5) * 0.004},
+    }
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def run_tool(wmata, tool: str, requests: int, concurrency: int) -> tuple[list[float], int, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, errors = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            content = await wmata.mcp.call_tool(tool, cases(i)[tool])
+            timings.append((time.perf_counter() - start) * 1000)
+            if content and content[0].text.startswith("❌"):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return sorted(timings), errors, time.perf_counter() - start
+
+
+async def main(args) -> None:
+    os.environ["WMATA_DATA_DIR"] = tempfile.mkdtemp(prefix="wmata-bench-")
+    # The benchmark measures the server, not WMATA's rate limit
+    for name in ("WMATA_RATE_LIMIT_PER_SECOND", "WMATA_RATE_LIMIT_BURST", "WMATA_DAILY_QUOTA",
+                 "WMATA_RATE_LIMIT_MAX_QUEUE"):
+        os.environ.setdefault(name, "1000000")
+    import wmata
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        import fixtures as synthetic
+
+        fixtures = synthetic.server_fixtures()
+
+    with FakeWMATA(fixtures, latency=args.latency, error_rate=args.error_rate) as server:
+        # Settings are read at import, before the server's port is known; the base URL is read per request
+        wmata.WMATA_API_BASE = server.base_url
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+        tools = [tool.name for tool in await wmata.mcp.list_tools()]
+        missing = sorted(set(tools) - set(cases(0)))
+        if missing:
+            print(f"no benchmark arguments for: {', '.join(missing)}")
+        tools = [tool for tool in tools if tool in cases(0)]
+
+        if not args.cold:
+            start = time.perf_counter()
+            await wmata.refresh_static_data(force=True)
+            print(f"static data and fare matrix loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        print(f"{len(tools)} tools, {args.requests} calls each per level, injected latency "
+              f"{args.latency * 1000:.1f} ms, error rate {args.error_rate:.0%}")
+        for concurrency in args.concurrency:
+            wmata.response_cache.clear()
+            print(f"\nconcurrency {concurrency}")
+            print(f"{'tool':<32}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/s':>10}{'errors':>8}{'upstream':>10}")
+            for tool in tools:
+                upstream_before = sum(server.calls.values())
+                timings, errors, elapsed = await run_tool(wmata, tool, args.requests, concurrency)
+                upstream = sum(server.calls.values()) - upstream_before
+                print(f"{tool:<32}{percentile(timings, 0.5):9.2f}{percentile(timings, 0.95):9.2f}"
+                      f"{percentile(timings, 0.99):9.2f}{args.requests / elapsed:10.0f}{errors:8d}{upstream:10d}")
+
+        print(f"\nupstream calls by endpoint: {dict(sorted(server.calls.items()))}")
+        if server.errors:
+            print(f"injected failures by endpoint: {dict(sorted(server.errors.items()))}")
+        await wmata.close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="server-side delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--fixtures", help="directory of recorded <endpoint>.json responses")
+    parser.add_argument("--cold", action="store_true", help="skip loading static data before the run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,228 @@
+"""Synthetic WMATA API responses built from the bundled station tables.
+
+The shapes follow the real API; values such as coordinates, distances and
+fares are made up but deterministic, which is all the benchmarks need.
+"""
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import wmata
+
+CENTER = (38.8983, -77.0281)  # Metro Center
+
+# Rough compass bearing of each line's first terminal from downtown
+LINE_BEARINGS = {"RD": 315, "OR": 280, "SV": 290, "BL": 200, "YL": 185, "GR": 150}
+
+
+def _codes() -> list[str]:
+    return sorted({code for codes in wmata.LINE_SEQUENCES.values() for code in codes})
+
+
+def _coordinates() -> dict[str, tuple[float, float]]:
+    """Place stations along straight rays out from downtown, in line order"""
+    coordinates = {}
+    for line, codes in wmata.LINE_SEQUENCES.items():
+        center = min(range(len(codes)), key=lambda i: abs(i - len(codes) / 2))
+        for i, code in enumerate(codes):
+            if code in coordinates:
+                continue
+            offset = (i - center) * 0.012
+            bearing = math.radians(LINE_BEARINGS[line])
+            coordinates[code] = (round(CENTER[0] - offset * math.cos(bearing), 6),
+                                 round(CENTER[1] - offset * math.sin(bearing), 6))
+    return coordinates
+
+
+def stations() -> dict:
+    coordinates = _coordinates()
+    together = {code: other for group in wmata.TRANSFER_STATION_CODES for code in group
+                for other in group if other != code}
+    result = []
+    for code in _codes():
+        lines = wmata.STATION_LINES.get(code, [])
+        station = {
+            "Code": code,
+            "Name": wmata.STATIONS.name(code, code),
+            "StationTogether1": together.get(code, ""),
+            "StationTogether2": "",
+            "Lat": coordinates[code][0],
+            "Lon": coordinates[code][1],
+            "Address": {"Street": f"{100 + len(result)} Example St", "City": "Washington", "State": "DC",
+                        "Zip": "20001"},
+        }
+        for i in range(4):
+            station[f"LineCode{i + 1}"] = lines[i] if i < len(lines) else None
+        result.append(station)
+    return {"Stations": result}
+
+
+def lines() -> dict:
+    return {"Lines": [
+        {"LineCode": line, "DisplayName": wmata.LINE_COLORS[line].split()[0],
+         "StartStationCode": codes[0], "EndStationCode": codes[-1],
+         "InternalDestination1": "", "InternalDestination2": ""}
+        for line, codes in wmata.LINE_SEQUENCES.items()
+    ]}
+
+
+def path(line: str) -> dict:
+    codes = wmata.LINE_SEQUENCES[line]
+    return {"Path": [
+        {"LineCode": line, "StationCode": code, "StationName": wmata.STATIONS.name(code, code),
+         "SeqNum": i + 1, "DistanceToPrev": 0 if i == 0 else 5000 + sum(map(ord, code)) * 37 % 4000}
+        for i, code in enumerate(codes)
+    ]}
+
+
+def entrances(per_station: int = 3) -> dict:
+    coordinates = _coordinates()
+    result = []
+    for code in _codes():
+        lat, lon = coordinates[code]
+        for i in range(per_station):
+            result.append({"ID": f"{code}-{i}", "Name": f"{wmata.STATIONS.name(code, code)} entrance {i + 1}",
+                           "StationCode1": code, "StationCode2": "",
+                           "Lat": round(lat + 0.0006 * (i - 1), 6), "Lon": round(lon + 0.0004 * (i - 1), 6),
+                           "Description": f"Street-level entrance {i + 1}"})
+    return {"Entrances": result}
+
+
+def station_to_station() -> dict:
+    network = wmata.RailNetwork(wmata.LINE_SEQUENCES, wmata.STATIONS)
+    infos = []
+    for a in _codes():
+        for b in _codes():
+            if a == b:
+                continue
+            minutes = network.travel_minutes(a, b) or 0
+            infos.append({"SourceStation": a, "DestinationStation": b,
+                          "CompositeMiles": round(minutes / 2, 2), "RailTime": int(minutes * 0.8),
+                          "RailFare": {"PeakTime": round(2.25 + minutes / 20, 2),
+                                       "OffPeakTime": round(2.0 + minutes / 30, 2),
+                                       "SeniorDisabled": round(1.1 + minutes / 40, 2)}})
+    return {"StationToStationInfos": infos}
+
+
+def predictions() -> dict:
+    """Two trains per direction at every station, with deterministic arrival times"""
+    trains = []
+    for line, codes in wmata.LINE_SEQUENCES.items():
+        for i, code in enumerate(codes):
+            for terminal, offset in ((codes[-1], 0), (codes[0], 7)):
+                if terminal == code:
+                    continue
+                for group in range(2):
+                    minutes = (sum(map(ord, code)) + i * 3 + offset + group * 9) % 20
+                    trains.append({
+                        "Car": "8" if (i + group) % 3 else "6",
+                        "Destination": wmata.STATIONS.name(terminal, terminal)[:12],
+                        "DestinationCode": terminal,
+                        "DestinationName": wmata.STATIONS.name(terminal, terminal),
+                        "Group": "1" if terminal == codes[-1] else "2",
+                        "Line": line,
+                        "LocationCode": code,
+                        "LocationName": wmata.STATIONS.name(code, code),
+                        "Min": "ARR" if minutes == 0 else "BRD" if minutes == 1 else str(minutes),
+                    })
+    return {"Trains": trains}
+
+
+def incidents() -> dict:
+    return {"Incidents": [
+        {"IncidentID": "3754F8B2-A0A6-494E-A4B5-82C9E72DFA74", "IncidentType": "Delay",
+         "Description": "Red Line: Expect residual delays to Glenmont due to an earlier equipment problem.",
+         "LinesAffected": "RD;", "DateUpdated": "2024-05-01T08:15:00"},
+        {"IncidentID": "9F3C1C0E-7D0B-4E9B-9C44-2B1E5C9A6E10", "IncidentType": "Alert",
+         "Description": "Blue/Orange/Silver Line: Trains single tracking between Foggy Bottom and Rosslyn.",
+         "LinesAffected": "BL; OR; SV;", "DateUpdated": "2024-05-01T08:20:00"},
+    ]}
+
+
+def elevator_incidents(count: int = 24) -> dict:
+    codes = _codes()
+    outages = []
+    for i in range(count):
+        code = codes[i * 7 % len(codes)]
+        unit_type = "ELEVATOR" if i % 3 else "ESCALATOR"
+        outages.append({
+            "UnitName": f"{code}{'N' if unit_type == 'ELEVATOR' else 'S'}{i:02d}",
+            "UnitType": unit_type,
+            "StationCode": code,
+            "StationName": wmata.STATIONS.name(code, code),
+            "LocationDescription": f"{'Street to mezzanine' if i % 2 else 'Mezzanine to platform'}",
+            "SymptomDescription": "Service Call" if i % 4 else "Major Repair",
+            "DateOutOfServ": "2024-04-30T22:10:00",
+            "DateUpdated": "2024-05-01T07:45:00",
+            "EstimatedReturnToService": "2024-05-03T23:59:59",
+        })
+    return {"ElevatorIncidents": outages}
+
+
+CIRCUITS_PER_SEGMENT = 4
+
+
+def standard_routes() -> dict:
+    """Both tracks of every line: a circuit per station plus a few between each pair"""
+    ids = {}
+
+    def circuit(*key) -> int:
+        # Lines running over the same station or segment share its circuits
+        return ids.setdefault(key, 1000 + len(ids))
+
+    routes = []
+    for line, codes in wmata.LINE_SEQUENCES.items():
+        for track in (1, 2):
+            circuits = []
+            for i, code in enumerate(codes):
+                if i:
+                    a, b = sorted((codes[i - 1], code))
+                    between = [circuit(track, a, b, k) for k in range(CIRCUITS_PER_SEGMENT)]
+                    if a != codes[i - 1]:
+                        between.reverse()
+                    circuits.extend({"CircuitId": c, "StationCode": None} for c in between)
+                circuits.append({"CircuitId": circuit(track, code), "StationCode": code})
+            routes.append({"LineCode": line, "TrackNum": track,
+                           "TrackCircuits": [{"SeqNum": i, **c} for i, c in enumerate(circuits)]})
+    return {"StandardRoutes": routes}
+
+
+def train_positions(spacing: int = 11, tick: int = 0) -> dict:
+    """A train every few circuits in both directions on every line; tick moves them all one circuit"""
+    trains = []
+    for route in standard_routes()["StandardRoutes"]:
+        line, track, circuits = route["LineCode"], route["TrackNum"], route["TrackCircuits"]
+        codes = wmata.LINE_SEQUENCES[line]
+        heading = 1 if track == 1 else -1
+        for n, i in enumerate(range(2 + sum(map(ord, line)) % spacing, len(circuits) - 2, spacing)):
+            i = min(len(circuits) - 1, max(0, i + tick * heading))
+            trains.append({
+                "TrainId": f"{line}{track}{n:02d}", "TrainNumber": f"{track}{n:02d}",
+                "CarCount": 8 if n % 3 else 6, "DirectionNum": track,
+                "CircuitId": circuits[i]["CircuitId"], "DestinationStationCode": codes[-1] if heading > 0 else codes[0],
+                "LineCode": line, "SecondsAtLocation": (n * 7 + tick) % 45, "ServiceType": "Normal",
+            })
+    return {"TrainPositions": trains}
+
+
+def server_fixtures() -> dict:
+    """One response per endpoint, keyed the way FakeWMATA looks them up"""
+    return {
+        "GetPrediction": predictions(),
+        "Incidents": incidents(),
+        "ElevatorIncidents": elevator_incidents(),
+        "TrainPositions": train_positions(),
+        "StandardRoutes": standard_routes(),
+        "jStations": stations(),
+        "jLines": lines(),
+        "jPath": {"Path": [item for line in wmata.LINE_SEQUENCES for item in path(line)["Path"]]},
+        "jStationEntrances": entrances(),
+        "jSrcStationToDstStationInfo": station_to_station(),
+    }
+
+
+def static_snapshot() -> "wmata.StaticDataSnapshot":
+    return wmata.StaticDataSnapshot.from_responses(
+        stations(), lines(), {line: path(line) for line in wmata.LINE_SEQUENCES}, entrances())
@@ -0,0 +1,75 @@
+"""Record WMATA API responses as fixtures for the fake server.
+
+With WMATA_API_KEY set this saves one live response per endpoint; with
+--synthetic it writes the generated fixtures instead, so the benchmarks can
+be run from a fixed set of files either way.
+
+Usage: python benchmarks/record_fixtures.py DIR [--synthetic]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    "GetPrediction": "StationPrediction.svc/json/GetPrediction/All",
+    "Incidents": "Incidents.svc/json/Incidents",
+    "ElevatorIncidents": "Incidents.svc/json/ElevatorIncidents",
+    "TrainPositions": "TrainPositions/TrainPositions?contentType=json",
+    "StandardRoutes": "TrainPositions/StandardRoutes?contentType=json",
+    "jStations": "Rail.svc/json/jStations",
+    "jLines": "Rail.svc/json/jLines",
+    "jStationEntrances": "Rail.svc/json/jStationEntrances",
+    "jSrcStationToDstStationInfo": "Rail.svc/json/jSrcStationToDstStationInfo",
+}
+
+
+def record() -> dict:
+    import httpx
+    import wmata
+
+    recorded = {}
+    with httpx.Client(base_url=wmata.WMATA_API_BASE, headers={"api_key": wmata.WMATA_API_KEY or ""},
+                      timeout=30.0) as client:
+        for endpoint, path in ENDPOINTS.items():
+            response = client.get(path)
+            response.raise_for_status()
+            recorded[endpoint] = response.json()
+        # One file holds every line's path back to back; the fake server splits it again
+        paths = []
+        for line in recorded["jLines"]["Lines"]:
+            response = client.get("Rail.svc/json/jPath", params={"FromStationCode": line["StartStationCode"],
+                                                                 "ToStationCode": line["EndStationCode"]})
+            response.raise_for_status()
+            paths.extend(response.json().get("Path", []))
+        recorded["jPath"] = {"Path": paths}
+    return recorded
+
+
+def main(directory: str, synthetic: bool) -> None:
+    if synthetic:
+        import fixtures
+
+        recorded = fixtures.server_fixtures()
+    elif not os.getenv("WMATA_API_KEY"):
+        sys.exit("Set WMATA_API_KEY to record live responses, or pass --synthetic")
+    else:
+        recorded = record()
+
+    os.makedirs(directory, exist_ok=True)
+    for endpoint, payload in recorded.items():
+        path = os.path.join(directory, f"{endpoint}.json")
+        with open(path, "w") as f:
+            json.dump(payload, f)
+        print(f"{path:<60} {os.path.getsize(path) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--synthetic", action="store_true", help="write generated fixtures instead of live ones")
+    args = parser.parse_args()
+    main(args.directory, args.synthetic)
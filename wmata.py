@@ -1,14 +1,258 @@
-from typing import Any, List, Dict, Optional
-import httpx
+from typing import Any, AsyncIterator, List, Dict, NamedTuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache, wraps
+from urllib.parse import urlencode, urlsplit
+from array import array
+import asyncio
+import bisect
+import heapq
 from mcp.server.fastmcp import FastMCP
 from pydantic import BaseModel
 import json
+import math
 import os
+import random
+import struct
+import sys
+import time
+import weakref
+import zlib
 
-mcp = FastMCP("wmata-metro-guide")
-WMATA_API_BASE = "https://api.wmata.com"
+WMATA_API_BASE = os.environ.get('WMATA_API_BASE', "https://api.wmata.com").rstrip("/")
 WMATA_API_KEY = os.environ.get('WMATA_API_KEY')
 
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment, falling back to the default"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to the default"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean setting such as "1", "true" or "yes" from the environment"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _env_overrides(name: str) -> dict[str, float]:
+    """Parse "Endpoint=value,Endpoint=value" style per-endpoint overrides"""
+    overrides = {}
+    for item in os.environ.get(name, "").split(","):
+        key, _, value = item.partition("=")
+        try:
+            overrides[key.strip()] = float(value)
+        except ValueError:
+            continue
+    return overrides
+
+def _env_positive(name: str, default: float, read=_env_float):
+    """Read a setting that must be greater than zero, warning and using the default otherwise"""
+    value = read(name, default)
+    if value > 0:
+        return value
+    print(f"{name} must be greater than 0, using {default}", file=sys.stderr)
+    return default
+
+# HTTP client settings. One pooled client is shared by every tool call so
+# repeated calls reuse keep-alive connections instead of paying a new
+# TCP+TLS handshake each time.
+HTTP2_ENABLED = _env_flag('WMATA_HTTP2')
+MAX_CONNECTIONS = _env_int('WMATA_MAX_CONNECTIONS', 20)
+MAX_KEEPALIVE_CONNECTIONS = _env_int('WMATA_MAX_KEEPALIVE_CONNECTIONS', 10)
+KEEPALIVE_EXPIRY = _env_float('WMATA_KEEPALIVE_EXPIRY', 30.0)
+CONNECT_TIMEOUT = _env_float('WMATA_CONNECT_TIMEOUT', 5.0)
+DEFAULT_TIMEOUT = _env_float('WMATA_TIMEOUT', 30.0)
+
+# Read timeouts per endpoint, in seconds. Real-time endpoints are small and
+# should answer quickly; the bulk rail endpoints return much larger bodies.
+ENDPOINT_TIMEOUTS = {
+    "GetPrediction": 10.0,
+    "Incidents": 10.0,
+    "ElevatorIncidents": 10.0,
+    "TrainPositions": 10.0,
+    "jStationInfo": 15.0,
+    "jStations": 20.0,
+    "jSrcStationToDstStationInfo": 30.0,
+    **_env_overrides('WMATA_ENDPOINT_TIMEOUTS'),
+}
+
+# Response cache TTLs per endpoint, in seconds. Predictions refresh upstream
+# roughly every 20s; the station tables change a few times a year. Endpoints
+# missing here (or set to 0) are never cached.
+CACHE_TTLS = {
+    "GetPrediction": 15.0,
+    "Incidents": 60.0,
+    "ElevatorIncidents": 120.0,
+    "TrainPositions": 7.0,
+    "StandardRoutes": 86400.0,
+    "jStationInfo": 86400.0,
+    "jStations": 86400.0,
+    "jStationEntrances": 86400.0,
+    "jSrcStationToDstStationInfo": 86400.0,
+    **_env_overrides('WMATA_CACHE_TTLS'),
+}
+CACHE_MAX_ENTRIES = _env_int('WMATA_CACHE_MAX_ENTRIES', 512)
+
+# Optional background polling of the real-time feeds. When enabled, the
+# real-time tools answer from the latest in-memory snapshot.
+POLLING_ENABLED = _env_flag('WMATA_POLLING')
+POLL_INTERVALS = {
+    "predictions": 20.0,
+    "incidents": 60.0,
+    "elevator_incidents": 120.0,
+    "train_positions": 10.0,
+    **_env_overrides('WMATA_POLL_INTERVALS'),
+}
+# A snapshot older than this many poll intervals is not served
+POLL_MAX_AGE_FACTOR = 3
+
+# Where downloaded static data (such as the fare/time matrix) is kept between runs
+DATA_DIR = os.path.expanduser(os.environ.get('WMATA_DATA_DIR', "~/.cache/qs-wmata-mcp-server"))
+MATRIX_TTL = _env_float('WMATA_MATRIX_TTL', 7 * 86400.0)
+STATIC_DATA_TTL = _env_float('WMATA_STATIC_DATA_TTL', 7 * 86400.0)
+
+# Optional response cache shared by every wmata.py process on the machine,
+# so several stdio servers using one API key do not each call WMATA
+SHARED_CACHE_ENABLED = _env_flag('WMATA_SHARED_CACHE')
+SHARED_CACHE_PATH = os.path.expanduser(os.environ.get('WMATA_SHARED_CACHE_PATH',
+                                                      os.path.join(DATA_DIR, "response_cache.sqlite")))
+# Longest a process may hold a key's refresh lease before others fetch it themselves
+SHARED_CACHE_LEASE = _env_float('WMATA_SHARED_CACHE_LEASE', 10.0)
+
+# Record every upstream request and its response to an archive, or answer
+# every request from one instead of calling WMATA. Replay runs the recording's
+# clock REPLAY_SPEED times as fast; 0 serves each key's recordings in turn
+# with no delay, for load tests.
+RECORD_PATH = os.environ.get('WMATA_RECORD') or None
+REPLAY_PATH = os.environ.get('WMATA_REPLAY') or None
+REPLAY_SPEED = _env_float('WMATA_REPLAY_SPEED', 1.0)
+
+# Optional log of the predictions feed, sampled every PREDICTION_LOG_INTERVAL
+# seconds into compact column files for the wait time and train length tools.
+# Turning it on polls the predictions feed even when WMATA_POLLING is off.
+PREDICTION_LOG_ENABLED = _env_flag('WMATA_PREDICTION_LOG')
+PREDICTION_LOG_DIR = os.path.expanduser(os.environ.get('WMATA_PREDICTION_LOG_DIR',
+                                                       os.path.join(DATA_DIR, "prediction_log")))
+PREDICTION_LOG_INTERVAL = _env_float('WMATA_PREDICTION_LOG_INTERVAL', 60.0)
+# Rows held in memory before they must be written out
+PREDICTION_LOG_RING_ROWS = _env_int('WMATA_PREDICTION_LOG_RING_ROWS', 65536)
+# Time of day windows in the prediction log tools are Metro local time
+METRO_TIMEZONE = "America/New_York"
+
+# Upstream rate limits. WMATA's default tier allows 10 calls per second and
+# 50,000 per day; background refreshes stop short of the daily quota so
+# interactive tool calls keep a reserve.
+RATE_LIMIT_PER_SECOND = _env_positive('WMATA_RATE_LIMIT_PER_SECOND', 10.0)
+RATE_LIMIT_BURST = _env_positive('WMATA_RATE_LIMIT_BURST', 10, _env_int)
+DAILY_QUOTA = _env_int('WMATA_DAILY_QUOTA', 50000)
+BACKGROUND_DAILY_RESERVE = _env_float('WMATA_BACKGROUND_DAILY_RESERVE', 0.1)
+RATE_LIMIT_MAX_QUEUE = _env_positive('WMATA_RATE_LIMIT_MAX_QUEUE', 100, _env_int)
+RATE_LIMIT_MAX_WAIT = _env_float('WMATA_RATE_LIMIT_MAX_WAIT', 10.0)
+
+# Resilience: idempotent GETs are retried with jittered exponential backoff
+# within an overall deadline, a per-endpoint circuit breaker fails fast while
+# WMATA is down, and the last good response is served (marked stale) when a
+# fresh one cannot be fetched.
+RETRY_ATTEMPTS = _env_int('WMATA_RETRY_ATTEMPTS', 3)
+RETRY_BASE_DELAY = _env_float('WMATA_RETRY_BASE_DELAY', 0.25)
+RETRY_MAX_DELAY = _env_float('WMATA_RETRY_MAX_DELAY', 2.0)
+REQUEST_DEADLINE = _env_float('WMATA_REQUEST_DEADLINE', 15.0)
+CIRCUIT_FAILURE_THRESHOLD = _env_int('WMATA_CIRCUIT_FAILURE_THRESHOLD', 3)
+CIRCUIT_RESET_TIMEOUT = _env_float('WMATA_CIRCUIT_RESET_TIMEOUT', 30.0)
+STALE_MAX_AGE = _env_float('WMATA_STALE_MAX_AGE', 3600.0)
+
+# Seconds plan_trip waits for its concurrent fetches before answering with
+# whatever has arrived and naming what is missing
+PLAN_TRIP_DEADLINE = _env_float('WMATA_PLAN_TRIP_DEADLINE', 4.0)
+
+# "streamable-http" or "sse" serves many sessions from one process, all
+# sharing the HTTP client, cache and rate budget; "stdio" serves one client
+TRANSPORT = os.getenv('WMATA_TRANSPORT', 'stdio').strip().lower()
+HTTP_HOST = os.getenv('WMATA_HOST', '127.0.0.1')
+HTTP_PORT = _env_int('WMATA_PORT', 8000)
+# Host names remote clients use to reach a non-loopback bind address, e.g.
+# "metro.example.org,10.0.0.5"; others are rejected to stop DNS rebinding
+HTTP_ALLOWED_HOSTS = [h.strip() for h in os.getenv('WMATA_ALLOWED_HOSTS', '').split(',') if h.strip()]
+# Tool calls one session may run at once; further calls wait their turn (0 for no limit)
+SESSION_MAX_CONCURRENCY = _env_int('WMATA_SESSION_MAX_CONCURRENCY', 8)
+
+# "json" makes every tool return compact JSON built from the output models
+# below instead of the formatted text, leaving out the fixed tips blocks
+OUTPUT_FORMAT = os.getenv('WMATA_OUTPUT_FORMAT', 'text').strip().lower()
+JSON_OUTPUT = OUTPUT_FORMAT == 'json'
+
+# Scheduling priorities for upstream calls; lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# httpx is imported on first use, keeping it off the startup path
+_http_client: "httpx.AsyncClient | None" = None
+
+# FastMCP enters the lifespan once per session: once over stdio, but for
+# every session over HTTP. The process-wide resources are set up by the first
+# holder and torn down when the last one leaves.
+_resource_holders = 0
+_static_refresh_task: asyncio.Task | None = None
+
+@asynccontextmanager
+async def shared_resources() -> AsyncIterator[None]:
+    """Keep the process-wide resources up for as long as anyone holds them"""
+    global _resource_holders, _static_refresh_task
+    _resource_holders += 1
+    # Setup has no await, so a concurrent holder never sees it half done
+    if _resource_holders == 1:
+        # Static data comes from disk; the network refresh runs in the background
+        load_static_data()
+        _static_refresh_task = asyncio.create_task(_run_background(refresh_static_data(), "static data refresh"))
+        if POLLING_ENABLED:
+            realtime_poller.start()
+        elif PREDICTION_LOG_ENABLED:
+            realtime_poller.start(["predictions"])
+    try:
+        yield
+    finally:
+        _resource_holders -= 1
+        if _resource_holders == 0:
+            _static_refresh_task.cancel()
+            if _matrix_refresh_task is not None:
+                _matrix_refresh_task.cancel()
+            await realtime_poller.stop()
+            if prediction_log is not None:
+                prediction_log.flush()
+            # A holder may have arrived while the poller stopped; it keeps the client
+            if _resource_holders == 0:
+                await close_http_client()
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Lifespan of one MCP session"""
+    metrics.sessions_active += 1
+    try:
+        async with shared_resources():
+            yield
+    finally:
+        metrics.sessions_active -= 1
+
+async def _run_background(coro, name: str) -> None:
+    """Run a background job, logging failures instead of losing them"""
+    try:
+        await coro
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"Background {name} failed: {e}", file=sys.stderr)
+
+mcp = FastMCP("wmata-metro-guide", lifespan=server_lifespan)
+
 # Enhanced station mapping with line information
 STATION_MAPPING = {
     "Metro Center": "C01",
@@ -121,229 +365,3312 @@ LINE_COLORS = {
     "SV": "Silver Line"
 }
 
-# Station lines mapping (which lines serve each station)
-STATION_LINES = {
-    # Red Line
-    "A01": ["RD"], "A02": ["RD"], "A03": ["RD"], "A04": ["RD"], "A05": ["RD"], 
-    "A06": ["RD"], "A07": ["RD"], "A08": ["RD"], "A09": ["RD"], "A10": ["RD"],
-    "A11": ["RD"], "A12": ["RD"], "A13": ["RD"], "A14": ["RD"], "A15": ["RD"],
-    "B02": ["RD"], "B03": ["RD"], "B04": ["RD"], "B05": ["RD"], "B06": ["RD"],
-    "B07": ["RD"], "B08": ["RD"], "B09": ["RD"], "B10": ["RD"], "B11": ["RD"], "B35": ["RD"],
-    
-    # Blue/Orange/Silver Line stations
-    "C01": ["RD", "BL", "OR", "SV"], "C02": ["BL", "OR", "SV"], "C03": ["BL", "OR", "SV"],
-    "C04": ["BL", "OR", "SV"], "C05": ["BL", "OR", "SV"], "C06": ["BL"], "C07": ["BL", "YL"],
-    "C08": ["BL", "YL"], "C09": ["BL", "YL"], "C10": ["BL", "YL"], "C11": ["BL", "YL"],
-    "C12": ["BL", "YL"], "C13": ["BL", "YL"], "C14": ["BL"], "C15": ["BL"],
-    
-    # Orange/Silver Line
-    "D01": ["OR", "SV"], "D02": ["OR", "SV"], "D03": ["OR"], "D04": ["OR", "SV"],
-    "D05": ["OR", "SV"], "D06": ["OR", "SV"], "D07": ["OR", "SV"], "D08": ["OR", "SV"],
-    "D09": ["OR"], "D10": ["OR"], "D11": ["OR"], "D12": ["OR"], "D13": ["OR", "SV"],
-    
-    # Green/Yellow Line
-    "E01": ["GR", "YL"], "E02": ["GR"], "E03": ["GR"], "E04": ["GR"],
-    "E05": ["GR"], "E06": ["RD", "GR"], "E07": ["GR"], "E08": ["GR"],
-    "E09": ["GR"], "E10": ["GR"],
-    
-    # Gallery Place / L'Enfant Plaza connections
-    "F01": ["RD", "GR", "YL"], "F02": ["GR", "YL"], "F03": ["BL", "OR", "SV", "GR", "YL"],
-    "F04": ["GR"], "F05": ["GR"], "F06": ["GR"], "F07": ["GR"], "F08": ["GR"],
-    "F09": ["GR"], "F10": ["GR"], "F11": ["GR"],
-    
-    # Other stations
-    "G01": ["BL"], "G02": ["BL"], "G03": ["BL"], "G04": ["BL"], "G05": ["BL", "SV"],
-    "J02": ["BL"], "J03": ["BL"],
-    
-    # Orange/Silver Line (Arlington)
-    "K01": ["OR", "SV"], "K02": ["OR", "SV"], "K03": ["OR", "SV"], "K04": ["OR", "SV"],
-    "K05": ["OR", "SV"], "K06": ["OR", "SV"], "K07": ["OR", "SV"], "K08": ["OR", "SV"],
-    
-    # Silver Line
-    "N01": ["SV"], "N02": ["SV"], "N03": ["SV"], "N04": ["SV"], "N06": ["SV"],
-    "N07": ["SV"], "N08": ["SV"], "N09": ["SV"], "N10": ["SV"], "N11": ["SV"], "N12": ["SV"]
+
+# Station order along each line's standard route, terminal to terminal.
+# A snapshot of WMATA's jPath standard routes; transfer stations appear under
+# the platform code of the level each line uses.
+LINE_SEQUENCES = {
+    "RD": ["A15", "A14", "A13", "A12", "A11", "A10", "A09", "A08", "A07", "A06", "A05", "A04", "A03",
+           "A02", "A01", "B01", "B02", "B03", "B35", "B04", "B05", "B06", "B07", "B08", "B09", "B10", "B11"],
+    "OR": ["K08", "K07", "K06", "K05", "K04", "K03", "K02", "K01", "C05", "C04", "C03", "C02", "C01",
+           "D01", "D02", "D03", "D04", "D05", "D06", "D07", "D08", "D09", "D10", "D11", "D12", "D13"],
+    "SV": ["N12", "N11", "N10", "N09", "N08", "N07", "N06", "N04", "N03", "N02", "N01", "K05", "K04",
+           "K03", "K02", "K01", "C05", "C04", "C03", "C02", "C01", "D01", "D02", "D03", "D04", "D05",
+           "D06", "D07", "D08", "G01", "G02", "G03", "G04", "G05"],
+    "BL": ["J03", "J02", "C13", "C12", "C11", "C10", "C09", "C08", "C07", "C06", "C05", "C04", "C03",
+           "C02", "C01", "D01", "D02", "D03", "D04", "D05", "D06", "D07", "D08", "G01", "G02", "G03",
+           "G04", "G05"],
+    "YL": ["C15", "C14", "C13", "C12", "C11", "C10", "C09", "C08", "C07", "F03", "F02", "F01", "E01"],
+    "GR": ["F11", "F10", "F09", "F08", "F07", "F06", "F05", "F04", "F03", "F02", "F01", "E01", "E02",
+           "E03", "E04", "E05", "E06", "E07", "E08", "E09", "E10"],
 }
 
-# Simple routing for common transfer patterns
-COMMON_ROUTES = {
-    # From Union Station (B03) to various destinations
-    ("B03", "C07"): [  # Union Station to Pentagon
-        {"station": "B03", "name": "Union Station", "line": "RD", "action": "start"},
-        {"station": "C01", "name": "Metro Center", "line": "RD", "action": "transfer"},
-        {"station": "C01", "name": "Metro Center", "line": "BL", "action": "board"},
-        {"station": "C07", "name": "Pentagon", "line": "BL", "action": "arrive"}
-    ],
-    # From Dupont Circle to National Airport
-    ("A03", "C10"): [
-        {"station": "A03", "name": "Dupont Circle", "line": "RD", "action": "start"},
-        {"station": "C01", "name": "Metro Center", "line": "RD", "action": "transfer"},
-        {"station": "C01", "name": "Metro Center", "line": "BL", "action": "board"},
-        {"station": "C10", "name": "Ronald Reagan Washington National Airport", "line": "BL", "action": "arrive"}
-    ],
-    # From Gallery Place to Rosslyn
-    ("F01", "C05"): [
-        {"station": "F01", "name": "Gallery Pl-Chinatown", "line": "RD", "action": "start"},
-        {"station": "C01", "name": "Metro Center", "line": "RD", "action": "transfer"},
-        {"station": "C01", "name": "Metro Center", "line": "OR", "action": "board"},
-        {"station": "C05", "name": "Rosslyn", "line": "OR", "action": "arrive"}
-    ]
+def lines_from_sequences(sequences: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Which lines serve each station code, in LINE_COLORS order"""
+    station_lines: Dict[str, List[str]] = {}
+    for line in LINE_COLORS:
+        for code in sequences.get(line, []):
+            station_lines.setdefault(code, []).append(line)
+    return station_lines
+
+# Station lines mapping (which lines serve each station), derived from the
+# line sequences so the two can never disagree
+STATION_LINES = lines_from_sequences(LINE_SEQUENCES)
+
+# Routing costs in minutes. Segment times default to a system-wide average
+# until measured times are available for a pair of neighbouring stations.
+DEFAULT_SEGMENT_MINUTES = _env_float('WMATA_SEGMENT_MINUTES', 2.5)
+TRANSFER_PENALTY_MINUTES = _env_float('WMATA_TRANSFER_MINUTES', 5.0)
+
+# Transfer stations whose upper and lower levels have separate platform codes.
+# Each group is one physical station.
+TRANSFER_STATION_CODES = [
+    ("A01", "C01"),  # Metro Center
+    ("B01", "F01"),  # Gallery Pl-Chinatown
+    ("D03", "F03"),  # L'Enfant Plaza
+    ("B06", "E06"),  # Fort Totten
+]
+
+def normalize_station_name(name: str) -> str:
+    """Lowercase a station name and drop spaces and punctuation for lookups"""
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+class StationRegistry:
+    """Station indexes built once so code and name lookups are O(1).
+
+    Every platform code of a multi-level transfer station resolves to the same
+    name, and its lines are the union of the lines serving each level.
+    """
+
+    def __init__(self, mapping: Dict[str, str], station_lines: Dict[str, List[str]],
+                 transfer_codes: List[tuple[str, ...]]):
+        self.code_to_name: Dict[str, str] = {}
+        self.name_to_code: Dict[str, str] = {}
+        self.code_to_lines: Dict[str, List[str]] = {}
+        self.code_groups: Dict[str, tuple[str, ...]] = {}
+
+        for name, code in mapping.items():
+            self.code_to_name[code] = name
+            self.name_to_code[normalize_station_name(name)] = code
+        for code in station_lines:
+            self.code_groups[code] = (code,)
+        for group in transfer_codes:
+            name = next((self.code_to_name[code] for code in group if code in self.code_to_name), None)
+            for code in group:
+                self.code_groups[code] = tuple(group)
+                if name is not None:
+                    self.code_to_name.setdefault(code, name)
+        for code in self.code_to_name.keys() | self.code_groups.keys():
+            group = self.code_groups.setdefault(code, (code,))
+            served = {line for member in group for line in station_lines.get(member, [])}
+            self.code_to_lines[code] = [line for line in LINE_COLORS if line in served]
+
+    def is_code(self, code: str) -> bool:
+        return code in self.code_to_name or code in self.code_groups
+
+    def name(self, code: str, default: str | None = None) -> str | None:
+        """Station name for a code, or the default if the code is unknown"""
+        return self.code_to_name.get(code, default)
+
+    def code_for_name(self, name: str) -> str | None:
+        """Station code for a name, ignoring case, spacing and punctuation"""
+        return self.name_to_code.get(normalize_station_name(name))
+
+    def lines(self, code: str) -> List[str]:
+        """Line codes serving a station, across all of its platform codes"""
+        return self.code_to_lines.get(code, [])
+
+    def codes(self, code: str) -> tuple[str, ...]:
+        """All platform codes of the station a code belongs to"""
+        return self.code_groups.get(code, (code,))
+
+STATIONS = StationRegistry(STATION_MAPPING, STATION_LINES, TRANSFER_STATION_CODES)
+
+# Common names, landmarks and abbreviations riders use instead of the
+# official station names
+STATION_ALIASES = {
+    "Metro Ctr": "C01",
+    "Gallery Place": "F01",
+    "Chinatown": "F01",
+    "Capital One Arena": "F01",
+    "L'Enfant": "F03",
+    "GWU": "C04",
+    "GW": "C04",
+    "George Washington University": "C04",
+    "DCA": "C10",
+    "National Airport": "C10",
+    "Reagan National": "C10",
+    "IAD": "N10",
+    "Dulles": "N10",
+    "Dulles Airport": "N10",
+    "Navy Yard": "F05",
+    "Nationals Park": "F05",
+    "The Wharf": "F04",
+    "Convention Center": "E01",
+    "Mount Vernon Square": "E01",
+    "U Street": "E03",
+    "National Zoo": "A04",
+    "Adams Morgan": "A04",
+    "UDC": "A06",
+    "American University": "A07",
+    "NIH": "A10",
+    "Walter Reed": "A10",
+    "Catholic University": "B05",
+    "CUA": "B05",
+    "Gallaudet": "B35",
+    "Howard University": "E02",
+    "University of Maryland": "E09",
+    "UMD": "E09",
+    "RFK Stadium": "D08",
+    "National Mall": "D02",
+    "Old Town": "C13",
+    "King Street": "C13",
+    "Tysons Corner": "N02",
+    "Largo": "G05",
+}
+
+# Spelled-out words mapped to the abbreviations used in station names
+SEARCH_ABBREVIATIONS = {
+    "street": "st",
+    "square": "sq",
+    "avenue": "ave",
+    "place": "pl",
+    "mount": "mt",
+    "university": "u",
+    "southwest": "sw",
 }
 
-async def make_wmata_request(url: str, params: dict = None) -> dict[str, Any] | None:
-    """Make a request to WMATA API with error handling"""
-    headers = {
-        "Cache-Control": "no-cache",
-        "api_key": WMATA_API_KEY,
-    }
+# Words too common in station names to identify a station on their own
+SEARCH_STOPWORDS = {"st", "sq", "ave", "pl", "mt", "u", "the", "of"}
+
+def search_words(text: str) -> List[str]:
+    """Split text into lowercase words with apostrophes dropped and abbreviations applied"""
+    words = "".join(ch if ch.isalnum() else " " for ch in text.lower().replace("'", "")).split()
+    return [SEARCH_ABBREVIATIONS.get(word, word) for word in words]
+
+def _trigrams(term: str) -> set[str]:
+    padded = f" {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (edits plus transpositions), capped at limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class StationMatch(NamedTuple):
+    code: str
+    name: str
+    score: float
+    matched: str
+
+class StationSearchIndex:
+    """Ranked station search over names, name fragments and aliases.
+
+    Each station contributes several search terms. Candidates come from exact
+    and prefix lookups plus a trigram index, and are ranked by match type and
+    edit distance so typos still find the intended station.
+    """
+
+    # Scores by how a query matched a term; fuzzy matches scale by similarity
+    EXACT, WORD, PREFIX, SUBSTRING, FUZZY = 1.0, 0.9, 0.85, 0.6, 0.9
+    MAX_FUZZY_CANDIDATES = 24
+    MIN_TRIGRAM_OVERLAP = 0.4
+
+    def __init__(self, registry: StationRegistry, aliases: Dict[str, str]):
+        self.registry = registry
+        self.aliases = aliases
+        # term -> [(code, weight, display text)]; weight is EXACT for whole
+        # names and aliases and WORD for single words taken from a name.
+        # Built on the first search so startup does not pay for it.
+        self.terms: Dict[str, List[tuple[str, float, str]]] | None = None
+        self.sorted_terms: List[str] = []
+        self.trigram_index: Dict[str, List[str]] = {}
+        self.search = lru_cache(maxsize=1024)(self._search)
+
+    def ensure_built(self) -> None:
+        """Build the term and trigram indexes if no search has yet"""
+        if self.terms is None:
+            self._build()
+
+    def _build(self) -> None:
+        self.terms = {}
+        # Index each station once, under the code used in the station mapping
+        for code in self.registry.name_to_code.values():
+            self._add_phrase(self.registry.name(code), code, self.registry.name(code))
+        for alias, code in self.aliases.items():
+            self._add_phrase(alias, code, alias)
+        self.sorted_terms = sorted(self.terms)
+        for term in self.sorted_terms:
+            for gram in _trigrams(term):
+                self.trigram_index.setdefault(gram, []).append(term)
+
+    def _add(self, term: str, code: str, weight: float, display: str) -> None:
+        entries = self.terms.setdefault(term, [])
+        if not any(entry[0] == code and entry[1] >= weight for entry in entries):
+            entries.append((code, weight, display))
+
+    def _add_phrase(self, phrase: str, code: str, display: str) -> None:
+        words = search_words(phrase)
+        self._add("".join(words), code, self.EXACT, display)
+        # Segments such as "Woodley Park" in "Woodley Park-Zoo/Adams Morgan"
+        for segment in phrase.replace("/", "-").split("-"):
+            segment_words = search_words(segment)
+            if segment_words and len(segment_words) < len(words):
+                self._add("".join(segment_words), code, self.WORD, display)
+        for word in words:
+            if word not in SEARCH_STOPWORDS and len(word) > 1:
+                self._add(word, code, self.WORD, display)
+
+    def _candidates(self, query: str) -> set[str]:
+        candidates = set()
+        start = bisect.bisect_left(self.sorted_terms, query)
+        for term in self.sorted_terms[start:start + self.MAX_FUZZY_CANDIDATES]:
+            if not term.startswith(query):
+                break
+            candidates.add(term)
+        grams = _trigrams(query)
+        overlap: Dict[str, int] = {}
+        for gram in grams:
+            for term in self.trigram_index.get(gram, ()):
+                overlap[term] = overlap.get(term, 0) + 1
+        candidates.update(term for term in overlap if query in term)
+        # Only terms sharing a good part of the query's trigrams are worth an
+        # edit-distance comparison
+        min_overlap = max(1, int(len(grams) * self.MIN_TRIGRAM_OVERLAP))
+        ranked = sorted((term for term in overlap if overlap[term] >= min_overlap), key=lambda term: -overlap[term])
+        candidates.update(ranked[:self.MAX_FUZZY_CANDIDATES])
+        return candidates
+
+    def _score(self, query: str, term: str) -> float:
+        if term == query:
+            return 1.0
+        coverage = len(query) / len(term)
+        if term.startswith(query):
+            return self.PREFIX + 0.1 * coverage
+        if query in term:
+            return self.SUBSTRING + 0.1 * coverage
+        limit = max(1, len(query) // 3)
+        distance = edit_distance(query, term, limit)
+        if distance > limit:
+            return 0.0
+        return self.FUZZY * (1 - distance / max(len(query), len(term)))
+
+    def _search(self, query: str, limit: int = 5) -> tuple[StationMatch, ...]:
+        normalized = "".join(search_words(query))
+        if not normalized:
+            return ()
+        self.ensure_built()
+        best: Dict[str, StationMatch] = {}
+        for term in self._candidates(normalized):
+            match_score = self._score(normalized, term)
+            if not match_score:
+                continue
+            for code, weight, display in self.terms[term]:
+                score = round(match_score * weight, 3)
+                if code not in best or score > best[code].score:
+                    best[code] = StationMatch(code, self.registry.name(code, code), score, display)
+        ranked = sorted(best.values(), key=lambda match: (-match.score, match.name))
+        return tuple(ranked[:limit])
+
+    def resolve(self, query: str) -> StationMatch | None:
+        """The single best match, or None when nothing matches well or the top matches tie"""
+        matches = self.search(query, 2)
+        if not matches or matches[0].score < 0.7:
+            return None
+        if len(matches) > 1 and matches[1].score > matches[0].score - 0.05:
+            return None
+        return matches[0]
+
+STATION_SEARCH = StationSearchIndex(STATIONS, STATION_ALIASES)
+
+def endpoint_name(url: str) -> str:
+    """Short WMATA endpoint name for a request URL, such as GetPrediction or jStations"""
+    parts = urlsplit(url).path.strip("/").split("/")
+    # GetPrediction takes the station codes as a trailing path segment
+    if "GetPrediction" in parts:
+        return "GetPrediction"
+    return parts[-1]
+
+def endpoint_timeout(url: str, remaining: float | None = None) -> "httpx.Timeout":
+    """Timeout for a request, using the endpoint's read timeout when configured"""
+    import httpx
+
+    read_timeout = ENDPOINT_TIMEOUTS.get(endpoint_name(url), DEFAULT_TIMEOUT)
+    if remaining is not None:
+        read_timeout = max(0.1, min(read_timeout, remaining))
+    return httpx.Timeout(read_timeout, connect=min(CONNECT_TIMEOUT, read_timeout))
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Return the shared HTTP client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import importlib.util
+        import httpx
+
+        http2 = HTTP2_ENABLED
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1", file=sys.stderr)
+            http2 = False
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+            headers={
+                "Cache-Control": "no-cache",
+                "api_key": WMATA_API_KEY or "",
+            },
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and its pooled connections"""
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
+
+class ResponseCache:
+    """Bounded LRU cache of WMATA responses with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # key -> (expires_at, stored_at, response); expired entries are kept
+        # until evicted so they can be served stale when WMATA is down
+        self._entries: OrderedDict[str, tuple[float, float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.stale_served = 0
+
+    def get(self, key: str) -> dict | None:
+        """Return a fresh cached response, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def get_stale(self, key: str, max_age: float) -> tuple[dict, float] | None:
+        """Return the last stored response and its age, if it is not older than max_age"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[1]
+        if age > max_age:
+            return None
+        self.stale_served += 1
+        return entry[2], age
+
+    def set(self, key: str, value: dict, ttl: float) -> None:
+        """Store a response, evicting the least recently used entries when full"""
+        now = time.monotonic()
+        self._entries[key] = (now + ttl, now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Hit/miss counters for reporting"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "stale_served": self.stale_served,
+        }
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES)
+
+# Upstream fetches currently in flight, keyed like the cache, so concurrent
+# identical requests share one upstream call
+_inflight: dict[str, asyncio.Task] = {}
+
+class SharedCacheError(Exception):
+    """The shared cache file could not be read or written"""
+
+class SharedCache:
+    """Response cache shared between processes, in a SQLite file in WAL mode.
+
+    Entries carry wall-clock expiry times so every process agrees on them.
+    Before fetching a key upstream a process takes a lease on it in the same
+    file; a process that misses while another holds the lease waits for that
+    response instead of fetching it too, so any number of local processes
+    cost about as many upstream calls as one. Statements run in a worker
+    thread, one at a time, so a busy file never stalls the event loop.
+    """
+
+    POLL_INTERVAL = 0.05
+    PRUNE_EVERY = 200
+    # Seconds a statement waits for another process's write before failing
+    BUSY_TIMEOUT = 0.5
+
+    def __init__(self, path: str, lease_seconds: float):
+        import sqlite3
+        import threading
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Autocommit: every statement is its own short transaction
+        self.db = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses "
+                        "(key TEXT PRIMARY KEY, expires_at REAL, stored_at REAL, body TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, until REAL)")
+        self._lock = threading.Lock()
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{random.getrandbits(32):08x}"
+        # key -> stored_at of the newest entry this process has already used
+        self._seen: Dict[str, float] = {}
+        self._puts = 0
+        self.hits = 0
+        self.waits = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def _locked(self, method, *args):
+        import sqlite3
+
+        with self._lock:
+            try:
+                return method(*args)
+            except sqlite3.Error as e:
+                raise SharedCacheError(str(e)) from e
+
+    async def _db(self, method, *args):
+        """Run a database method in a worker thread; SQLite errors become SharedCacheError"""
+        return await asyncio.to_thread(self._locked, method, *args)
+
+    def _row(self, key: str) -> tuple[float, float, str] | None:
+        return self.db.execute("SELECT expires_at, stored_at, body FROM responses WHERE key = ?", (key,)).fetchone()
+
+    def _put(self, key: str, data: dict, ttl: float) -> None:
+        now = time.time()
+        self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                        (key, now + ttl, now, json.dumps(data, separators=(",", ":"))))
+        self._seen[key] = now
+        self._puts += 1
+        if self._puts % self.PRUNE_EVERY == 0:
+            self.db.execute("DELETE FROM responses WHERE stored_at < ?", (now - STALE_MAX_AGE,))
+            self.db.execute("DELETE FROM leases WHERE until < ?", (now,))
+
+    def _try_lease(self, key: str) -> bool:
+        """Take the refresh lease on a key unless another process holds an unexpired one"""
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE "
+            "SET owner = excluded.owner, until = excluded.until WHERE leases.until < ?",
+            (key, self.owner, now + self.lease_seconds, now))
+        return cursor.rowcount == 1
+
+    def _release(self, key: str) -> None:
+        self.db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def _fresh(self, key: str, refresh: bool) -> tuple[dict, float] | None:
+        """A fresh entry and its remaining TTL. With refresh, only one this process has not used yet"""
+        row = self._row(key)
+        now = time.time()
+        if row is None or row[0] <= now or (refresh and row[1] <= self._seen.get(key, 0.0)):
+            return None
+        self._seen[key] = row[1]
+        return json.loads(row[2]), row[0] - now
+
+    def _stale(self, key: str, max_age: float) -> tuple[dict, float] | None:
+        row = self._row(key)
+        if row is None or time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[2]), time.time() - row[1]
+
+    def _count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    async def _quietly(self, method, *args):
+        """A database call whose failure is logged rather than raised; None if it failed"""
+        try:
+            result = await self._db(method, *args)
+        except SharedCacheError as e:
+            shared_cache_failed(e)
+            return None
+        self.errors = 0
+        return result
+
+    async def fetch(self, key: str, ttl: float, refresh: bool, fetch) -> tuple[dict | None, float]:
+        """A response from the shared file, or from fetch() if no process has a fresh one, and its TTL left.
+
+        If the file cannot be used the response comes straight from fetch().
+        """
+        waited_until = None
+        leased = False
+        try:
+            while True:
+                entry = await self._db(self._fresh, key, refresh)
+                if entry is not None:
+                    self.hits += 1
+                    self.errors = 0
+                    return entry
+                if await self._db(self._try_lease, key):
+                    leased = True
+                    break
+                if waited_until is None:
+                    self.waits += 1
+                    waited_until = time.time() + self.lease_seconds
+                elif time.time() >= waited_until:
+                    break  # the leaseholder seems stuck; fetch without the lease
+                await asyncio.sleep(self.POLL_INTERVAL)
+        except SharedCacheError as e:
+            shared_cache_failed(e)
+            return await fetch(), ttl
+        self.errors = 0
+        try:
+            self.fetches += 1
+            data = await fetch()
+            if data is not None:
+                await self._quietly(self._put, key, data, ttl)
+            return data, ttl
+        finally:
+            if leased:
+                await self._quietly(self._release, key)
+
+    async def get_stale(self, key: str, max_age: float) -> tuple[dict, float] | None:
+        """The last response any process stored and its age, if it is not older than max_age"""
+        return await self._quietly(self._stale, key, max_age)
+
+    async def stats(self) -> dict[str, Any]:
+        return {"entries": await self._quietly(self._count), "hits": self.hits, "waits": self.waits,
+                "fetches": self.fetches, "errors": self.errors}
+
+shared_cache: SharedCache | None = None
+# Consecutive failed statements before the shared cache is turned off
+SHARED_CACHE_MAX_ERRORS = 3
+
+def get_shared_cache() -> SharedCache | None:
+    """The shared cache, opened on first use when enabled"""
+    global shared_cache, SHARED_CACHE_ENABLED
+    if SHARED_CACHE_ENABLED and shared_cache is None:
+        try:
+            shared_cache = SharedCache(SHARED_CACHE_PATH, SHARED_CACHE_LEASE)
+        except Exception as e:
+            print(f"Shared cache at {SHARED_CACHE_PATH} unavailable, using the in-process cache only: {e}",
+                  file=sys.stderr)
+            SHARED_CACHE_ENABLED = False
+    return shared_cache
+
+def shared_cache_failed(error: Exception) -> None:
+    """Log a failed shared cache statement; turn the cache off after several in a row"""
+    global shared_cache, SHARED_CACHE_ENABLED
+    if shared_cache is None:
+        return
+    shared_cache.errors += 1
+    print(f"Shared cache error, calling WMATA directly: {error}", file=sys.stderr)
+    if shared_cache.errors >= SHARED_CACHE_MAX_ERRORS:
+        print(f"Shared cache at {SHARED_CACHE_PATH} keeps failing; using the in-process cache only",
+              file=sys.stderr)
+        shared_cache, SHARED_CACHE_ENABLED = None, False
+
+def cache_key(url: str, params: dict | None = None) -> str:
+    """Cache key for a request: the URL plus its parameters in a stable order"""
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+class RateLimitExceeded(Exception):
+    """Raised when an upstream call cannot be scheduled within the rate limits"""
+
+class UpstreamScheduler:
+    """Token-bucket scheduler that every upstream WMATA call goes through.
+
+    Tokens refill at the per-second rate up to the burst size, and a daily
+    counter enforces the key's quota. When no token is free, callers queue
+    by priority (interactive before background) and are released in order.
+    A call tagged with its request key can be promoted while it waits, when
+    a more urgent caller joins the same request. A full queue, a wait longer than max_wait or an exhausted quota is
+    reported as RateLimitExceeded instead of piling up requests.
+    """
+
+    def __init__(self, rate: float, burst: int, daily_quota: int, max_queue: int, max_wait: float,
+                 background_reserve: float = 0.0):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.daily_quota = daily_quota
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.background_reserve = int(daily_quota * background_reserve)
+        self.tokens = float(self.burst)
+        self.used_today = 0
+        self.rejected = 0
+        self._day = time.strftime("%Y-%m-%d")
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[list] = []  # [priority, sequence, future] heap entries
+        self._sequence = 0
+        self._queued: Dict[str, list] = {}  # waiter entries by request key
+        self.promoted: Dict[str, int] = {}  # raised priorities of requests in flight
+        self._dispatcher: asyncio.Task | None = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        today = time.strftime("%Y-%m-%d")
+        if today != self._day:
+            self._day, self.used_today = today, 0
 
-    async with httpx.AsyncClient() as client:
+    def _quota_left(self, priority: int) -> bool:
+        limit = self.daily_quota - (self.background_reserve if priority > PRIORITY_INTERACTIVE else 0)
+        return self.used_today < limit
+
+    def _take(self) -> None:
+        self.tokens -= 1
+        self.used_today += 1
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, key: str | None = None) -> None:
+        """Wait for permission to make one upstream call, for the request with this key"""
+        if key is not None:
+            priority = min(priority, self.promoted.get(key, priority))
+        self._refill()
+        if not self._quota_left(priority):
+            self.rejected += 1
+            raise RateLimitExceeded("daily WMATA API quota used up")
+        if not self._waiters and self.tokens >= 1 and time.monotonic() >= self._paused_until:
+            self._take()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise RateLimitExceeded("too many requests queued for the WMATA API")
+
+        future = asyncio.get_running_loop().create_future()
+        self._sequence += 1
+        entry = [priority, self._sequence, future]
+        heapq.heappush(self._waiters, entry)
+        if key is not None:
+            self._queued[key] = entry
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise RateLimitExceeded("timed out waiting for a WMATA API rate limit slot")
+        finally:
+            if key is not None and self._queued.get(key) is entry:
+                del self._queued[key]
+
+    def promote(self, key: str, priority: int) -> None:
+        """Raise the priority of a request in flight, including its place in the queue"""
+        if priority >= self.promoted.get(key, priority + 1):
+            return
+        self.promoted[key] = priority
+        entry = self._queued.get(key)
+        if entry is not None and priority < entry[0]:
+            entry[0] = priority
+            heapq.heapify(self._waiters)
+
+    async def _dispatch(self) -> None:
+        """Release queued callers in priority order as tokens become available"""
+        while self._waiters:
+            self._refill()
+            wait = max(self._paused_until - time.monotonic(), (1 - self.tokens) / self.rate if self.tokens < 1 else 0)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if not self._quota_left(priority):
+                future.set_exception(RateLimitExceeded("daily WMATA API quota used up"))
+                continue
+            self._take()
+            future.set_result(None)
+
+    def throttle(self, seconds: float) -> None:
+        """Stop releasing calls for a while, e.g. after WMATA answers 429"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+    def quota(self) -> dict[str, Any]:
+        """Remaining budget for reporting"""
+        self._refill()
+        return {
+            "daily_quota": self.daily_quota,
+            "used_today": self.used_today,
+            "remaining_today": max(0, self.daily_quota - self.used_today),
+            "per_second": self.rate,
+            "tokens_available": round(max(self.tokens, 0.0), 2),
+            "queued": sum(1 for _, _, future in self._waiters if not future.done()),
+            "rejected": self.rejected,
+        }
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker.
+
+    After enough consecutive failed requests the circuit opens and calls fail
+    immediately. Once the reset timeout passes a single probe request is let
+    through; its success closes the circuit and its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Give back a half-open probe without recording an outcome"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+# Added to a response served from the cache after a failed refresh, holding
+# its age in seconds
+STALE_AGE_KEY = "_stale_age"
+
+# Histogram bucket upper bounds in seconds, as in the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and two additions"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 6),
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "p99_seconds": self.quantile(0.99),
+        }
+
+class Metrics:
+    """In-process counters for tool calls and upstream requests.
+
+    Everything is updated from the event loop thread, so plain integers and
+    dicts are enough; there is no locking on the hot path.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.tool_latency: Dict[str, Histogram] = {}
+        self.tool_calls: Dict[tuple[str, str], int] = {}
+        self.tools_in_flight = 0
+        self.upstream_latency: Dict[str, Histogram] = {}
+        self.upstream_calls: Dict[tuple[str, str], int] = {}
+        self.upstream_bytes: Dict[str, int] = {}
+        self.upstream_in_flight = 0
+        self.sessions_active = 0
+        self.session_waits = 0  # tool calls that queued behind their session's concurrency limit
+
+    def record_tool(self, tool: str, outcome: str, seconds: float) -> None:
+        histogram = self.tool_latency.get(tool)
+        if histogram is None:
+            histogram = self.tool_latency[tool] = Histogram()
+        histogram.observe(seconds)
+        self.tool_calls[tool, outcome] = self.tool_calls.get((tool, outcome), 0) + 1
+
+    def record_upstream(self, endpoint: str, status: str, seconds: float | None = None, size: int = 0) -> None:
+        """Count one upstream attempt; status is the HTTP status code or an error class"""
+        self.upstream_calls[endpoint, status] = self.upstream_calls.get((endpoint, status), 0) + 1
+        if seconds is not None:
+            histogram = self.upstream_latency.get(endpoint)
+            if histogram is None:
+                histogram = self.upstream_latency[endpoint] = Histogram()
+            histogram.observe(seconds)
+        if size:
+            self.upstream_bytes[endpoint] = self.upstream_bytes.get(endpoint, 0) + size
+
+    def snapshot(self) -> dict[str, Any]:
+        """All metrics as a JSON-serialisable dict"""
+        tools = {}
+        for (tool, outcome), n in sorted(self.tool_calls.items()):
+            tools.setdefault(tool, {"calls": {}})["calls"][outcome] = n
+        for tool, histogram in self.tool_latency.items():
+            tools[tool]["latency"] = histogram.snapshot()
+        upstream = {}
+        for (endpoint, status), n in sorted(self.upstream_calls.items()):
+            upstream.setdefault(endpoint, {"calls": {}, "bytes": self.upstream_bytes.get(endpoint, 0)})
+            upstream[endpoint]["calls"][status] = n
+        for endpoint, histogram in self.upstream_latency.items():
+            upstream[endpoint]["latency"] = histogram.snapshot()
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "in_flight": {"tools": self.tools_in_flight, "upstream": self.upstream_in_flight},
+            "sessions": {"active": self.sessions_active, "waits": self.session_waits},
+            "tools": tools,
+            "upstream": upstream,
+            "cache": response_cache.stats(),
+            "circuits": {endpoint: breaker.state for endpoint, breaker in sorted(circuit_breakers.items())},
+            "quota": upstream_scheduler.quota(),
+        }
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}" if label_text else f"{name}{suffix} {value}")
+
+        def histogram_samples(label: str, histograms: Dict[str, Histogram]) -> list:
+            samples = []
+            for key, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, n in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += n
+                    samples.append(("_bucket", {label: key, "le": bound}, cumulative))
+                samples.append(("_sum", {label: key}, round(histogram.sum, 6)))
+                samples.append(("_count", {label: key}, histogram.count))
+            return samples
+
+        metric("wmata_tool_calls_total", "counter", "Tool calls by outcome",
+               [("", {"tool": tool, "outcome": outcome}, n) for (tool, outcome), n in sorted(self.tool_calls.items())])
+        metric("wmata_tool_duration_seconds", "histogram", "Tool call latency",
+               histogram_samples("tool", self.tool_latency))
+        metric("wmata_tools_in_flight", "gauge", "Tool calls currently running", [("", {}, self.tools_in_flight)])
+        metric("wmata_sessions_active", "gauge", "MCP sessions currently connected",
+               [("", {}, self.sessions_active)])
+        metric("wmata_session_waits_total", "counter", "Tool calls that waited for their session's concurrency limit",
+               [("", {}, self.session_waits)])
+        metric("wmata_upstream_requests_total", "counter", "WMATA API attempts by endpoint and status",
+               [("", {"endpoint": e, "status": st}, n) for (e, st), n in sorted(self.upstream_calls.items())])
+        metric("wmata_upstream_duration_seconds", "histogram", "WMATA API response latency",
+               histogram_samples("endpoint", self.upstream_latency))
+        metric("wmata_upstream_response_bytes_total", "counter", "Response body bytes received from WMATA",
+               [("", {"endpoint": e}, n) for e, n in sorted(self.upstream_bytes.items())])
+        metric("wmata_upstream_in_flight", "gauge", "WMATA API requests currently open",
+               [("", {}, self.upstream_in_flight)])
+        cache = response_cache.stats()
+        for key in ("hits", "misses", "coalesced", "evictions", "stale_served"):
+            metric(f"wmata_cache_{key}_total", "counter", f"Response cache {key.replace('_', ' ')}",
+                   [("", {}, cache[key])])
+        metric("wmata_cache_hit_ratio", "gauge", "Share of cache lookups that were hits", [("", {}, cache["hit_rate"])])
+        metric("wmata_cache_entries", "gauge", "Responses held in the cache", [("", {}, cache["entries"])])
+        metric("wmata_circuit_open", "gauge", "1 while an endpoint's circuit breaker is not closed",
+               [("", {"endpoint": e}, int(b.state != "closed")) for e, b in sorted(circuit_breakers.items())])
+        metric("wmata_quota_remaining", "gauge", "Upstream calls left in today's quota",
+               [("", {}, upstream_scheduler.quota()["remaining_today"])])
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+upstream_scheduler = UpstreamScheduler(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, DAILY_QUOTA,
+                                       RATE_LIMIT_MAX_QUEUE, RATE_LIMIT_MAX_WAIT, BACKGROUND_DAILY_RESERVE)
+
+async def make_wmata_request(url: str, params: dict = None, refresh: bool = False,
+                             priority: int = PRIORITY_INTERACTIVE) -> dict[str, Any] | None:
+    """Make a request to WMATA API, served from the response cache when fresh.
+
+    Concurrent identical requests are coalesced into a single upstream call.
+    Cached responses are shared between callers and must not be mutated.
+    With refresh=True the cache is bypassed but still updated. Upstream calls
+    are scheduled by priority under the shared rate limits.
+    """
+    key = cache_key(url, params)
+    ttl = CACHE_TTLS.get(endpoint_name(url), 0.0)
+    if ttl > 0 and not refresh:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_cache(key, url, params, ttl, priority, refresh))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight_done(key, done))
+    else:
+        response_cache.coalesced += 1
+        # An interactive caller joining a background refresh should not wait behind other background calls
+        upstream_scheduler.promote(key, priority)
+    # Shield the shared fetch so one cancelled caller does not fail the others
+    data = await asyncio.shield(task)
+    if data is None and ttl > 0:
+        stale = response_cache.get_stale(key, STALE_MAX_AGE)
+        if stale is None and shared_cache is not None:
+            stale = await shared_cache.get_stale(key, STALE_MAX_AGE)
+        if stale is not None:
+            # A marked copy, so the cached response itself stays unmodified
+            return {**stale[0], STALE_AGE_KEY: round(stale[1])}
+    return data
+
+def _inflight_done(key: str, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+        upstream_scheduler.promoted.pop(key, None)
+
+async def _fetch_and_cache(key: str, url: str, params: dict | None, ttl: float,
+                           priority: int, refresh: bool = False) -> dict[str, Any] | None:
+    """Fetch from upstream, or from another process through the shared cache, and cache successful responses"""
+    shared = get_shared_cache() if ttl > 0 else None
+    if shared is not None:
+        data, ttl = await shared.fetch(key, ttl, refresh, lambda: fetch_from_wmata(url, params, priority))
+    else:
+        data = await fetch_from_wmata(url, params, priority)
+    if data is not None and ttl > 0:
+        response_cache.set(key, data, ttl)
+    return data
+
+def archive_key(url: str, params: dict | None = None) -> str:
+    """Key for a request in a traffic archive: its cache key without the API base"""
+    key = cache_key(url, params)
+    return key[len(WMATA_API_BASE):] if key.startswith(WMATA_API_BASE) else key
+
+class TrafficArchive:
+    """Append-only archive of upstream requests and their responses.
+
+    A small file header is followed by one record per request: a fixed
+    header (key length, body length, wall-clock time, seconds taken), the
+    request key, then the response as zlib-compressed JSON. An empty body
+    means the request failed. Each record goes out in one write, so a crash
+    leaves at worst a truncated last record, which readers skip.
+    """
+
+    MAGIC = b"WMRA"
+    VERSION = 1
+    FILE_HEADER = struct.Struct("<4sH")
+    RECORD_HEADER = struct.Struct("<HIdf")
+
+class TrafficRecorder(TrafficArchive):
+    """Appends every upstream request to an archive"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Unbuffered, so each record is one write that lands whole
+        self.file = open(path, "ab", buffering=0)
+        if self.file.tell() == 0:
+            self.file.write(self.FILE_HEADER.pack(self.MAGIC, self.VERSION))
+        self.records = 0
+
+    def append(self, key: str, at: float, seconds: float, data: dict | None) -> None:
+        key_bytes = key.encode("utf-8")
+        body = b"" if data is None else zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        self.file.write(self.RECORD_HEADER.pack(len(key_bytes), len(body), at, seconds) + key_bytes + body)
+        self.records += 1
+
+class TrafficReplay(TrafficArchive):
+    """Answers requests from an archive instead of calling WMATA.
+
+    Opening the archive reads only the record headers and keys, building a
+    per-key index of (time, offset) so each lookup is a dict hit and a
+    bisect; bodies are read and decompressed on demand.
+    """
+
+    DECODED_MAX_ENTRIES = 256
+
+    def __init__(self, path: str, speed: float):
+        self.file = open(path, "rb")
+        magic, version = self.FILE_HEADER.unpack(self.file.read(self.FILE_HEADER.size))
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a version {self.VERSION} traffic archive")
+        self.speed = speed
+        # key -> (recorded times, [(offset, body length, seconds taken)]) in recording order
+        self.index: Dict[str, tuple[List[float], List[tuple[int, int, float]]]] = {}
+        self.records = 0
+        self.first_at = math.inf
+        offset = self.FILE_HEADER.size
+        size = os.fstat(self.file.fileno()).st_size
+        while offset + self.RECORD_HEADER.size <= size:
+            self.file.seek(offset)
+            key_length, body_length, at, seconds = self.RECORD_HEADER.unpack(self.file.read(self.RECORD_HEADER.size))
+            body_offset = offset + self.RECORD_HEADER.size + key_length
+            if body_offset + body_length > size:
+                break
+            key = self.file.read(key_length).decode("utf-8")
+            times, entries = self.index.setdefault(key, ([], []))
+            times.append(at)
+            entries.append((body_offset, body_length, seconds))
+            self.first_at = min(self.first_at, at)
+            self.records += 1
+            offset = body_offset + body_length
+        self.started: float | None = None
+        self._turns: Dict[str, int] = {}
+        self._decoded: OrderedDict[int, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _pick(self, key: str) -> tuple[int, int, float] | None:
+        """The recording of a key due now on the replay clock"""
+        found = self.index.get(key)
+        if found is None:
+            return None
+        times, entries = found
+        if self.speed <= 0:
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+            return entries[turn % len(entries)]
+        if self.started is None:
+            self.started = time.monotonic()
+        clock = self.first_at + (time.monotonic() - self.started) * self.speed
+        return entries[max(0, bisect.bisect_right(times, clock) - 1)]
+
+    def _body(self, offset: int, length: int) -> dict:
+        data = self._decoded.get(offset)
+        if data is None:
+            self.file.seek(offset)
+            data = json.loads(zlib.decompress(self.file.read(length)))
+            self._decoded[offset] = data
+            if len(self._decoded) > self.DECODED_MAX_ENTRIES:
+                self._decoded.popitem(last=False)
+        else:
+            self._decoded.move_to_end(offset)
+        return data
+
+    async def fetch(self, url: str, params: dict | None) -> dict[str, Any] | None:
+        """The recorded response to a request, after its recorded latency on the replay clock"""
+        endpoint = endpoint_name(url)
+        entry = self._pick(archive_key(url, params))
+        if entry is None:
+            self.misses += 1
+            metrics.record_upstream(endpoint, "replay_miss")
+            print(f"No recorded response for {archive_key(url, params)}", file=sys.stderr)
+            return None
+        self.hits += 1
+        offset, length, seconds = entry
+        if self.speed > 0:
+            await asyncio.sleep(seconds / self.speed)
+        if not length:
+            metrics.record_upstream(endpoint, "replay_failed", seconds)
+            return None
+        metrics.record_upstream(endpoint, "replay", seconds, length)
+        return self._body(offset, length)
+
+    def stats(self) -> dict[str, Any]:
+        return {"records": self.records, "keys": len(self.index), "hits": self.hits, "misses": self.misses}
+
+traffic_recorder: TrafficRecorder | None = None
+traffic_replay: TrafficReplay | None = None
+
+def open_traffic_archive() -> None:
+    """Open the record or replay archive named by the settings, once"""
+    global traffic_recorder, traffic_replay, RECORD_PATH, REPLAY_PATH
+    try:
+        if REPLAY_PATH and traffic_replay is None:
+            traffic_replay = TrafficReplay(os.path.expanduser(REPLAY_PATH), REPLAY_SPEED)
+        elif RECORD_PATH and traffic_recorder is None:
+            traffic_recorder = TrafficRecorder(os.path.expanduser(RECORD_PATH))
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Traffic archive unavailable, calling WMATA directly: {e}", file=sys.stderr)
+        RECORD_PATH = REPLAY_PATH = None
+
+async def fetch_from_wmata(url: str, params: dict = None,
+                           priority: int = PRIORITY_INTERACTIVE) -> dict[str, Any] | None:
+    """Make an uncached request to WMATA API, or answer it from the replay archive"""
+    if REPLAY_PATH or RECORD_PATH:
+        open_traffic_archive()
+    if traffic_replay is not None:
+        return await traffic_replay.fetch(url, params)
+    if traffic_recorder is None:
+        return await _request_upstream(url, params, priority)
+    at, start = time.time(), time.perf_counter()
+    data = await _request_upstream(url, params, priority)
+    traffic_recorder.append(archive_key(url, params), at, time.perf_counter() - start, data)
+    return data
+
+async def _request_upstream(url: str, params: dict | None, priority: int) -> dict[str, Any] | None:
+    """Call WMATA with retries and error handling"""
+    endpoint = endpoint_name(url)
+    breaker = circuit_breakers.setdefault(endpoint, CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT))
+    if not breaker.allow():
+        metrics.record_upstream(endpoint, "circuit_open")
+        print(f"WMATA {endpoint} circuit is open; not calling upstream", file=sys.stderr)
+        return None
+    # allow() only lets a half-open circuit through for its single probe
+    probe = breaker.state == "half_open"
+    try:
+        return await _request_with_retries(url, params, priority, endpoint, breaker)
+    except BaseException:
+        # Cancelled (say by a deadline or shutdown) before an outcome was
+        # recorded; a probe left taken would keep the circuit from ever closing
+        if probe:
+            breaker.release()
+        raise
+
+async def _request_with_retries(url: str, params: dict | None, priority: int, endpoint: str,
+                                breaker: CircuitBreaker) -> dict[str, Any] | None:
+    """The attempts of one upstream request, recording the outcome on the breaker"""
+    import httpx
+
+    client = get_http_client()
+    deadline = time.monotonic() + REQUEST_DEADLINE
+    for attempt in range(max(1, RETRY_ATTEMPTS)):
         try:
-            response = await client.get(url, headers=headers, params=params, timeout=30.0)
+            await upstream_scheduler.acquire(priority, cache_key(url, params))
+            timeout = endpoint_timeout(url, deadline - time.monotonic())
+            start = time.perf_counter()
+            metrics.upstream_in_flight += 1
+            try:
+                response = await client.get(url, params=params, timeout=timeout)
+            except httpx.TransportError as e:
+                metrics.record_upstream(endpoint, type(e).__name__, time.perf_counter() - start)
+                raise
+            finally:
+                metrics.upstream_in_flight -= 1
+            metrics.record_upstream(endpoint, str(response.status_code), time.perf_counter() - start,
+                                    len(response.content))
+            if response.status_code == 429:
+                upstream_scheduler.throttle(_retry_after(response))
             response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            print(f"HTTP error: {e}")
+            data = response.json()
+            breaker.record_success()
+            return data
+        except RateLimitExceeded as e:
+            # Our own limit, not an upstream failure
+            breaker.release()
+            metrics.record_upstream(endpoint, "rate_limited")
+            print(f"Rate limited: {e}", file=sys.stderr)
             return None
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 and e.response.status_code != 429:
+                # The request itself is bad; WMATA is up and retrying will not help
+                breaker.record_success()
+                print(f"HTTP error: {e}", file=sys.stderr)
+                return None
+            error = e
+        except httpx.TransportError as e:
+            error = e
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            breaker.record_failure()
+            print(f"Unexpected error: {e}", file=sys.stderr)
+            return None
+
+        # Full jitter keeps concurrent retries from arriving in lockstep
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        if attempt + 1 >= RETRY_ATTEMPTS or time.monotonic() + delay >= deadline:
+            break
+        await asyncio.sleep(delay)
+
+    breaker.record_failure()
+    print(f"HTTP error: {error}", file=sys.stderr)
+    return None
+
+def _retry_after(response: "httpx.Response", default: float = 1.0) -> float:
+    """Seconds to back off from a Retry-After header, if WMATA sent one"""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", default)))
+    except ValueError:
+        return default
+
+def get_station_code(station_name: str) -> str | None:
+    """Convert station name to station code with fuzzy matching
+
+    Returns None when the name is unknown or ambiguous; use
+    suggest_stations() to tell the user which stations were close.
+    """
+    # Exact match first
+    station_code = STATIONS.code_for_name(station_name)
+    if station_code:
+        return station_code
+    
+    # If it's already a code, return uppercase
+    if len(station_name) <= 3 and STATIONS.is_code(station_name.upper()):
+        return station_name.upper()
+    
+    # Ranked fuzzy matching for partial names, aliases and typos
+    match = STATION_SEARCH.resolve(station_name)
+    return match.code if match else None
+
+def suggest_stations(station_name: str, limit: int = 5) -> str:
+    """A "Did you mean" line listing the closest stations, or an empty string"""
+    matches = STATION_SEARCH.search(station_name, limit)
+    if not matches:
+        return ""
+    return "\n🔎 Did you mean: " + ", ".join(f"{match.name} ({match.code})" for match in matches) + "?"
+
+def format_train_prediction(train: dict) -> str:
+    """Format a single train prediction"""
+    line = LINE_COLORS.get(train.get("Line", ""), train.get("Line", "Unknown"))
+    destination = train.get("DestinationName", "Unknown")
+    minutes = train.get("Min", "Unknown")
+    cars = train.get("Car", "Unknown")
+    
+    if minutes == "ARR":
+        time_info = "Arriving now"
+    elif minutes == "BRD":
+        time_info = "Boarding"
+    else:
+        time_info = f"{minutes} minutes"
+    
+    return f"🚇 {line} to {destination} - {time_info} ({cars} cars)"
+
+class RailRoute(NamedTuple):
+    steps: List[Dict]
+    minutes: float
+    transfers: int
+
+class RailNetwork:
+    """Rail network graph with transfer-aware shortest paths.
+
+    Nodes are (station code, line) pairs. Riding to a neighbouring station
+    costs the segment time and changing lines within a station costs the
+    transfer penalty. Dijkstra runs once from every station the first time a
+    route is requested; after that a route query only walks the stored
+    predecessor table.
+    """
+
+    def __init__(self, sequences: Dict[str, List[str]], registry: StationRegistry,
+                 segment_minutes: Dict[tuple[str, str], float] | None = None,
+                 transfer_minutes: float = TRANSFER_PENALTY_MINUTES):
+        self.sequences = sequences
+        self.registry = registry
+        self.transfer_minutes = transfer_minutes
+        self.nodes: List[tuple[str, str]] = []
+        self.node_index: Dict[tuple[str, str], int] = {}
+        self.adjacency: List[List[tuple[int, float]]] = []
+        # Nodes of every platform code of a station, keyed by its code group
+        self.station_nodes: Dict[tuple[str, ...], List[int]] = {}
+        # Position of each station code along each line, for leg alternatives
+        self.positions = {line: {code: i for i, code in enumerate(codes)} for line, codes in sequences.items()}
+        self._tables: Dict[tuple[str, ...], tuple[List[float], List[int]]] = {}
+
+        segment_minutes = segment_minutes or {}
+        for line, codes in sequences.items():
+            for code in codes:
+                self._node(code, line)
+            for a, b in zip(codes, codes[1:]):
+                minutes = segment_minutes.get((a, b)) or segment_minutes.get((b, a)) or DEFAULT_SEGMENT_MINUTES
+                u, v = self.node_index[(a, line)], self.node_index[(b, line)]
+                self.adjacency[u].append((v, minutes))
+                self.adjacency[v].append((u, minutes))
+        for nodes in self.station_nodes.values():
+            for u in nodes:
+                for v in nodes:
+                    if self.nodes[u][1] != self.nodes[v][1]:
+                        self.adjacency[u].append((v, transfer_minutes))
+
+    def _node(self, code: str, line: str) -> int:
+        key = (code, line)
+        if key not in self.node_index:
+            self.node_index[key] = len(self.nodes)
+            self.nodes.append(key)
+            self.adjacency.append([])
+            self.station_nodes.setdefault(self.registry.codes(code), []).append(self.node_index[key])
+        return self.node_index[key]
+
+    def _shortest_paths(self, sources: List[int]) -> tuple[List[float], List[int]]:
+        """Dijkstra from a set of source nodes; returns (distance, predecessor) per node.
+
+        Ties in travel time go to the path with fewer transfers.
+        """
+        dist = [float("inf")] * len(self.nodes)
+        transfers = [0] * len(self.nodes)
+        pred = [-1] * len(self.nodes)
+        heap = []
+        for node in sources:
+            dist[node] = 0.0
+            heap.append((0.0, 0, node))
+        heapq.heapify(heap)
+        while heap:
+            d, t, u = heapq.heappop(heap)
+            if (d, t) > (dist[u], transfers[u]):
+                continue
+            line = self.nodes[u][1]
+            for v, weight in self.adjacency[u]:
+                candidate = (d + weight, t + (self.nodes[v][1] != line))
+                if candidate < (dist[v], transfers[v]):
+                    dist[v], transfers[v] = candidate
+                    pred[v] = u
+                    heapq.heappush(heap, (candidate[0], candidate[1], v))
+        return dist, pred
+
+    def precompute(self) -> None:
+        """Fill the all-pairs predecessor table"""
+        for station, nodes in self.station_nodes.items():
+            if station not in self._tables:
+                self._tables[station] = self._shortest_paths(nodes)
+
+    def table(self, station: tuple[str, ...]) -> tuple[List[float], List[int]]:
+        if not self._tables:
+            self.precompute()
+        return self._tables[station]
+
+    def travel_minutes(self, from_code: str, to_code: str) -> float | None:
+        """Shortest travel time between two stations, including transfer penalties"""
+        src, dst = self.registry.codes(from_code), self.registry.codes(to_code)
+        if src not in self.station_nodes or dst not in self.station_nodes:
+            return None
+        dist, _ = self.table(src)
+        best = min(dist[node] for node in self.station_nodes[dst])
+        return None if best == float("inf") else best
+
+    def line_offsets(self, line: str) -> Dict[str, float]:
+        """Riding minutes from a line's first station to each of its stations, in line order"""
+        codes = self.sequences.get(line) or []
+        offsets, minutes = {}, 0.0
+        for previous, code in zip([None] + codes, codes):
+            if previous is not None:
+                u, v = self.node_index[(previous, line)], self.node_index[(code, line)]
+                minutes += next(weight for node, weight in self.adjacency[u] if node == v)
+            offsets[code] = minutes
+        return offsets
+
+    def route(self, from_code: str, to_code: str) -> RailRoute | None:
+        """Fastest route as start / transfer_to / arrive steps"""
+        src, dst = self.registry.codes(from_code), self.registry.codes(to_code)
+        if src not in self.station_nodes or dst not in self.station_nodes or src == dst:
+            return None
+        dist, pred = self.table(src)
+        end = min(self.station_nodes[dst], key=dist.__getitem__)
+        if dist[end] == float("inf"):
+            return None
+
+        path = [end]
+        while pred[path[-1]] != -1:
+            path.append(pred[path[-1]])
+        path.reverse()
+
+        # Split the path into legs ridden on a single line
+        legs: List[tuple[str, List[str]]] = []
+        for node in path:
+            code, line = self.nodes[node]
+            if legs and legs[-1][0] == line:
+                legs[-1][1].append(code)
+            else:
+                legs.append((line, [code]))
+
+        first_line, first_codes = legs[0]
+        steps = [{"station": first_codes[0], "name": self.registry.name(first_codes[0], first_codes[0]),
+                  "line": first_line, "action": "start",
+                  "alternatives": self._alternatives(first_line, first_codes)}]
+        for (line, codes), (next_line, next_codes) in zip(legs, legs[1:]):
+            steps.append({"station": next_codes[0], "name": self.registry.name(next_codes[0], next_codes[0]),
+                          "line": line, "action": "transfer_to", "next_line": next_line,
+                          "stops": len(codes) - 1, "alternatives": self._alternatives(next_line, next_codes)})
+        last_line, last_codes = legs[-1]
+        steps.append({"station": last_codes[-1], "name": self.registry.name(last_codes[-1], last_codes[-1]),
+                      "line": last_line, "action": "arrive", "stops": len(last_codes) - 1})
+        return RailRoute(steps, round(dist[end], 1), len(legs) - 1)
+
+    def _alternatives(self, line: str, codes: List[str]) -> List[str]:
+        """Other lines that run through the same consecutive stations as a leg"""
+        if len(codes) < 2:
+            return []
+        alternatives = []
+        for other, positions in self.positions.items():
+            if other == line or any(code not in positions for code in codes):
+                continue
+            indexes = [positions[code] for code in codes]
+            step = indexes[1] - indexes[0]
+            if abs(step) == 1 and all(b - a == step for a, b in zip(indexes, indexes[1:])):
+                alternatives.append(other)
+        return alternatives
+
+RAIL_NETWORK = RailNetwork(LINE_SEQUENCES, STATIONS)
+
+def format_route_steps(steps: List[Dict]) -> str:
+    """Format route steps as a numbered list of directions"""
+    def line_label(line: str, alternatives: List[str]) -> str:
+        label = LINE_COLORS.get(line, line)
+        if alternatives:
+            label += " (or " + ", ".join(LINE_COLORS.get(alt, alt) for alt in alternatives) + ")"
+        return label
+
+    def stops(count: int) -> str:
+        return f"{count} stop{'s' if count != 1 else ''}"
+
+    directions = ""
+    for i, step in enumerate(steps, 1):
+        action = step["action"]
+        station_name = step["name"]
+        line = LINE_COLORS.get(step["line"], step["line"])
+
+        if action == "start":
+            directions += f"{i}. Board {line_label(step['line'], step.get('alternatives', []))} at **{station_name}**\n"
+        elif action == "transfer_to":
+            next_line = line_label(step["next_line"], step.get("alternatives", []))
+            directions += f"{i}. Ride {stops(step['stops'])}, then transfer at **{station_name}** from {line} to {next_line}\n"
+        elif action == "arrive":
+            directions += f"{i}. Ride {stops(step['stops'])} and arrive at **{station_name}** on {line}\n"
+    return directions
+
+class PredictionStore:
+    """System-wide train predictions from a single GetPrediction/All snapshot.
+
+    Trains are indexed by LocationCode, Line and DestinationCode so any number
+    of stations can be answered from one upstream call.
+    """
+
+    def __init__(self):
+        self.trains: List[Dict] = []
+        self.fetched_at: float | None = None
+        self.by_location: Dict[str, List[Dict]] = {}
+        self.by_line: Dict[str, List[Dict]] = {}
+        self.by_destination: Dict[str, List[Dict]] = {}
+        self._source: dict | None = None
+
+    def load(self, data: dict) -> None:
+        """Index a GetPrediction/All response, skipping work if it is unchanged"""
+        if data is self._source:
+            return
+        by_location, by_line, by_destination = {}, {}, {}
+        trains = data.get("Trains") or []
+        for train in trains:
+            by_location.setdefault(train.get("LocationCode"), []).append(train)
+            by_line.setdefault(train.get("Line"), []).append(train)
+            by_destination.setdefault(train.get("DestinationCode"), []).append(train)
+        # Swap the indexes in together so readers never see a partial update
+        self.trains, self.by_location, self.by_line, self.by_destination = trains, by_location, by_line, by_destination
+        self._source = data
+        self.fetched_at = time.time()
+
+    async def refresh(self) -> tuple[dict | None, float | None]:
+        """Load the latest snapshot and return it with its age; the response cache keeps this to one upstream call per TTL"""
+        data, age = await get_feed("predictions")
+        if not data or "Trains" not in data:
+            return None, None
+        self.load(data)
+        return data, age
+
+    def find(self, location: str | None = None, line: str | None = None,
+             destination: str | None = None) -> List[Dict]:
+        """Trains matching every given filter, starting from the narrowest index"""
+        if location is not None:
+            candidates = self.by_location.get(location, [])
+            if line is not None:
+                candidates = [t for t in candidates if t.get("Line") == line]
+        elif line is not None:
+            candidates = self.by_line.get(line, [])
+        else:
+            candidates = self.trains
+        if destination is not None:
+            candidates = [t for t in candidates if t.get("DestinationCode") == destination]
+        return candidates
+
+prediction_store = PredictionStore()
+
+# Real-time feeds the background poller can keep in memory
+REALTIME_FEEDS = {
+    "predictions": "StationPrediction.svc/json/GetPrediction/All",
+    "incidents": "Incidents.svc/json/Incidents",
+    "elevator_incidents": "Incidents.svc/json/ElevatorIncidents",
+    "train_positions": "TrainPositions/TrainPositions?contentType=json",
+}
+
+class FeedSnapshot(NamedTuple):
+    data: dict
+    fetched_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+class RealtimePoller:
+    """Polls the real-time feeds at fixed cadences into in-memory snapshots.
+
+    Upstream load stays constant however many tool calls are served, and
+    listeners registered with on_update() see every new snapshot.
+    """
+
+    def __init__(self, feeds: Dict[str, str], intervals: Dict[str, float]):
+        self.feeds = feeds
+        self.intervals = intervals
+        self.snapshots: Dict[str, FeedSnapshot] = {}
+        self.listeners: Dict[str, List] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def on_update(self, feed: str, listener) -> None:
+        """Call listener(data) whenever a new snapshot of a feed arrives"""
+        self.listeners.setdefault(feed, []).append(listener)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, feeds: List[str] | None = None) -> None:
+        """Poll every feed with a cadence set, or only the given ones"""
+        if self._tasks:
+            return
+        for feed in feeds or self.feeds:
+            if self.intervals.get(feed, 0) > 0:
+                self._tasks.append(asyncio.create_task(self._poll(feed)))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _poll(self, feed: str) -> None:
+        interval = self.intervals[feed]
+        while True:
+            try:
+                data = await make_wmata_request(f"{WMATA_API_BASE}/{self.feeds[feed]}", refresh=True,
+                                                priority=PRIORITY_BACKGROUND)
+                if data:
+                    self.snapshots[feed] = FeedSnapshot(data, time.time())
+                    for listener in self.listeners.get(feed, []):
+                        listener(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Polling {feed} failed: {e}", file=sys.stderr)
+            await asyncio.sleep(interval)
+
+    def get(self, feed: str) -> FeedSnapshot | None:
+        """Latest snapshot of a feed, or None if there is none recent enough to serve"""
+        snapshot = self.snapshots.get(feed)
+        if snapshot is None or snapshot.age > self.intervals.get(feed, 0) * POLL_MAX_AGE_FACTOR:
+            return None
+        return snapshot
+
+realtime_poller = RealtimePoller(REALTIME_FEEDS, POLL_INTERVALS)
+realtime_poller.on_update("predictions", prediction_store.load)
+
+@lru_cache(maxsize=1)
+def _metro_zone():
+    """The Metro's time zone, or None when the time zone database is missing"""
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(METRO_TIMEZONE)
+    except Exception:
+        return None
+
+def metro_utc_offset(seconds: float) -> int:
+    """Seconds Metro local time is ahead of UTC at a moment (system local time without tz data)"""
+    zone = _metro_zone()
+    if zone is None:
+        return time.localtime(seconds).tm_gmtoff
+    from datetime import datetime, timezone
+    return int(datetime.fromtimestamp(seconds, timezone.utc).astimezone(zone).utcoffset().total_seconds())
+
+class WaitStats(NamedTuple):
+    samples: int
+    days: int
+    average: float | None
+    median: float | None
+    p90: float | None
+
+class PredictionLog:
+    """Logged predictions snapshots, one dictionary-encoded column file per field.
+
+    A row is one prediction: snapshot time, station, line, destination,
+    platform group, minutes and cars. Strings are stored as ids into one
+    shared dictionary, so a row takes 14 bytes. New rows go into a
+    fixed-size ring in memory and are appended to the column files in
+    batches. Queries read the files as arrays (memory-mapped with NumPy)
+    plus the rows still only in the ring. Rows are appended in time order,
+    so the first row of a recent window is found by binary search.
+    """
+
+    COLUMNS = {"time": "I", "station": "H", "line": "H", "destination": "H", "group": "B",
+               "minutes": "h", "cars": "B"}
+    # Minutes stored for the non-numeric predictions
+    BOARDING, ARRIVING, UNKNOWN = -1, 0, -2
+    FLUSH_SECONDS = 60.0
+
+    def __init__(self, directory: str | None, ring_rows: int, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self.capacity = max(1, ring_rows)
+        self.ring = {name: array(code, bytes(array(code).itemsize * self.capacity))
+                     for name, code in self.COLUMNS.items()}
+        self.written = 0  # rows ever put in the ring
+        self.flushed = 0  # of those, rows appended to the column files
+        self.disk_rows = 0
+        self.strings: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._saved_strings = 0
+        self._source: dict | None = None
+        self.last_at = 0.0
+        self.last_flush = time.monotonic()
+        self._lock_file = None
+        if directory is not None:
+            self._open()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.col")
+
+    def _lock(self) -> bool:
+        """Take the directory's lock for as long as this process runs, False when another process holds it"""
+        try:
+            import fcntl
+        except ImportError:  # no advisory locks on this platform
+            return True
+        self._lock_file = open(os.path.join(self.directory, "lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def _open(self) -> None:
+        """Read the dictionary and line the column files up to the rows they all hold"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Another writer would hand out the same string ids and interleave rows
+            if not self._lock():
+                print(f"Prediction log at {self.directory} is in use by another process, keeping recent "
+                      f"rows in memory only; give each server its own WMATA_PREDICTION_LOG_DIR", file=sys.stderr)
+                self.directory = None
+                return
+            try:
+                with open(os.path.join(self.directory, "dictionary.json"), encoding="utf-8") as f:
+                    self.strings = json.load(f)
+            except FileNotFoundError:
+                pass
+            sizes = {name: os.path.getsize(self._path(name)) if os.path.exists(self._path(name)) else 0
+                     for name in self.COLUMNS}
+            self.disk_rows = min(sizes[name] // array(code).itemsize for name, code in self.COLUMNS.items())
+            # A flush cut short leaves some columns longer than others
+            for name, code in self.COLUMNS.items():
+                if sizes[name] != self.disk_rows * array(code).itemsize:
+                    os.truncate(self._path(name), self.disk_rows * array(code).itemsize)
+        except (OSError, ValueError) as e:
+            print(f"Prediction log at {self.directory} unavailable, keeping recent rows in memory only: {e}",
+                  file=sys.stderr)
+            self.directory, self.strings, self.disk_rows = None, [], 0
+        self.ids = {value: i for i, value in enumerate(self.strings)}
+        self._saved_strings = len(self.strings)
+
+    def _id(self, value: str | None) -> int:
+        value = value or ""
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+    @classmethod
+    def encode_minutes(cls, value: str | None) -> int:
+        if value == "BRD":
+            return cls.BOARDING
+        if value == "ARR":
+            return cls.ARRIVING
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return cls.UNKNOWN
+
+    def load(self, data: dict, at: float | None = None) -> None:
+        """Append a GetPrediction/All snapshot taken at a time (now by default), at most one per interval"""
+        now = time.time() if at is None else at
+        if data is self._source or now - self.last_at < self.interval:
+            return
+        self._source, self.last_at = data, now
+        trains = (data.get("Trains") or [])[:self.capacity]
+        if self.written + len(trains) - self.flushed > self.capacity:
+            self.flush()
+        ring, at = self.ring, int(now)
+        for train in trains:
+            i = self.written % self.capacity
+            ring["time"][i] = at
+            ring["station"][i] = self._id(train.get("LocationCode"))
+            ring["line"][i] = self._id(train.get("Line"))
+            ring["destination"][i] = self._id(train.get("DestinationCode"))
+            group, cars = train.get("Group") or "", train.get("Car") or ""
+            ring["group"][i] = int(group) if group.isdigit() else 0
+            ring["minutes"][i] = self.encode_minutes(train.get("Min"))
+            ring["cars"][i] = int(cars) if cars.isdigit() else 0
+            self.written += 1
+        if (self.written - self.flushed >= self.capacity // 2
+                or time.monotonic() - self.last_flush >= self.FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self) -> None:
+        """Append the rows only held in the ring to the column files"""
+        self.last_flush = time.monotonic()
+        if self.directory is None or self.written == self.flushed:
+            return
+        start, end = self.flushed % self.capacity, self.written % self.capacity
+        try:
+            # New strings reach disk before any row that refers to them
+            if len(self.strings) > self._saved_strings:
+                path = os.path.join(self.directory, "dictionary.json")
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.strings, f, separators=(",", ":"))
+                os.replace(temp_path, path)
+                self._saved_strings = len(self.strings)
+            for name, column in self.ring.items():
+                with open(self._path(name), "ab") as f:
+                    if start < end:
+                        column[start:end].tofile(f)
+                    else:
+                        column[start:].tofile(f)
+                        column[:end].tofile(f)
+        except OSError as e:
+            print(f"Could not write the prediction log, keeping recent rows in memory only: {e}", file=sys.stderr)
+            self.directory = None
+            return
+        self.disk_rows += self.written - self.flushed
+        self.flushed = self.written
+
+    def close(self) -> None:
+        """Write out the ring and let another process take the directory"""
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def rows(self) -> int:
+        return self.disk_rows + self.written - max(self.flushed, self.written - self.capacity)
+
+    def _chunks(self, since: float) -> List[Dict[str, Any]]:
+        """Columns of the rows logged since a time: from the files, then from the ring"""
+        np = _numpy()
+        chunks = []
+        if self.directory is not None and self.disk_rows:
+            if np is not None:
+                chunks.append({name: np.memmap(self._path(name), dtype=code, mode="r", shape=(self.disk_rows,))
+                               for name, code in self.COLUMNS.items()})
+            else:
+                disk = {}
+                for name, code in self.COLUMNS.items():
+                    disk[name] = array(code)
+                    with open(self._path(name), "rb") as f:
+                        disk[name].fromfile(f, self.disk_rows)
+                chunks.append(disk)
+        first = max(self.flushed, self.written - self.capacity)
+        if first < self.written:
+            start, end = first % self.capacity, self.written % self.capacity
+            if start < end:
+                chunks.append({name: column[start:end] for name, column in self.ring.items()})
+            else:
+                chunks.append({name: column[start:] + column[:end] for name, column in self.ring.items()})
+        if np is not None:
+            chunks = [{name: np.asarray(column) if isinstance(column, np.ndarray)
+                       else np.frombuffer(column, dtype=self.COLUMNS[name]) for name, column in chunk.items()}
+                      for chunk in chunks]
+        cut = []
+        for chunk in chunks:
+            if np is None:
+                skip = bisect.bisect_left(chunk["time"], since)
+            else:
+                # A uint32 needle keeps searchsorted from converting the whole column
+                skip = int(np.searchsorted(chunk["time"], np.uint32(min(max(since, 0), 2 ** 32 - 1))))
+            cut.append({name: column[skip:] for name, column in chunk.items()})
+        return cut
+
+    def _select(self, since: float, stations: List[str] | None, line: str | None,
+                window: tuple[int, int] | None, weekdays_only: bool, boarding_only: bool,
+                columns: tuple[str, ...]) -> tuple[Dict[str, Any], Any]:
+        """The given columns of the matching rows, and their Metro local times in seconds"""
+        np = _numpy()
+        station_ids = None if stations is None else [self.ids[code] for code in stations if code in self.ids]
+        line_id = None if line is None else self.ids.get(line, -1)
+        if np is None:
+            return self._select_rows(since, station_ids, line_id, window, weekdays_only, boarding_only)
+        columns = ("time",) + tuple(name for name in columns if name != "time")
+        parts = []
+        for chunk in self._chunks(since):
+            minutes = chunk["minutes"]
+            mask = minutes == self.BOARDING if boarding_only else minutes != self.UNKNOWN
+            if station_ids is not None:
+                wanted = np.zeros(len(self.strings) + 1, dtype=bool)
+                wanted[station_ids] = True
+                mask &= wanted[chunk["station"]]
+            if line_id is not None:
+                mask &= chunk["line"] == line_id
+            # Gather only the columns the query reads
+            rows = np.flatnonzero(mask)
+            parts.append({name: chunk[name][rows] for name in columns})
+        selected = {name: np.concatenate([part[name] for part in parts]) if parts
+                    else np.empty(0, dtype=self.COLUMNS[name]) for name in columns}
+        times = selected["time"].astype(np.int64)
+        # Times are in order, so each hour is one run and needs one offset lookup
+        hours = times // 3600
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(hours)) + 1)) if len(hours) else hours
+        offsets = [metro_utc_offset(int(hour) * 3600) for hour in hours[starts]]
+        local = times + np.repeat(np.array(offsets, dtype=np.int64), np.diff(np.append(starts, len(hours))))
+        if window is None and not weekdays_only:
+            return selected, local
+        keep = np.ones(len(local), dtype=bool)
+        if window is not None:
+            minute = local % 86400 // 60
+            start, end = window
+            keep &= (minute >= start) & (minute < end) if start <= end else (minute >= start) | (minute < end)
+        if weekdays_only:
+            # The epoch fell on a Thursday; Monday is 0
+            keep &= (local // 86400 + 3) % 7 < 5
+        return {name: column[keep] for name, column in selected.items()}, local[keep]
+
+    def _select_rows(self, since: float, station_ids: List[int] | None, line_id: int | None,
+                     window: tuple[int, int] | None, weekdays_only: bool,
+                     boarding_only: bool) -> tuple[Dict[str, List], List[int]]:
+        """_select without NumPy, row by row"""
+        selected = {name: [] for name in self.COLUMNS}
+        local_times = []
+        wanted = None if station_ids is None else set(station_ids)
+        for chunk in self._chunks(since):
+            for i, minutes in enumerate(chunk["minutes"]):
+                if (minutes != self.BOARDING if boarding_only else minutes == self.UNKNOWN):
+                    continue
+                if wanted is not None and chunk["station"][i] not in wanted:
+                    continue
+                if line_id is not None and chunk["line"][i] != line_id:
+                    continue
+                local = chunk["time"][i] + metro_utc_offset(chunk["time"][i])
+                if window is not None:
+                    minute, (start, end) = local % 86400 // 60, window
+                    if not (start <= minute < end if start <= end else minute >= start or minute < end):
+                        continue
+                if weekdays_only and (local // 86400 + 3) % 7 >= 5:
+                    continue
+                for name in self.COLUMNS:
+                    selected[name].append(chunk[name][i])
+                local_times.append(local)
+        return selected, local_times
+
+    def wait_stats(self, since: float, stations: List[str], line: str | None = None,
+                   window: tuple[int, int] | None = None, weekdays_only: bool = False) -> WaitStats:
+        """Minutes until the next train at each logged moment, per platform, summarised"""
+        np = _numpy()
+        rows, local = self._select(since, stations, line, window, weekdays_only, boarding_only=False,
+                                   columns=("station", "group", "minutes"))
+        if np is None:
+            # The soonest train per snapshot, station and platform
+            soonest: Dict[tuple, int] = {}
+            for key in zip(rows["time"], rows["station"], rows["group"], rows["minutes"]):
+                wait = max(key[3], 0)
+                soonest[key[:3]] = min(soonest.get(key[:3], wait), wait)
+            waits = sorted(soonest.values())
+            if not waits:
+                return WaitStats(0, 0, None, None, None)
+            days = len({t // 86400 for t in local})
+            return WaitStats(len(waits), days, sum(waits) / len(waits), float(waits[len(waits) // 2]),
+                             float(waits[min(len(waits) - 1, int(len(waits) * 0.9))]))
+        if not len(local):
+            return WaitStats(0, 0, None, None, None)
+        key = (rows["time"].astype(np.int64) << 24) | (rows["station"].astype(np.int64) << 8) | rows["group"]
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+        waits = np.minimum.reduceat(np.maximum(rows["minutes"][order], 0), starts)
+        return WaitStats(len(waits), self._days(local), float(waits.mean()),
+                         float(np.median(waits)), float(np.percentile(waits, 90)))
+
+    def train_lengths(self, since: float, stations: List[str] | None = None, line: str | None = None,
+                      window: tuple[int, int] | None = None,
+                      weekdays_only: bool = False) -> tuple[Dict[int, int], int]:
+        """Trains seen boarding by car count, and the days they were seen on"""
+        np = _numpy()
+        rows, local = self._select(since, stations, line, window, weekdays_only, boarding_only=True,
+                                   columns=("cars",))
+        if np is None:
+            counts: Dict[int, int] = {}
+            for cars in rows["cars"]:
+                if cars:
+                    counts[cars] = counts.get(cars, 0) + 1
+            return counts, len({t // 86400 for t in local})
+        cars = rows["cars"]
+        counts = np.bincount(cars[cars > 0])
+        return {int(n): int(count) for n, count in enumerate(counts) if count}, self._days(local)
+
+    @staticmethod
+    def _days(local) -> int:
+        """Distinct local dates among local times in order"""
+        np = _numpy()
+        return int(np.count_nonzero(np.diff(local // 86400))) + 1 if len(local) else 0
+
+prediction_log: PredictionLog | None = None
+
+def get_prediction_log() -> PredictionLog | None:
+    """The prediction log, opened on first use when enabled"""
+    global prediction_log
+    if PREDICTION_LOG_ENABLED and prediction_log is None:
+        prediction_log = PredictionLog(PREDICTION_LOG_DIR, PREDICTION_LOG_RING_ROWS, PREDICTION_LOG_INTERVAL)
+    return prediction_log
+
+def log_predictions(data: dict) -> None:
+    log = get_prediction_log()
+    if log is not None:
+        log.load(data)
+
+realtime_poller.on_update("predictions", log_predictions)
+
+async def get_feed(feed: str) -> tuple[dict | None, float | None]:
+    """Data for a real-time feed plus its age in seconds when served from a poller snapshot"""
+    snapshot = realtime_poller.get(feed)
+    if snapshot is not None:
+        return snapshot.data, snapshot.age
+    return await make_wmata_request(f"{WMATA_API_BASE}/{REALTIME_FEEDS[feed]}"), None
+
+async def station_predictions(station_code: str) -> tuple[dict | None, float | None]:
+    """Predictions for every platform of a station, from the poller snapshot when there is a recent one"""
+    snapshot = realtime_poller.get("predictions")
+    if snapshot is not None:
+        return {"Trains": [train for code in STATIONS.codes(station_code)
+                           for train in prediction_store.find(location=code)]}, snapshot.age
+    # Transfer stations report each level under its own code, so ask for all of them
+    url = f"{WMATA_API_BASE}/StationPrediction.svc/json/GetPrediction/{','.join(STATIONS.codes(station_code))}"
+    return await make_wmata_request(url), None
+
+def format_data_age(age: float | None) -> str:
+    """A short note saying how old snapshot data is, or nothing for live data"""
+    if age is None:
+        return ""
+    return f"\n\n🕒 Data as of {age:.0f}s ago"
+
+def format_stale_note(data: dict | None) -> str:
+    """A warning for responses served from the cache because WMATA could not be reached"""
+    if not data or STALE_AGE_KEY not in data:
+        return ""
+    age = data[STALE_AGE_KEY]
+    when = f"{age / 60:.0f} min" if age >= 120 else f"{age:.0f}s"
+    return f"\n\n⚠️ WMATA is not responding; showing the last good data from {when} ago"
+
+class AlertChanges(NamedTuple):
+    added: List[Dict]
+    updated: List[Dict]
+    removed: List[Dict]
+    reset: bool  # the token was unknown or too old, so everything current is in added
+
+class AlertTracker:
+    """Versioned view of the incident feed for incremental polling.
+
+    Incidents are keyed by IncidentID and compared by DateUpdated. Each load
+    that changes anything bumps the version and stamps the changed incidents
+    with it, so answering "what changed since version N" only compares
+    stamps, and an unchanged feed leaves the version alone. Tokens carry the
+    server's start time so a token from an earlier run forces a full resync.
+    """
+
+    MAX_REMOVED = 256
+
+    def __init__(self):
+        self.epoch = f"{int(time.time()):x}"
+        self.version = 0
+        self.incidents: Dict[str, Dict] = {}
+        self.added_in: Dict[str, int] = {}
+        self.changed_in: Dict[str, int] = {}
+        # id -> (version removed, version added, last incident); oldest first
+        self.removed: OrderedDict[str, tuple[int, int, Dict]] = OrderedDict()
+        self.oldest_known = 0  # tokens older than this may have lost removals
+        self._source: dict | None = None
+
+    @staticmethod
+    def incident_id(incident: Dict) -> str:
+        return incident.get("IncidentID") or f"{incident.get('IncidentType')}|{incident.get('Description')}"
+
+    def load(self, data: dict) -> None:
+        """Diff an Incidents response against the tracked set, skipping work if it is unchanged"""
+        if data is self._source:
+            return
+        self._source = data
+        current = {self.incident_id(incident): incident for incident in data.get("Incidents") or []}
+        added = [key for key in current if key not in self.incidents]
+        updated = [key for key, incident in current.items()
+                   if key in self.incidents and incident.get("DateUpdated") != self.incidents[key].get("DateUpdated")]
+        removed = [key for key in self.incidents if key not in current]
+        previous, self.incidents = self.incidents, current
+        if not (added or updated or removed):
+            return
+        self.version += 1
+        for key in added:
+            self.added_in[key] = self.changed_in[key] = self.version
+            self.removed.pop(key, None)
+        for key in updated:
+            self.changed_in[key] = self.version
+        for key in removed:
+            del self.changed_in[key]
+            self.removed[key] = (self.version, self.added_in.pop(key), previous[key])
+        while len(self.removed) > self.MAX_REMOVED:
+            _, (version, _, _) = self.removed.popitem(last=False)
+            self.oldest_known = version
+
+    def token(self) -> str:
+        return f"{self.epoch}.{self.version}"
+
+    def parse_token(self, token: str) -> int | None:
+        """The version a token refers to, or None if it is not from this run"""
+        epoch, _, version = token.strip().partition(".")
+        if epoch != self.epoch or not version.isdigit() or int(version) > self.version:
+            return None
+        return int(version)
+
+    def changes_since(self, token: str) -> AlertChanges:
+        since = self.parse_token(token)
+        if since is None or since < self.oldest_known:
+            return AlertChanges(list(self.incidents.values()), [], [], True)
+        if since == self.version:
+            return AlertChanges([], [], [], False)
+        added = [incident for key, incident in self.incidents.items() if self.added_in[key] > since]
+        updated = [incident for key, incident in self.incidents.items()
+                   if self.changed_in[key] > since >= self.added_in[key]]
+        # Incidents that came and went after the token was issued were never seen
+        removed = [incident for version, added_in, incident in self.removed.values()
+                   if version > since >= added_in]
+        return AlertChanges(added, updated, removed, False)
+
+alert_tracker = AlertTracker()
+realtime_poller.on_update("incidents", alert_tracker.load)
+
+class OutageIndex:
+    """Elevator and escalator outages from one ElevatorIncidents response.
+
+    Outages are indexed by station code, line and unit type so a query for
+    one station or line touches only its own outages.
+    """
+
+    def __init__(self):
+        self.outages: List[Dict] = []
+        self.by_station: Dict[str, List[Dict]] = {}
+        self.by_line: Dict[str, List[Dict]] = {}
+        self.by_unit_type: Dict[str, List[Dict]] = {}
+        self._source: dict | None = None
+
+    @staticmethod
+    def unit_type(text: str) -> str:
+        """Normalise "elevators", "Escalator" and the like to WMATA's ELEVATOR/ESCALATOR"""
+        return text.strip().upper().rstrip("S")
+
+    def load(self, data: dict) -> None:
+        """Index an ElevatorIncidents response, skipping work if it is unchanged"""
+        if data is self._source:
+            return
+        by_station, by_line, by_unit_type = {}, {}, {}
+        outages = data.get("ElevatorIncidents") or []
+        for outage in outages:
+            station_code = outage.get("StationCode", "")
+            by_station.setdefault(station_code, []).append(outage)
+            for line in STATIONS.lines(station_code):
+                by_line.setdefault(line, []).append(outage)
+            by_unit_type.setdefault(self.unit_type(outage.get("UnitType") or ""), []).append(outage)
+        self.outages, self.by_station, self.by_line, self.by_unit_type = outages, by_station, by_line, by_unit_type
+        self._source = data
+
+    def find(self, station: str | None = None, line: str | None = None,
+             unit_type: str | None = None) -> List[Dict]:
+        """Outages matching every given filter, starting from the narrowest index"""
+        if station is not None:
+            candidates = [outage for code in STATIONS.codes(station) for outage in self.by_station.get(code, [])]
+            if line is not None:
+                candidates = [outage for outage in candidates if line in STATIONS.lines(outage.get("StationCode", ""))]
+        elif line is not None:
+            candidates = self.by_line.get(line, [])
+        else:
+            candidates = self.outages
+        if unit_type is not None:
+            unit_type = self.unit_type(unit_type)
+            candidates = [outage for outage in candidates if self.unit_type(outage.get("UnitType") or "") == unit_type]
+        return candidates
+
+    def counts(self, outages: List[Dict]) -> Dict[str, int]:
+        """Number of outages per unit type"""
+        counts = {}
+        for outage in outages:
+            unit_type = self.unit_type(outage.get("UnitType") or "")
+            counts[unit_type] = counts.get(unit_type, 0) + 1
+        return counts
+
+outage_index = OutageIndex()
+realtime_poller.on_update("elevator_incidents", outage_index.load)
+
+def resolve_line(line: str) -> str | None:
+    """Line code for a code or color name such as "BL", "blue" or "Blue Line" """
+    text = line.strip().lower()
+    for code, name in LINE_COLORS.items():
+        if text in (code.lower(), name.lower(), name.split()[0].lower()):
+            return code
+    return None
+
+class CircuitMap:
+    """Where each track circuit lies along the lines, from TrainPositions/StandardRoutes.
+
+    Every circuit on a line's standard route gets a position in riding
+    minutes from the line's first station, interpolated between the station
+    circuits using the network's segment times, so trains on either track
+    compare on one scale. Circuits shared by several lines get a position on
+    each. Per line the circuits are also kept sorted by position in two
+    parallel arrays, so the circuits between two stations are a bisect away.
+    """
+
+    def __init__(self, routes: List[Dict], network: RailNetwork):
+        self.positions: Dict[str, Dict[int, float]] = {}  # line -> circuit -> minutes
+        self.stations: Dict[int, str] = {}  # station circuit -> station code
+        # line -> (station minutes, station codes) in line order
+        self.stops: Dict[str, tuple[List[float], List[str]]] = {}
+        self.sorted: Dict[str, tuple[array, array]] = {}  # line -> (minutes, circuit ids) by minutes
+        for route in routes:
+            line = route.get("LineCode")
+            offsets = network.line_offsets(line) if line in network.sequences else {}
+            if not offsets:
+                continue
+            self.stops[line] = (list(offsets.values()), list(offsets))
+            circuits = sorted(route.get("TrackCircuits") or [], key=lambda circuit: circuit.get("SeqNum", 0))
+            anchors = []
+            for i, circuit in enumerate(circuits):
+                code = circuit.get("StationCode")
+                if not code:
+                    continue
+                self.stations[circuit["CircuitId"]] = code
+                minutes = next((offsets[c] for c in network.registry.codes(code) if c in offsets), None)
+                if minutes is not None:
+                    anchors.append((i, minutes))
+            if not anchors:
+                continue
+            positions = self.positions.setdefault(line, {})
+            k = 0
+            for i, circuit in enumerate(circuits):
+                while k + 1 < len(anchors) and anchors[k + 1][0] <= i:
+                    k += 1
+                i0, m0 = anchors[k]
+                if i <= i0 or k + 1 == len(anchors):
+                    positions[circuit["CircuitId"]] = m0
+                else:
+                    i1, m1 = anchors[k + 1]
+                    positions[circuit["CircuitId"]] = m0 + (m1 - m0) * (i - i0) / (i1 - i0)
+        for line, positions in self.positions.items():
+            ordered = sorted(positions.items(), key=lambda item: item[1])
+            self.sorted[line] = (array("d", [minutes for _, minutes in ordered]),
+                                 array("q", [circuit for circuit, _ in ordered]))
+
+    def offset(self, line: str, code: str) -> float | None:
+        """Minutes from the line's first station to a station, or None if the line does not stop there"""
+        stops = self.stops.get(line)
+        if stops is None:
+            return None
+        for c in STATIONS.codes(code):
+            if c in stops[1]:
+                return stops[0][stops[1].index(c)]
+        return None
+
+    def circuits_between(self, line: str, start: float, end: float) -> array:
+        """Circuits of a line whose positions fall within [start, end] minutes"""
+        minutes, circuits = self.sorted.get(line, (array("d"), array("q")))
+        return circuits[bisect.bisect_left(minutes, start):bisect.bisect_right(minutes, end)]
+
+    def neighbours(self, line: str, minutes: float, heading: int) -> tuple[str | None, str | None]:
+        """Last station passed and next station ahead for a train at a position"""
+        times, codes = self.stops[line]
+        if heading > 0:
+            i = bisect.bisect_right(times, minutes)
+            return codes[i - 1] if i else None, codes[i] if i < len(codes) else None
+        i = bisect.bisect_left(times, minutes)
+        return codes[i] if i < len(codes) else None, codes[i - 1] if i else None
+
+    def place(self, train: "TrainState") -> None:
+        """Set a train's position, station and heading along its line"""
+        train.position = self.positions.get(train.line, {}).get(train.circuit)
+        train.station = self.stations.get(train.circuit)
+        train.heading = 1 if train.direction == 1 else -1
+        if train.position is not None and train.destination:
+            # The destination gives the heading regardless of how the tracks are numbered
+            destination = self.offset(train.line, train.destination)
+            if destination is not None and destination != train.position:
+                train.heading = 1 if destination > train.position else -1
+
+class TrainState:
+    """One train's latest reported circuit plus its place along its line"""
+
+    __slots__ = ("train_id", "number", "line", "circuit", "destination", "direction", "cars", "service",
+                 "seconds", "position", "station", "heading")
+
+    def __init__(self, train_id: str):
+        self.train_id = train_id
+        self.circuit: int | None = None
+        self.line: str | None = None
+        self.destination: str | None = None
+        self.direction: int | None = None
+        self.position: float | None = None
+        self.station: str | None = None
+        self.heading = 1
+
+    def update(self, record: Dict) -> bool:
+        """Apply a TrainPositions record; True if the train moved or changed route"""
+        self.number = record.get("TrainNumber")
+        self.cars = record.get("CarCount") or 0
+        self.service = record.get("ServiceType")
+        self.seconds = record.get("SecondsAtLocation") or 0
+        place = (record.get("CircuitId"), record.get("LineCode"), record.get("DestinationStationCode"),
+                 record.get("DirectionNum"))
+        if place == (self.circuit, self.line, self.destination, self.direction):
+            return False
+        self.circuit, self.line, self.destination, self.direction = place
+        self.position = None
+        return True
+
+    @property
+    def in_service(self) -> bool:
+        return self.line is not None and self.service != "NoPassengers"
+
+class LineHeadway(NamedTuple):
+    line: str
+    heading: int  # 1 runs toward the line's last station, -1 toward its first
+    trains: int
+    gaps: List[float]  # minutes between consecutive trains, back to front
+    longest: tuple[str | None, str | None] | None  # stations bounding the longest gap, in travel order
+
+    @property
+    def average(self) -> float | None:
+        return sum(self.gaps) / len(self.gaps) if self.gaps else None
+
+class TrainPositionStore:
+    """Live train positions from TrainPositions, updated in place on every poll.
+
+    Trains are keyed by TrainId and indexed by the circuit they occupy. A new
+    response only touches trains that appeared, moved or vanished; a train
+    still on the same circuit just gets its dwell time updated. Trains that
+    moved are placed along their line lazily, the next time a query needs
+    positions, so polls that nobody reads cost only the diff.
+    """
+
+    def __init__(self):
+        self.trains: Dict[str, TrainState] = {}
+        self.by_circuit: Dict[int, set[str]] = {}
+        self.changes = (0, 0, 0)  # trains added, moved and removed by the last load
+        self.fetched_at: float | None = None
+        self._unplaced: set[str] = set()
+        self.circuits: CircuitMap | None = None  # map the trains were last placed on
+        self._source: dict | None = None
+
+    def _unindex(self, circuit: int | None, train_id: str) -> None:
+        ids = self.by_circuit.get(circuit)
+        if ids is not None:
+            ids.discard(train_id)
+            if not ids:
+                del self.by_circuit[circuit]
+
+    def load(self, data: dict) -> None:
+        """Apply a TrainPositions response as a diff, skipping work if it is unchanged"""
+        if data is self._source:
+            return
+        self._source = data
+        seen, added, moved = set(), 0, 0
+        for record in data.get("TrainPositions") or []:
+            train_id = record.get("TrainId")
+            if not train_id:
+                continue
+            seen.add(train_id)
+            train = self.trains.get(train_id)
+            if train is None:
+                train = self.trains[train_id] = TrainState(train_id)
+                added += 1
+            elif train.circuit != record.get("CircuitId"):
+                moved += 1
+            circuit = train.circuit
+            if train.update(record):
+                self._unindex(circuit, train_id)
+                self.by_circuit.setdefault(train.circuit, set()).add(train_id)
+                self._unplaced.add(train_id)
+        removed = [train_id for train_id in self.trains if train_id not in seen]
+        for train_id in removed:
+            self._unindex(self.trains.pop(train_id).circuit, train_id)
+            self._unplaced.discard(train_id)
+        self.changes = (added, moved, len(removed))
+        self.fetched_at = time.time()
+
+    def place(self, circuits: CircuitMap) -> None:
+        """Position the trains that moved since the last call, or all of them for a new circuit map"""
+        pending = self.trains if circuits is not self.circuits else self._unplaced
+        for train_id in pending:
+            circuits.place(self.trains[train_id])
+        self.circuits, self._unplaced = circuits, set()
+
+    def between(self, line: str, start: float, end: float) -> List[TrainState]:
+        """Trains of any line on the circuits of a line between two positions"""
+        trains = {}
+        for circuit in self.circuits.circuits_between(line, start, end) if self.circuits else []:
+            for train_id in self.by_circuit.get(circuit, ()):
+                trains[train_id] = self.trains[train_id]
+        return list(trains.values())
+
+    def headways(self, line: str) -> List[LineHeadway]:
+        """Gaps between consecutive in-service trains of a line, for each direction"""
+        result = []
+        for heading in (1, -1):
+            positions = sorted((train.position for train in self.trains.values()
+                                if train.line == line and train.heading == heading and train.in_service
+                                and train.position is not None), key=lambda minutes: minutes * heading)
+            gaps = [abs(b - a) for a, b in zip(positions, positions[1:])]
+            longest = None
+            if gaps:
+                i = max(range(len(gaps)), key=gaps.__getitem__)
+                behind, ahead = positions[i], positions[i + 1]
+                # From the last station the trailing train passed to the next one the leading train reaches
+                longest = (self.circuits.neighbours(line, behind, heading)[0],
+                           self.circuits.neighbours(line, ahead, heading)[1])
+            result.append(LineHeadway(line, heading, len(positions), gaps, longest))
+        return result
+
+train_positions = TrainPositionStore()
+realtime_poller.on_update("train_positions", train_positions.load)
+
+# (StandardRoutes list, network it was placed on, circuit map)
+circuit_map: tuple[Any, RailNetwork, CircuitMap] | None = None
+
+async def get_circuit_map() -> CircuitMap | None:
+    """Circuit positions from the standard routes, rebuilt when the routes or the network change"""
+    global circuit_map
+    data = await make_wmata_request(f"{WMATA_API_BASE}/TrainPositions/StandardRoutes?contentType=json")
+    if not data or "StandardRoutes" not in data:
+        return circuit_map[2] if circuit_map is not None else None
+    # Stale copies of the response share its route list, so they do not force a rebuild
+    if circuit_map is None or circuit_map[0] is not data["StandardRoutes"] or circuit_map[1] is not RAIL_NETWORK:
+        circuit_map = (data["StandardRoutes"], RAIL_NETWORK, CircuitMap(data["StandardRoutes"], RAIL_NETWORK))
+    return circuit_map[2]
+
+async def refresh_train_positions() -> tuple[dict | None, float | None]:
+    """Load the latest train positions and place them along the lines; data is None if unavailable"""
+    (data, age), circuits = await asyncio.gather(get_feed("train_positions"), get_circuit_map())
+    if not data or "TrainPositions" not in data or circuits is None:
+        return None, None
+    train_positions.load(data)
+    train_positions.place(circuits)
+    return data, age
+
+class StationMatrix:
+    """All-pairs station-to-station fares and travel times.
+
+    Each field is one flat float32 array indexed by
+    origin ordinal * station count + destination ordinal, so a lookup is two
+    dict hits and an array read. Missing pairs hold NaN.
+    """
+
+    FIELDS = ("RailTime", "PeakTime", "OffPeakTime", "SeniorDisabled", "CompositeMiles")
+    MAGIC = b"WMTX"
+    VERSION = 1
+
+    def __init__(self, codes: List[str], columns: Dict[str, array], fetched_at: float):
+        self.codes = codes
+        self.ordinal = {code: i for i, code in enumerate(codes)}
+        self.columns = columns
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def from_response(cls, data: dict) -> "StationMatrix":
+        """Build from an unfiltered jSrcStationToDstStationInfo response"""
+        infos = data.get("StationToStationInfos") or []
+        codes = sorted({info["SourceStation"] for info in infos} | {info["DestinationStation"] for info in infos})
+        ordinal = {code: i for i, code in enumerate(codes)}
+        size = len(codes)
+        columns = {field: array("f", [math.nan]) * (size * size) for field in cls.FIELDS}
+        for info in infos:
+            index = ordinal[info["SourceStation"]] * size + ordinal[info["DestinationStation"]]
+            fare = info.get("RailFare") or {}
+            values = {"RailTime": info.get("RailTime"), "CompositeMiles": info.get("CompositeMiles"), **fare}
+            for field in cls.FIELDS:
+                if values.get(field) is not None:
+                    columns[field][index] = values[field]
+        return cls(codes, columns, time.time())
+
+    def _index(self, from_code: str, to_code: str) -> int | None:
+        size = len(self.codes)
+        # Transfer stations appear under each platform code; use whichever is present
+        for origin in STATIONS.codes(from_code):
+            for destination in STATIONS.codes(to_code):
+                if origin in self.ordinal and destination in self.ordinal:
+                    index = self.ordinal[origin] * size + self.ordinal[destination]
+                    if not math.isnan(self.columns["RailTime"][index]):
+                        return index
+        return None
+
+    def lookup(self, from_code: str, to_code: str) -> dict | None:
+        """Station-to-station info shaped like one StationToStationInfos entry"""
+        index = self._index(from_code, to_code)
+        if index is None:
+            return None
+        value = {field: self.columns[field][index] for field in self.FIELDS}
+        fare = {field: round(value[field], 2) for field in ("PeakTime", "OffPeakTime", "SeniorDisabled")
+                if not math.isnan(value[field])}
+        return {
+            "SourceStation": from_code,
+            "DestinationStation": to_code,
+            "RailTime": int(value["RailTime"]),
+            "CompositeMiles": None if math.isnan(value["CompositeMiles"]) else round(value["CompositeMiles"], 2),
+            "RailFare": fare,
+        }
+
+    def segment_minutes(self, sequences: Dict[str, List[str]]) -> Dict[tuple[str, str], float]:
+        """Measured travel times between neighbouring stations, for the rail network"""
+        minutes = {}
+        for codes in sequences.values():
+            for a, b in zip(codes, codes[1:]):
+                info = self.lookup(a, b)
+                if info and info["RailTime"] > 0:
+                    minutes[(a, b)] = float(info["RailTime"])
+        return minutes
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < MATRIX_TTL
+
+    def save(self, path: str) -> None:
+        """Write atomically: a compact binary header, the station codes, then each column"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = struct.pack("<4sHHd?", self.MAGIC, self.VERSION, len(self.codes), self.fetched_at,
+                             sys.byteorder == "little")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            f.write("".join(code.ljust(3)[:3] for code in self.codes).encode("ascii"))
+            for field in self.FIELDS:
+                self.columns[field].tofile(f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "StationMatrix | None":
+        """Read a saved matrix, or None if it is missing or in another format"""
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        header_size = struct.calcsize("<4sHHd?")
+        if len(raw) < header_size:
+            return None
+        magic, version, size, fetched_at, little_endian = struct.unpack_from("<4sHHd?", raw)
+        if magic != cls.MAGIC or version != cls.VERSION or little_endian != (sys.byteorder == "little"):
+            return None
+        offset = header_size
+        codes = [raw[offset + i * 3:offset + i * 3 + 3].decode("ascii").strip() for i in range(size)]
+        offset += size * 3
+        column_bytes = size * size * array("f").itemsize
+        if len(raw) != offset + column_bytes * len(cls.FIELDS):
+            return None
+        columns = {}
+        for field in cls.FIELDS:
+            columns[field] = array("f")
+            columns[field].frombytes(raw[offset:offset + column_bytes])
+            offset += column_bytes
+        return cls(codes, columns, fetched_at)
+
+MATRIX_PATH = os.path.join(DATA_DIR, "station_matrix.bin")
+station_matrix: StationMatrix | None = None
+_matrix_lock = asyncio.Lock()
+_matrix_refresh_task: asyncio.Task | None = None
+
+def install_station_matrix(matrix: StationMatrix) -> None:
+    """Make a matrix current and recalibrate routing with its measured segment times"""
+    global station_matrix, RAIL_NETWORK
+    station_matrix = matrix
+    RAIL_NETWORK = build_rail_network()
+
+async def get_station_matrix(priority: int = PRIORITY_INTERACTIVE) -> StationMatrix | None:
+    """Current fare/time matrix: from memory, then disk, then one bulk API call.
+
+    A stale matrix is returned at once while one background task refreshes
+    it; callers only wait for WMATA when there is no matrix at all.
+    """
+    if station_matrix is not None and station_matrix.is_fresh():
+        return station_matrix
+    if station_matrix is None:
+        async with _matrix_lock:
+            if station_matrix is None:
+                saved = await asyncio.to_thread(StationMatrix.load, MATRIX_PATH)
+                if saved is not None:
+                    install_station_matrix(saved)
+                else:
+                    await _fetch_station_matrix(priority)
+    if station_matrix is not None and not station_matrix.is_fresh():
+        start_matrix_refresh()
+    return station_matrix
+
+async def _fetch_station_matrix(priority: int) -> None:
+    """Fetch, install and save the matrix in one bulk call; the caller holds _matrix_lock"""
+    data = await make_wmata_request(f"{WMATA_API_BASE}/Rail.svc/json/jSrcStationToDstStationInfo",
+                                    priority=priority)
+    if data and data.get("StationToStationInfos"):
+        matrix = StationMatrix.from_response(data)
+        install_station_matrix(matrix)
+        try:
+            await asyncio.to_thread(matrix.save, MATRIX_PATH)
+        except OSError as e:
+            print(f"Could not save station matrix: {e}", file=sys.stderr)
+
+async def _refresh_stale_matrix() -> None:
+    async with _matrix_lock:
+        if station_matrix is None or not station_matrix.is_fresh():
+            await _fetch_station_matrix(PRIORITY_BACKGROUND)
+
+def start_matrix_refresh() -> None:
+    """Refresh a stale matrix in the background, unless a refresh is already running"""
+    global _matrix_refresh_task
+    if _matrix_refresh_task is None or _matrix_refresh_task.done():
+        _matrix_refresh_task = asyncio.create_task(_run_background(_refresh_stale_matrix(), "station matrix refresh"))
+
+async def get_station_to_station(from_code: str, to_code: str) -> dict | None:
+    """Fare and travel time for one pair, from the matrix when possible"""
+    matrix = await get_station_matrix()
+    if matrix is not None:
+        info = matrix.lookup(from_code, to_code)
+        if info is not None:
+            return info
+
+    url = f"{WMATA_API_BASE}/Rail.svc/json/jSrcStationToDstStationInfo"
+    data = await make_wmata_request(url, {"FromStationCode": from_code, "ToStationCode": to_code})
+    if not data or not data.get("StationToStationInfos"):
+        return None
+    return data["StationToStationInfos"][0]
+
+# Average train speed including dwell time (about 33 mph), used to turn
+# jPath distances into segment times when no measured time is available
+RAIL_FEET_PER_MINUTE = 2900.0
+
+class StaticDataSnapshot:
+    """Versioned copy of WMATA's rail static data: stations, lines, paths and entrances.
+
+    Saved as compact JSON next to the fare/time matrix so a restart can
+    rebuild every station table without touching the network.
+    """
+
+    VERSION = 1
+    STATION_FIELDS = ("Code", "Name", "LineCode1", "LineCode2", "LineCode3", "LineCode4",
+                      "StationTogether1", "Lat", "Lon", "Address")
+    LINE_FIELDS = ("LineCode", "DisplayName", "StartStationCode", "EndStationCode")
+    ENTRANCE_FIELDS = ("Name", "StationCode1", "StationCode2", "Lat", "Lon", "Description")
+
+    def __init__(self, stations: List[Dict], lines: List[Dict], paths: Dict[str, List[tuple[str, float]]],
+                 entrances: List[Dict], fetched_at: float):
+        self.stations = stations
+        self.lines = lines
+        self.paths = paths
+        self.entrances = entrances
+        self.fetched_at = fetched_at
+        self.by_code = {station["Code"]: station for station in stations}
+
+    @classmethod
+    def from_responses(cls, stations: dict, lines: dict, paths: Dict[str, dict], entrances: dict) -> "StaticDataSnapshot":
+        """Build from jStations, jLines, per-line jPath and jStationEntrances responses"""
+        def trim(items: List[Dict], fields: tuple[str, ...]) -> List[Dict]:
+            return [{field: item.get(field) for field in fields} for item in items]
+
+        return cls(
+            trim(stations.get("Stations") or [], cls.STATION_FIELDS),
+            trim(lines.get("Lines") or [], cls.LINE_FIELDS),
+            {line: [(item["StationCode"], item.get("DistanceToPrev") or 0)
+                    for item in sorted(path.get("Path") or [], key=lambda item: item["SeqNum"])]
+             for line, path in paths.items()},
+            trim(entrances.get("Entrances") or [], cls.ENTRANCE_FIELDS),
+            time.time(),
+        )
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < STATIC_DATA_TTL
+
+    def station_mapping(self) -> Dict[str, str]:
+        """Station name -> code, keeping the bundled code for transfer station names"""
+        mapping = {}
+        for station in sorted(self.stations, key=lambda station: station["Code"]):
+            name, code = station["Name"], station["Code"]
+            if name not in mapping or STATION_MAPPING.get(name) == code:
+                mapping[name] = code
+        return mapping
+
+    def line_sequences(self) -> Dict[str, List[str]]:
+        return {line: [code for code, _ in path] for line, path in self.paths.items() if path}
+
+    def transfer_codes(self) -> List[tuple[str, ...]]:
+        return sorted({tuple(sorted((station["Code"], station["StationTogether1"])))
+                       for station in self.stations if station.get("StationTogether1")})
+
+    def segment_minutes(self) -> Dict[tuple[str, str], float]:
+        """Segment times estimated from jPath distances"""
+        minutes = {}
+        for path in self.paths.values():
+            for (a, _), (b, distance) in zip(path, path[1:]):
+                if distance:
+                    minutes[(a, b)] = round(distance / RAIL_FEET_PER_MINUTE, 1)
+        return minutes
+
+    def save(self, path: str) -> None:
+        """Write atomically so readers never see a half-written snapshot"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = {"version": self.VERSION, "fetched_at": self.fetched_at, "stations": self.stations,
+                   "lines": self.lines, "paths": self.paths, "entrances": self.entrances}
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "StaticDataSnapshot | None":
+        """Read a saved snapshot, or None if it is missing, corrupt or from another version"""
+        try:
+            with open(path, "rb") as f:
+                payload = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != cls.VERSION:
+            return None
+        return cls(payload["stations"], payload["lines"],
+                   {line: [tuple(item) for item in path] for line, path in payload["paths"].items()},
+                   payload["entrances"], payload["fetched_at"])
+
+STATIC_DATA_PATH = os.path.join(DATA_DIR, "static_data.json")
+static_data: StaticDataSnapshot | None = None
+_static_refresh_lock = asyncio.Lock()
+
+def build_rail_network() -> RailNetwork:
+    """Rail network for the current tables, with the best segment times available"""
+    segment_minutes = static_data.segment_minutes() if static_data is not None else {}
+    if station_matrix is not None:
+        segment_minutes.update(station_matrix.segment_minutes(LINE_SEQUENCES))
+    return RailNetwork(LINE_SEQUENCES, STATIONS, segment_minutes)
+
+def install_static_data(snapshot: StaticDataSnapshot) -> None:
+    """Rebuild the station tables from a snapshot and swap them all in at once"""
+    global static_data, STATIONS, STATION_SEARCH, LINE_SEQUENCES, RAIL_NETWORK
+    sequences = snapshot.line_sequences() or LINE_SEQUENCES
+    station_lines = lines_from_sequences(sequences)
+    for station in snapshot.stations:
+        served = {station.get(f"LineCode{i}") for i in range(1, 5)} - {None, ""}
+        station_lines.setdefault(station["Code"], [line for line in LINE_COLORS if line in served])
+    registry = StationRegistry(snapshot.station_mapping(), station_lines,
+                               snapshot.transfer_codes() or TRANSFER_STATION_CODES)
+    search = StationSearchIndex(registry, STATION_ALIASES)
+    # Build everything first, then rebind in one step with no await in between
+    static_data, STATIONS, STATION_SEARCH, LINE_SEQUENCES = snapshot, registry, search, sequences
+    RAIL_NETWORK = build_rail_network()
+
+def load_static_data() -> None:
+    """Install the saved snapshot and fare/time matrix from disk, if there are any"""
+    snapshot = StaticDataSnapshot.load(STATIC_DATA_PATH)
+    if snapshot is not None:
+        install_static_data(snapshot)
+    matrix = StationMatrix.load(MATRIX_PATH)
+    if matrix is not None and station_matrix is None:
+        install_station_matrix(matrix)
+
+async def fetch_static_data() -> StaticDataSnapshot | None:
+    """Download a fresh snapshot of the rail static data"""
+    rail = f"{WMATA_API_BASE}/Rail.svc/json"
+    stations, lines, entrances = await asyncio.gather(
+        make_wmata_request(f"{rail}/jStations", priority=PRIORITY_BACKGROUND),
+        make_wmata_request(f"{rail}/jLines", priority=PRIORITY_BACKGROUND),
+        make_wmata_request(f"{rail}/jStationEntrances", priority=PRIORITY_BACKGROUND),
+    )
+    if not stations or not stations.get("Stations") or not lines or not lines.get("Lines"):
+        return None
+    paths = {}
+    for line in lines["Lines"]:
+        path = await make_wmata_request(f"{rail}/jPath", {"FromStationCode": line["StartStationCode"],
+                                                          "ToStationCode": line["EndStationCode"]},
+                                        priority=PRIORITY_BACKGROUND)
+        if path and path.get("Path"):
+            paths[line["LineCode"]] = path
+    return StaticDataSnapshot.from_responses(stations, lines, paths, entrances or {})
+
+async def refresh_static_data(force: bool = False) -> None:
+    """Refresh the snapshot and matrix from the API when stale, then persist and swap them in"""
+    async with _static_refresh_lock:
+        if force or static_data is None or not static_data.is_fresh():
+            snapshot = await fetch_static_data()
+            if snapshot is not None:
+                try:
+                    await asyncio.to_thread(snapshot.save, STATIC_DATA_PATH)
+                except OSError as e:
+                    print(f"Could not save static data snapshot: {e}", file=sys.stderr)
+                install_static_data(snapshot)
+        await get_station_matrix(PRIORITY_BACKGROUND)
+
+class TravelTimes:
+    """Fastest travel minutes between every pair of stations, as one dense matrix.
+
+    Built once per rail network from its all-pairs shortest paths, which
+    already combine the measured station-to-station times with the transfer
+    penalty. Row i holds the minutes from station i to every station, so
+    "reachable within N minutes" is a threshold over the origins' rows and
+    a meet-up search is a column-wise maximum over them. With NumPy the
+    matrix is an (n, n) float32 array; without it, a flat array of rows.
+    """
+
+    def __init__(self, network: RailNetwork):
+        self.groups = sorted(network.station_nodes)
+        self.codes = [group[0] for group in self.groups]
+        self.ordinal = {code: i for i, group in enumerate(self.groups) for code in group}
+        size = len(self.groups)
+        flat = array("f", [math.inf]) * (size * size)
+        for i, group in enumerate(self.groups):
+            dist, _ = network.table(group)
+            for j, other in enumerate(self.groups):
+                flat[i * size + j] = min(dist[node] for node in network.station_nodes[other])
+        self._np = np = _numpy()
+        self.minutes = np.frombuffer(flat, dtype=np.float32).reshape(size, size) if np is not None else flat
+
+    def _rows(self, origins: List[str]) -> List[int]:
+        return [self.ordinal[code] for code in origins]
+
+    def reachable(self, origins: List[str], budget: float) -> List[tuple[str, float, int]]:
+        """(station, minutes, index of the closest origin) for stations within budget, soonest first"""
+        rows, size = self._rows(origins), len(self.codes)
+        if self._np is not None:
+            np = self._np
+            times = self.minutes[rows]
+            best, closest = times.min(axis=0), times.argmin(axis=0)
+            hits = np.flatnonzero(best <= budget)
+            hits = hits[np.argsort(best[hits], kind="stable")]
+            return [(self.codes[j], float(best[j]), int(closest[j])) for j in hits]
+        found = []
+        for j in range(size):
+            closest = min(range(len(rows)), key=lambda k: self.minutes[rows[k] * size + j])
+            minutes = self.minutes[rows[closest] * size + j]
+            if minutes <= budget:
+                found.append((self.codes[j], minutes, closest))
+        return sorted(found, key=lambda item: item[1])
+
+    def meetup(self, origins: List[str], limit: int) -> List[tuple[str, float, float, List[float]]]:
+        """(station, longest trip, total minutes, each origin's minutes), fairest first.
+
+        Stations are ranked by the longest trip anyone makes, then by the
+        group's total travel time.
+        """
+        rows, size = self._rows(origins), len(self.codes)
+        if self._np is not None:
+            np = self._np
+            times = self.minutes[rows]
+            longest, total = times.max(axis=0), times.sum(axis=0, dtype=np.float64)
+            order = np.lexsort((total, longest))
+            # Drop stations someone cannot reach before taking the top ones
+            best = order[np.isfinite(longest[order])][:limit]
+            return [(self.codes[j], float(longest[j]), float(total[j]), times[:, j].tolist()) for j in best]
+        candidates = []
+        for j in range(size):
+            times = [self.minutes[row * size + j] for row in rows]
+            if math.isfinite(max(times)):
+                candidates.append((self.codes[j], max(times), sum(times), times))
+        return sorted(candidates, key=lambda item: (item[1], item[2]))[:limit]
+
+travel_times: tuple[RailNetwork, TravelTimes] | None = None
+
+async def get_travel_times() -> TravelTimes:
+    """The travel time matrix for the current rail network, rebuilt when the network changes"""
+    global travel_times
+    # The fare matrix calibrates the network's segment times; load it before building
+    await get_station_matrix()
+    if travel_times is None or travel_times[0] is not RAIL_NETWORK:
+        travel_times = (RAIL_NETWORK, TravelTimes(RAIL_NETWORK))
+    return travel_times[1]
+
+EARTH_RADIUS_METERS = 6371008.8
+WALKING_METERS_PER_MINUTE = 80.0
+
+_numpy_module = None
+
+def _numpy():
+    """NumPy, imported on first use, or None when it is not installed"""
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = False
+    return _numpy_module or None
+
+class SpatialIndex:
+    """Nearest-neighbour search over points given by latitude and longitude.
+
+    With NumPy every point is stored as a unit vector in one contiguous
+    (n, 3) array. The straight-line (chord) distance between unit vectors
+    orders points exactly as great-circle distance does, so a query is one
+    vectorized pass with no trigonometry per point, and a batch of queries
+    is a single matrix product; for the few hundred stations and entrances
+    that beats building a tree. Without NumPy the haversine formula runs
+    point by point in Python.
+    """
+
+    def __init__(self, points: List[tuple[float, float, Any]]):
+        self.items = [item for _, _, item in points]
+        lats = [math.radians(lat) for lat, _, _ in points]
+        lons = [math.radians(lon) for _, lon, _ in points]
+        # The backend is fixed per index so it can be compared against the fallback
+        self._np = np = _numpy()
+        if np is not None:
+            self.vectors = self._unit_vectors(np, np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64))
+        else:
+            self.vectors = None
+            self.lat, self.lon = array("d", lats), array("d", lons)
+            self.cos_lat = array("d", map(math.cos, lats))
+
+    @staticmethod
+    def _unit_vectors(np, lat, lon):
+        cos_lat = np.cos(lat)
+        return np.ascontiguousarray(np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1))
+
+    @staticmethod
+    def _chord_to_meters(np, chord):
+        return 2 * EARTH_RADIUS_METERS * np.arcsin(np.minimum(chord / 2, 1.0))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def distances(self, lat: float, lon: float):
+        """Meters from (lat, lon) to every point, in index order"""
+        phi, lam = math.radians(lat), math.radians(lon)
+        if self.vectors is not None:
+            np = self._np
+            query = (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+            difference = self.vectors - query
+            return self._chord_to_meters(np, np.sqrt(np.einsum("ij,ij->i", difference, difference)))
+        cos_phi = math.cos(phi)
+        result = []
+        for point_lat, point_lon, cos_lat in zip(self.lat, self.lon, self.cos_lat):
+            a = math.sin((point_lat - phi) / 2) ** 2 + cos_phi * cos_lat * math.sin((point_lon - lam) / 2) ** 2
+            result.append(2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0))))
+        return result
+
+    def nearest(self, lat: float, lon: float, k: int = 5,
+                radius: float | None = None) -> List[tuple[float, Any]]:
+        """Up to k (meters, item) pairs closest first, optionally only within radius meters"""
+        if not self.items or k <= 0:
+            return []
+        distances = self.distances(lat, lon)
+        if self.vectors is not None:
+            np = self._np
+            if k < len(distances):
+                # Partial sort: only the k closest are ordered
+                candidates = np.argpartition(distances, k - 1)[:k]
+            else:
+                candidates = np.arange(len(distances))
+            order = candidates[np.argsort(distances[candidates])]
+            nearest = [(float(distances[i]), self.items[i]) for i in order]
+        else:
+            nearest = [(d, self.items[i]) for d, i in heapq.nsmallest(k, zip(distances, range(len(distances))))]
+        if radius:
+            nearest = [(d, item) for d, item in nearest if d <= radius]
+        return nearest
+
+    def nearest_many(self, lats, lons, k: int = 1) -> tuple[Any, Any]:
+        """Indices and meters of the k closest points to each query, as (queries, k) arrays; needs NumPy"""
+        if self.vectors is None:
+            raise RuntimeError("nearest_many needs NumPy")
+        np = self._np
+        k = min(k, len(self.items))
+        queries = self._unit_vectors(np, np.radians(np.asarray(lats, dtype=np.float64)),
+                                     np.radians(np.asarray(lons, dtype=np.float64)))
+        # For unit vectors |p - q|^2 = 2 - 2 p.q, so the closest points have the largest dot products
+        dots = queries @ self.vectors.T
+        if k < len(self.items):
+            candidates = np.argpartition(-dots, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(len(self.items)), dots.shape)
+        # Exact distances for the chosen few, from the vector difference
+        difference = self.vectors[candidates] - queries[:, None, :]
+        meters = self._chord_to_meters(np, np.sqrt(np.einsum("qkj,qkj->qk", difference, difference)))
+        order = np.argsort(meters, axis=1)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(meters, order, axis=1)
+
+def build_spatial_indexes(stations: List[Dict], entrances: List[Dict]) -> tuple[SpatialIndex, SpatialIndex]:
+    """Station and entrance indexes; each transfer station appears once"""
+    station_points, seen = [], set()
+    for station in stations:
+        code = station.get("Code")
+        if station.get("Lat") is None or station.get("Lon") is None or code in seen:
+            continue
+        seen.update(STATIONS.codes(code))
+        station_points.append((station["Lat"], station["Lon"], code))
+    entrance_points = [(entrance["Lat"], entrance["Lon"], entrance) for entrance in entrances
+                       if entrance.get("Lat") is not None and entrance.get("Lon") is not None]
+    return SpatialIndex(station_points), SpatialIndex(entrance_points)
+
+# (source the indexes were built from, station index, entrance index)
+spatial_indexes: tuple[Any, SpatialIndex, SpatialIndex] | None = None
+
+async def get_spatial_indexes() -> tuple[SpatialIndex, SpatialIndex] | None:
+    """Station and entrance indexes from the static snapshot, or from the API before one exists"""
+    global spatial_indexes
+    if static_data is not None:
+        source, stations, entrances = static_data, static_data.stations, static_data.entrances
+    else:
+        rail = f"{WMATA_API_BASE}/Rail.svc/json"
+        stations_data, entrances_data = await asyncio.gather(make_wmata_request(f"{rail}/jStations"),
+                                                             make_wmata_request(f"{rail}/jStationEntrances"))
+        if not stations_data or "Stations" not in stations_data:
             return None
+        source = stations_data
+        stations = stations_data["Stations"]
+        entrances = (entrances_data or {}).get("Entrances") or []
+    if spatial_indexes is None or spatial_indexes[0] is not source:
+        spatial_indexes = (source, *build_spatial_indexes(stations, entrances))
+    return spatial_indexes[1], spatial_indexes[2]
+
+# Long lists are sent as rows under a column list rather than as objects, so
+# field names are not repeated for every train, fare or outage
+TRAIN_COLUMNS = ["line", "destination", "min", "cars"]  # min is minutes, "ARR" or "BRD"
+TrainRow = tuple[str | None, str | None, str | None, str | None]
+
+class StationPredictionsOut(BaseModel):
+    station: str
+    code: str
+    columns: List[str] = TRAIN_COLUMNS
+    trains: List[TrainRow]
+    age_s: int | None = None
+    stale_age_s: int | None = None
+
+class MultiStationPredictionsOut(BaseModel):
+    stations: List[StationPredictionsOut]
+    not_found: List[str] | None = None
+
+class RouteStepOut(BaseModel):
+    action: str
+    station: str
+    name: str
+    line: str
+    next_line: str | None = None
+    stops: int | None = None
+    alternatives: List[str] | None = None
+
+class TripOut(BaseModel):
+    origin: str
+    origin_code: str
+    destination: str
+    destination_code: str
+    rail_minutes: float | None = None
+    peak_fare: float | None = None
+    off_peak_fare: float | None = None
+    senior_fare: float | None = None
+    miles: float | None = None
+    transfers: int | None = None
+    route: List[RouteStepOut] | None = None
+
+FARE_COLUMNS = ["origin", "destination", "rail_minutes", "peak_fare", "off_peak_fare"]
+FareRow = tuple[str, str, float | None, float | None, float | None]
+
+class FareMatrixOut(BaseModel):
+    columns: List[str] = FARE_COLUMNS
+    fares: List[FareRow]
+    not_found: List[str] | None = None
+
+class AlertOut(BaseModel):
+    type: str
+    description: str
+    lines: List[str]
+    id: str | None = None
+    updated: str | None = None
+
+class AlertsOut(BaseModel):
+    alerts: List[AlertOut]
+    token: str | None = None
+    age_s: int | None = None
+    stale_age_s: int | None = None
+
+class AlertChangesOut(BaseModel):
+    token: str
+    reset: bool | None = None
+    added: List[AlertOut] | None = None
+    updated: List[AlertOut] | None = None
+    removed: List[AlertOut] | None = None
+    age_s: int | None = None
+    stale_age_s: int | None = None
+
+OUTAGE_COLUMNS = ["code", "station", "unit_type", "description", "estimated_return"]
+OutageRow = tuple[str, str, str, str, str | None]
+
+class OutagesOut(BaseModel):
+    total: int  # outages systemwide, before filtering
+    counts: Dict[str, int]  # matching outages per unit type
+    columns: List[str] = OUTAGE_COLUMNS
+    outages: List[OutageRow]
+    age_s: int | None = None
+    stale_age_s: int | None = None
+
+class TripPlanOut(BaseModel):
+    trip: TripOut
+    columns: List[str] = TRAIN_COLUMNS
+    trains: List[TrainRow] | None = None  # next trains at the origin running the route's way
+    alerts: List[AlertOut] | None = None  # alerts on the route's lines
+    outage_columns: List[str] = OUTAGE_COLUMNS
+    outages: List[OutageRow] | None = None  # outages at the route's stations
+    omitted: Dict[str, str] | None = None  # part -> "timed out", "failed" or "unavailable"
+
+class StationInfoOut(BaseModel):
+    code: str
+    name: str
+    address: str | None = None
+    lines: List[str]
+    lat: float | None = None
+    lon: float | None = None
+    parking_spaces: int | None = None
+
+class StationDirectoryOut(BaseModel):
+    stations: Dict[str, str]  # code -> name
+    lines: Dict[str, List[str]]  # line -> station codes, by name
+
+NEARBY_STATION_COLUMNS = ["code", "name", "meters", "lines"]
+NearbyStationRow = tuple[str, str, int, List[str]]
+NEARBY_ENTRANCE_COLUMNS = ["station", "name", "meters", "lat", "lon", "description"]
+NearbyEntranceRow = tuple[str, str, int, float, float, str | None]
+
+class NearbyOut(BaseModel):
+    station_columns: List[str] = NEARBY_STATION_COLUMNS
+    stations: List[NearbyStationRow]
+    entrance_columns: List[str] = NEARBY_ENTRANCE_COLUMNS
+    entrances: List[NearbyEntranceRow]
+
+TRAIN_POSITION_COLUMNS = ["train", "line", "destination", "cars", "last_station", "next_station", "minutes_away"]
+TrainPositionRow = tuple[str | None, str, str | None, int, str | None, str | None, float | None]
+
+class TrainsBetweenOut(BaseModel):
+    origin: str
+    destination: str
+    columns: List[str] = TRAIN_POSITION_COLUMNS
+    # minutes_away is to the destination (or origin), null for trains terminating before it
+    toward_destination: List[TrainPositionRow]
+    toward_origin: List[TrainPositionRow]
+    age_s: int | None = None
+    stale_age_s: int | None = None
+
+class HeadwayOut(BaseModel):
+    toward: str  # terminal station code
+    trains: int
+    average_min: float | None = None
+    longest_min: float | None = None
+    longest_between: List[str | None] | None = None
+
+class HeadwaysOut(BaseModel):
+    line: str
+    directions: List[HeadwayOut]
+    age_s: int | None = None
+    stale_age_s: int | None = None
+
+class AverageWaitOut(BaseModel):
+    station: str
+    line: str | None = None
+    window: str | None = None  # "HH:MM-HH:MM", Metro local time
+    weekdays_only: bool = False
+    samples: int
+    days: int
+    average_min: float | None = None
+    median_min: float | None = None
+    p90_min: float | None = None
+
+class TrainLengthsOut(BaseModel):
+    station: str | None = None
+    line: str | None = None
+    window: str | None = None
+    weekdays_only: bool = False
+    trains: int
+    days: int
+    cars: Dict[str, float]  # car count -> share of trains, in percent
+
+REACHABLE_COLUMNS = ["station", "minutes", "from"]
+
+class ReachableOut(BaseModel):
+    origins: List[str]
+    budget_min: float
+    columns: List[str] = REACHABLE_COLUMNS
+    stations: List[tuple[str, float, str]]
+    not_found: List[str] | None = None
+
+MEETUP_COLUMNS = ["station", "longest_min", "total_min", "minutes"]
+
+class MeetupOut(BaseModel):
+    origins: List[str]
+    columns: List[str] = MEETUP_COLUMNS
+    # minutes lists each origin's travel time, in the order of origins
+    candidates: List[tuple[str, float, float, List[float]]]
+
+class SearchMatchOut(BaseModel):
+    code: str
+    name: str
+    lines: List[str]
+    score: float
+    matched: str | None = None
+
+class SearchOut(BaseModel):
+    matches: List[SearchMatchOut]
+
+def to_json(model: BaseModel) -> str:
+    """Compact JSON for a tool result, leaving out empty optional fields"""
+    return model.model_dump_json(exclude_none=True)
+
+def train_row(train: dict) -> TrainRow:
+    return (train.get("Line"), train.get("DestinationName") or train.get("Destination"),
+            train.get("Min"), train.get("Car"))
+
+def data_ages(data: dict | None, age: float | None) -> dict[str, int]:
+    """age_s/stale_age_s fields for a feed response"""
+    ages = {}
+    if age is not None:
+        ages["age_s"] = round(age)
+    if data and STALE_AGE_KEY in data:
+        ages["stale_age_s"] = data[STALE_AGE_KEY]
+    return ages
+
+def outage_row(outage: dict) -> OutageRow:
+    return (outage.get("StationCode") or "",
+            STATIONS.name(outage.get("StationCode", ""), outage.get("StationName") or ""),
+            outage.get("UnitType") or "", outage.get("SymptomDescription") or "",
+            outage.get("EstimatedReturnToService"))
+
+def affected_lines(incident: dict) -> List[str]:
+    """Line codes from an incident's LinesAffected, which WMATA sends as "BL; OR; SV;" """
+    return [line.strip() for line in (incident.get("LinesAffected") or "").split(";") if line.strip()]
+
+def alert_out(incident: Dict) -> AlertOut:
+    return AlertOut(type=incident.get("IncidentType") or "Unknown", description=incident.get("Description") or "",
+                    lines=affected_lines(incident), id=incident.get("IncidentID"),
+                    updated=incident.get("DateUpdated"))
+
+def format_alert(incident: Dict) -> str:
+    """One incident as a heading line plus its description"""
+    incident_type = incident.get("IncidentType", "Unknown")
+    description = incident.get("Description", "No description available")
+    lines_affected = affected_lines(incident)
+
+    alert = f"⚠️ **{incident_type}**"
+    if lines_affected:
+        line_names = [LINE_COLORS.get(line, line) for line in lines_affected]
+        alert += f" - {', '.join(line_names)}"
+    alert += f"\n{description}\n"
+    return alert
+
+def trip_out(from_code: str, from_name: str, to_code: str, to_name: str,
+             info: dict | None, route: RailRoute | None) -> TripOut:
+    rail_fare = (info or {}).get("RailFare") or {}
+    return TripOut(
+        origin=from_name, origin_code=from_code, destination=to_name, destination_code=to_code,
+        rail_minutes=(info or {}).get("RailTime"), peak_fare=rail_fare.get("PeakTime"),
+        off_peak_fare=rail_fare.get("OffPeakTime"), senior_fare=rail_fare.get("SeniorDisabled"),
+        miles=(info or {}).get("CompositeMiles"), transfers=route.transfers if route else None,
+        route=[RouteStepOut(**{**step, "alternatives": step.get("alternatives") or None})
+               for step in route.steps] if route else None)
+
+def format_distance(meters: float) -> str:
+    return f"{meters:.0f} m" if meters < 1000 else f"{meters / 1000:.1f} km"
+
+def format_address(address: dict | None) -> str | None:
+    """One-line street address from a WMATA Address object"""
+    if not address or not address.get("Street"):
+        return None
+    text = address["Street"]
+    if address.get("City"):
+        text += f", {address['City']}"
+    if address.get("State"):
+        text += f", {address['State']}"
+    if address.get("Zip"):
+        text += f" {address['Zip']}"
+    return text
+
+async def gather_within(deadline: float, **fetches) -> tuple[Dict[str, Any], Dict[str, str]]:
+    """Run named fetches concurrently for up to deadline seconds.
+
+    Returns the results that arrived, and for the others whether they timed
+    out or failed. Late fetches are cancelled; the upstream calls behind them
+    are shielded, so they still finish and land in the response cache.
+    """
+    tasks = {name: asyncio.ensure_future(fetch) for name, fetch in fetches.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    results, missing = {}, {}
+    for name, task in tasks.items():
+        if task not in done:
+            missing[name] = "timed out"
+        elif task.exception() is not None:
+            print(f"Fetching {name} failed: {task.exception()}", file=sys.stderr)
+            missing[name] = "failed"
+        else:
+            results[name] = task.result()
+    return results, missing
+
+def heading_toward(line: str, from_code: str, to_code: str, destination_code: str | None) -> bool:
+    """Whether a train on a line bound for a destination runs from one station toward another"""
+    positions = RAIL_NETWORK.positions.get(line, {})
 
-def get_station_code(station_name: str) -> str | None:
-    """Convert station name to station code with fuzzy matching"""
-    # Exact match first
-    if station_name in STATION_MAPPING:
-        return STATION_MAPPING[station_name]
-    
-    # If it's already a code, return uppercase
-    if len(station_name) <= 3 and station_name.upper() in STATION_MAPPING.values():
-        return station_name.upper()
-    
-    # Fuzzy matching for partial names
-    for name, code in STATION_MAPPING.items():
-        if station_name.lower() in name.lower() or name.lower().startswith(station_name.lower()):
-            return code
-    
-    return None
+    def position(code: str | None) -> int | None:
+        return next((positions[c] for c in STATIONS.codes(code) if c in positions), None) if code else None
 
-def format_train_prediction(train: dict) -> str:
-    """Format a single train prediction"""
-    line = LINE_COLORS.get(train.get("Line", ""), train.get("Line", "Unknown"))
-    destination = train.get("DestinationName", "Unknown")
-    minutes = train.get("Min", "Unknown")
-    cars = train.get("Car", "Unknown")
-    
-    if minutes == "ARR":
-        time_info = "Arriving now"
-    elif minutes == "BRD":
-        time_info = "Boarding"
-    else:
-        time_info = f"{minutes} minutes"
-    
-    return f"🚇 {line} to {destination} - {time_info} ({cars} cars)"
+    start, end, destination = position(from_code), position(to_code), position(destination_code)
+    if start is None or end is None or destination is None or start == end:
+        return True
+    return (destination > start) == (end > start)
 
-def find_simple_route(from_code: str, to_code: str) -> List[Dict] | None:
-    """Find a simple route using pre-defined common routes"""
-    # Check direct route
-    route_key = (from_code, to_code)
-    if route_key in COMMON_ROUTES:
-        return COMMON_ROUTES[route_key]
-    
-    # Check reverse route
-    reverse_key = (to_code, from_code)
-    if reverse_key in COMMON_ROUTES:
-        route = list(reversed(COMMON_ROUTES[reverse_key]))
-        # Update actions for reverse direction
-        for step in route:
-            if step["action"] == "start":
-                step["action"] = "arrive"
-            elif step["action"] == "arrive":
-                step["action"] = "start"
-        return route
-    
-    # Check if stations are on the same line
-    from_lines = STATION_LINES.get(from_code, [])
-    to_lines = STATION_LINES.get(to_code, [])
-    common_lines = set(from_lines) & set(to_lines)
-    
-    if common_lines:
-        line = list(common_lines)[0]
-        from_name = next((name for name, code in STATION_MAPPING.items() if code == from_code), from_code)
-        to_name = next((name for name, code in STATION_MAPPING.items() if code == to_code), to_code)
-        return [
-            {"station": from_code, "name": from_name, "line": line, "action": "start"},
-            {"station": to_code, "name": to_name, "line": line, "action": "arrive"}
-        ]
-    
-    return None
+# Per-session tool call limits, dropped along with their session
+_session_slots: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
 
-def find_optimal_transfer_point(from_code: str, to_code: str) -> str | None:
-    """Find the closest transfer point between two stations on different lines"""
-    from_lines = set(STATION_LINES.get(from_code, []))
-    to_lines = set(STATION_LINES.get(to_code, []))
-    
-    # If they share a line, no transfer needed
-    if from_lines & to_lines:
+def session_slots() -> asyncio.Semaphore | None:
+    """The concurrency limit of the session making the current request, if there is one"""
+    if SESSION_MAX_CONCURRENCY <= 0:
         return None
-    
-    # Find all possible transfer stations
-    transfer_candidates = []
-    
-    for station_code, lines in STATION_LINES.items():
-        station_lines = set(lines)
-        # Station must connect to both origin and destination lines
-        if (station_lines & from_lines) and (station_lines & to_lines):
-            # Calculate "distance" (you could use actual station positions)
-            transfer_candidates.append(station_code)
-    
-    # For now, prefer smaller transfer stations over major hubs
-    # You could rank by proximity or other factors
-    major_hubs = {"C01", "F01", "F03"}  # Metro Center, Gallery Place, L'Enfant
-    
-    # Return non-hub transfers first
-    for candidate in transfer_candidates:
-        if candidate not in major_hubs:
-            return candidate
-    
-    # Fall back to major hubs if no other option
-    return transfer_candidates[0] if transfer_candidates else None
-
-def build_optimal_route(from_code: str, to_code: str) -> List[Dict] | None:
-    """Build an optimal route with smart transfer selection"""
-    from_name = next((name for name, code in STATION_MAPPING.items() if code == from_code), from_code)
-    to_name = next((name for name, code in STATION_MAPPING.items() if code == to_code), to_code)
-    
-    from_lines = set(STATION_LINES.get(from_code, []))
-    to_lines = set(STATION_LINES.get(to_code, []))
-    
-    # Direct route on same line
-    common_lines = from_lines & to_lines
-    if common_lines:
-        line = list(common_lines)[0]
-        return [
-            {"station": from_code, "name": from_name, "line": line, "action": "start"},
-            {"station": to_code, "name": to_name, "line": line, "action": "arrive"}
-        ]
-    
-    # Find optimal transfer point
-    transfer_code = find_optimal_transfer_point(from_code, to_code)
-    if transfer_code:
-        transfer_name = next((name for name, code in STATION_MAPPING.items() if code == transfer_code), transfer_code)
-        
-        # Choose lines for each segment
-        first_line = list(from_lines & set(STATION_LINES.get(transfer_code, [])))[0]
-        second_line = list(to_lines & set(STATION_LINES.get(transfer_code, [])))[0]
-        
-        return [
-            {"station": from_code, "name": from_name, "line": first_line, "action": "start"},
-            {"station": transfer_code, "name": transfer_name, "line": first_line, "action": "transfer_to", "next_line": second_line},
-            {"station": to_code, "name": to_name, "line": second_line, "action": "arrive"}
-        ]
-    
-    return None
+    try:
+        session = mcp.get_context().session
+    except ValueError:  # called outside an MCP request, as the benchmarks do
+        return None
+    slots = _session_slots.get(session)
+    if slots is None:
+        slots = _session_slots[session] = asyncio.Semaphore(SESSION_MAX_CONCURRENCY)
+    return slots
 
 # === TOOLS ===
 
-@mcp.tool()
+def instrumented_tool(*args, **kwargs):
+    """Drop-in for @mcp.tool() that also records the tool's latency, outcome and in-flight count,
+    and holds the calling session to its concurrency limit"""
+    def decorator(fn):
+        tool = kwargs.get("name") or fn.__name__
+
+        # wraps() keeps the signature and docstring FastMCP builds the tool schema from
+        @wraps(fn)
+        async def wrapper(*call_args, **call_kwargs):
+            slots = session_slots()
+            if slots is not None:
+                if slots.locked():
+                    metrics.session_waits += 1
+                await slots.acquire()
+            metrics.tools_in_flight += 1
+            start = time.perf_counter()
+            outcome = "exception"
+            try:
+                result = await fn(*call_args, **call_kwargs)
+                outcome = "error" if isinstance(result, str) and result.startswith("❌") else "ok"
+                return result
+            finally:
+                metrics.tools_in_flight -= 1
+                metrics.record_tool(tool, outcome, time.perf_counter() - start)
+                if slots is not None:
+                    slots.release()
+
+        # The result is the text (or JSON) content; FastMCP would otherwise
+        # repeat it as {"result": ...} structured content, doubling every reply
+        return mcp.tool(*args, **{"structured_output": False, **kwargs})(wrapper)
+    return decorator
+
+@instrumented_tool()
 async def get_train_prediction(station: str) -> str:
     """
     Get live train predictions for a Metro station.
@@ -357,10 +3684,9 @@ async def get_train_prediction(station: str) -> str:
     station_code = get_station_code(station)
     
     if not station_code:
-        return f"❌ Station '{station}' not found. Please check the spelling or use a valid station name."
+        return f"❌ Station '{station}' not found. Please check the spelling or use a valid station name." + suggest_stations(station)
 
-    url = f"{WMATA_API_BASE}/StationPrediction.svc/json/GetPrediction/{station_code}"
-    data = await make_wmata_request(url)
+    data, age = await station_predictions(station_code)
 
     if not data or "Trains" not in data:
         return "❌ Unable to get train predictions. The service may be unavailable."
@@ -368,12 +3694,79 @@ async def get_train_prediction(station: str) -> str:
     if not data["Trains"]:
         return "ℹ️ No train predictions available. Metro may be closed or experiencing service disruptions."
 
+    station_name = STATIONS.name(station_code, station)
+    if JSON_OUTPUT:
+        return to_json(StationPredictionsOut(station=station_name, code=station_code,
+                                             trains=[train_row(train) for train in data["Trains"]],
+                                             **data_ages(data, age)))
+
     predictions = [format_train_prediction(train) for train in data["Trains"]]
-    station_name = next((name for name, code in STATION_MAPPING.items() if code == station_code), station)
     
-    return f"🚉 **{station_name}** Train Predictions:\n\n" + "\n".join(predictions)
+    return (f"🚉 **{station_name}** Train Predictions:\n\n" + "\n".join(predictions)
+            + format_data_age(age) + format_stale_note(data))
+
+@instrumented_tool()
+async def get_multi_station_predictions(stations: List[str], line: str = "") -> str:
+    """
+    Get live train predictions for several Metro stations at once.
+    
+    Answers every station from one system-wide prediction snapshot, so this is
+    much cheaper than calling get_train_prediction once per station.
+    
+    Args:
+        stations: Station names or codes (e.g., ["Union Station", "C05", "Pentagon"])
+        line: Optional line code or color to filter by (e.g., "RD", "Blue")
+    
+    Returns:
+        Formatted train arrival predictions grouped by station
+    """
+    codes = {}
+    unknown = []
+    for station in stations:
+        station_code = get_station_code(station)
+        if station_code:
+            codes[station_code] = station
+        else:
+            unknown.append(station)
+
+    if not codes:
+        return f"❌ None of the requested stations were found: {', '.join(unknown)}"
+
+    line_filter = None
+    if line.strip():
+        line_filter = resolve_line(line)
+        if not line_filter:
+            return f"❌ Unknown line '{line}'. Use a line code or color: {', '.join(LINE_COLORS)}."
 
-@mcp.tool()
+    data, age = await prediction_store.refresh()
+    if data is None:
+        return "❌ Unable to get train predictions. The service may be unavailable."
+
+    if JSON_OUTPUT:
+        return to_json(MultiStationPredictionsOut(
+            stations=[StationPredictionsOut(station=STATIONS.name(station_code, station), code=station_code,
+                                            trains=[train_row(train) for code in STATIONS.codes(station_code)
+                                                    for train in prediction_store.find(location=code, line=line_filter)])
+                      for station_code, station in codes.items()],
+            not_found=unknown or None))
+
+    sections = []
+    for station_code, station in codes.items():
+        station_name = STATIONS.name(station_code, station)
+        trains = [train for code in STATIONS.codes(station_code)
+                  for train in prediction_store.find(location=code, line=line_filter)]
+        if trains:
+            predictions = "\n".join(format_train_prediction(train) for train in trains)
+        else:
+            predictions = "ℹ️ No train predictions available."
+        sections.append(f"🚉 **{station_name}**\n{predictions}\n")
+
+    result = "\n".join(sections)
+    if unknown:
+        result += f"\n❌ Not found: {', '.join(unknown)}"
+    return result + format_data_age(age) + format_stale_note(data)
+
+@instrumented_tool()
 async def get_station_to_station_info(from_station: str, to_station: str) -> str:
     """
     Get travel information between two Metro stations using WMATA's actual API.
@@ -389,31 +3782,27 @@ async def get_station_to_station_info(from_station: str, to_station: str) -> str
     to_code = get_station_code(to_station)
     
     if not from_code:
-        return f"❌ Starting station '{from_station}' not found."
+        return f"❌ Starting station '{from_station}' not found." + suggest_stations(from_station)
     if not to_code:
-        return f"❌ Destination station '{to_station}' not found."
+        return f"❌ Destination station '{to_station}' not found." + suggest_stations(to_station)
     
     if from_code == to_code:
         return "ℹ️ You're already at your destination!"
 
-    # Use the actual WMATA API endpoint for station-to-station information
-    url = f"{WMATA_API_BASE}/Rail.svc/json/jSrcStationToDstStationInfo"
-    params = {"FromStationCode": from_code, "ToStationCode": to_code}
-    
-    data = await make_wmata_request(url, params)
+    # WMATA's station-to-station information, answered from the all-pairs matrix when available
+    info = await get_station_to_station(from_code, to_code)
 
-    if not data or "StationToStationInfos" not in data:
+    if not info:
         return "❌ Unable to get travel information between these stations."
 
-    infos = data["StationToStationInfos"]
-    if not infos:
-        return "❌ No travel information available for this route."
-
     # Get station names
-    from_name = next((name for name, code in STATION_MAPPING.items() if code == from_code), from_station)
-    to_name = next((name for name, code in STATION_MAPPING.items() if code == to_code), to_station)
+    from_name = STATIONS.name(from_code, from_station)
+    to_name = STATIONS.name(to_code, to_station)
+    route = RAIL_NETWORK.route(from_code, to_code)
+
+    if JSON_OUTPUT:
+        return to_json(trip_out(from_code, from_name, to_code, to_name, info, route))
 
-    info = infos[0]
     route_info = f"🗺️ **Travel from {from_name} to {to_name}**\n\n"
     
     # Travel time
@@ -432,22 +3821,12 @@ async def get_station_to_station_info(from_station: str, to_station: str) -> str
         if off_peak_fare:
             route_info += f"💳 **Off-peak fare:** ${off_peak_fare:.2f}\n"
     
-    # Try to provide basic routing guidance
-    route_steps = build_optimal_route(from_code, to_code)  # Use new function
-    if route_steps:
-        route_info += f"\n📍 **Recommended route:**\n"
-        for i, step in enumerate(route_steps, 1):
-            action = step["action"]
-            station_name = step["name"]
-            line = LINE_COLORS.get(step["line"], step["line"])
-            
-            if action == "start":
-                route_info += f"{i}. Board {line} at **{station_name}**\n"
-            elif action == "transfer_to":
-                next_line = LINE_COLORS.get(step["next_line"], step["next_line"])
-                route_info += f"{i}. Transfer at **{station_name}** from {line} to {next_line}\n"
-            elif action == "arrive":
-                route_info += f"{i}. Arrive at **{station_name}** on {line}\n"
+    # Routing guidance from the rail network graph
+    if route:
+        transfers = "no transfers" if not route.transfers else \
+            f"{route.transfers} transfer{'s' if route.transfers > 1 else ''}"
+        route_info += f"\n📍 **Recommended route** ({transfers}):\n"
+        route_info += format_route_steps(route.steps)
     else:
         route_info += f"\n⚠️ **Note:** This route may require transfers.\n"
         route_info += f"Check service alerts and plan your connections at major transfer stations:\n"
@@ -462,7 +3841,206 @@ async def get_station_to_station_info(from_station: str, to_station: str) -> str
 
     return route_info
 
-@mcp.tool()
+# What each plan_trip part is called when it has to be left out
+TRIP_PLAN_PARTS = {"fare": "travel time and fares", "trains": "live trains", "alerts": "service alerts",
+                   "outages": "elevator and escalator status"}
+
+@instrumented_tool(name="plan_trip")
+async def plan_trip_tool(from_station: str, to_station: str) -> str:
+    """
+    Plan a Metro trip in one call: route, travel time, fares, the next trains
+    at the origin, service alerts on the route's lines and elevator or
+    escalator outages at its stations.
+    
+    Everything is fetched at once. Whatever has not arrived within a few
+    seconds is left out and named in the answer, so use this instead of
+    calling the individual tools one after another.
+    
+    Args:
+        from_station: Starting station name or code
+        to_station: Destination station name or code
+    
+    Returns:
+        A consolidated trip plan, noting any part that could not be fetched
+    """
+    from_code = get_station_code(from_station)
+    to_code = get_station_code(to_station)
+
+    if not from_code:
+        return f"❌ Starting station '{from_station}' not found." + suggest_stations(from_station)
+    if not to_code:
+        return f"❌ Destination station '{to_station}' not found." + suggest_stations(to_station)
+    if STATIONS.codes(from_code) == STATIONS.codes(to_code):
+        return "ℹ️ You're already at your destination!"
+
+    from_name, to_name = STATIONS.name(from_code, from_station), STATIONS.name(to_code, to_station)
+    route = RAIL_NETWORK.route(from_code, to_code)
+    results, omitted = await gather_within(PLAN_TRIP_DEADLINE,
+                                           fare=get_station_to_station(from_code, to_code),
+                                           trains=station_predictions(from_code),
+                                           alerts=get_feed("incidents"),
+                                           outages=get_feed("elevator_incidents"))
+
+    # A fetch that finished without data is left out as well
+    info = results.get("fare")
+    if "fare" in results and not info:
+        omitted["fare"] = "unavailable"
+    feeds = {}
+    for part, key in (("trains", "Trains"), ("alerts", "Incidents"), ("outages", "ElevatorIncidents")):
+        if part in results:
+            data, _ = results[part]
+            if data and key in data:
+                feeds[part] = data
+            else:
+                omitted[part] = "unavailable"
+
+    if route:
+        first, second = route.steps[0], route.steps[1]
+        boarding = {first["line"], *(first.get("alternatives") or [])}
+        route_lines = {step["line"] for step in route.steps}
+        stations = [step["station"] for step in route.steps]
+    else:
+        boarding = route_lines = None
+        stations = [from_code, to_code]
+
+    trains = alerts = outages = None
+    if "trains" in feeds:
+        trains = [train for train in feeds["trains"]["Trains"]
+                  if boarding is None or (train.get("Line") in boarding and heading_toward(
+                      train["Line"], first["station"], second["station"], train.get("DestinationCode")))]
+    if "alerts" in feeds:
+        alerts = [incident for incident in feeds["alerts"].get("Incidents") or []
+                  if route_lines is None or not affected_lines(incident)
+                  or route_lines.intersection(affected_lines(incident))]
+    if "outages" in feeds:
+        outage_index.load(feeds["outages"])
+        groups = {STATIONS.codes(code): code for code in stations}
+        outages = [outage for code in groups.values() for outage in outage_index.find(code)]
+
+    if JSON_OUTPUT:
+        return to_json(TripPlanOut(
+            trip=trip_out(from_code, from_name, to_code, to_name, info, route),
+            trains=[train_row(train) for train in trains] if trains is not None else None,
+            alerts=[alert_out(incident) for incident in alerts] if alerts is not None else None,
+            outages=[outage_row(outage) for outage in outages] if outages is not None else None,
+            omitted=omitted or None))
+
+    result = f"🗺️ **Trip from {from_name} to {to_name}**\n\n"
+    if info:
+        if info.get("RailTime"):
+            result += f"⏱️ **Estimated travel time:** {info['RailTime']} minutes\n"
+        rail_fare = info.get("RailFare") or {}
+        if rail_fare.get("PeakTime") and rail_fare.get("OffPeakTime"):
+            result += f"💳 **Fare:** ${rail_fare['PeakTime']:.2f} peak, ${rail_fare['OffPeakTime']:.2f} off-peak\n"
+
+    if route:
+        transfers = "no transfers" if not route.transfers else \
+            f"{route.transfers} transfer{'s' if route.transfers > 1 else ''}"
+        result += f"\n📍 **Route** ({transfers}):\n" + format_route_steps(route.steps)
+
+    if trains is not None:
+        if trains:
+            result += f"\n🚉 **Next trains at {from_name}:**\n"
+            result += "\n".join(format_train_prediction(train) for train in trains[:6]) + "\n"
+        else:
+            result += f"\nℹ️ No trains for this route are predicted at {from_name} right now.\n"
+
+    if alerts is not None:
+        if alerts:
+            result += "\n🚨 **Alerts on your lines:**\n" + "\n".join(format_alert(incident) for incident in alerts)
+        else:
+            result += "\n✅ No service alerts on your lines.\n"
+
+    if outages is not None:
+        if outages:
+            result += "\n♿ **Elevator & escalator outages on your route:**\n"
+            for outage in outages:
+                station_name = STATIONS.name(outage.get("StationCode", ""), outage.get("StationName", ""))
+                result += (f"• **{station_name}** - {outage.get('UnitType', 'Equipment')}: "
+                           f"{outage.get('SymptomDescription', 'No details available')}\n")
+        else:
+            result += "\n✅ Elevators and escalators on your route are working.\n"
+
+    if omitted:
+        result += "\n⏳ **Not included:** " + ", ".join(
+            f"{TRIP_PLAN_PARTS[part]} ({reason})" for part, reason in omitted.items())
+        result += ". Try again shortly or use the individual tools.\n"
+    return result + next((format_stale_note(data) for data in feeds.values() if STALE_AGE_KEY in data), "")
+
+@instrumented_tool()
+async def get_fare_matrix(origins: List[str], destinations: List[str]) -> str:
+    """
+    Get fares and travel times between many origin and destination stations in one call.
+    
+    Args:
+        origins: Starting station names or codes (e.g., ["Union Station", "Rosslyn"])
+        destinations: Destination station names or codes (e.g., ["Pentagon", "A03"])
+    
+    Returns:
+        Travel time and peak/off-peak fares for every origin-destination pair
+    """
+    if len(origins) * len(destinations) > 400:
+        return "❌ Too many pairs requested. Please ask for at most 400 origin-destination pairs at once."
+
+    resolved = {}
+    unknown = []
+    for station in [*origins, *destinations]:
+        if station not in resolved:
+            station_code = get_station_code(station)
+            if station_code:
+                resolved[station] = station_code
+            elif station not in unknown:
+                unknown.append(station)
+
+    matrix = await get_station_matrix()
+    if matrix is None:
+        return "❌ Unable to get fare information. The service may be unavailable."
+
+    if JSON_OUTPUT:
+        fares = []
+        for origin in origins:
+            for destination in destinations:
+                if origin not in resolved or destination not in resolved:
+                    continue
+                from_code, to_code = resolved[origin], resolved[destination]
+                if STATIONS.codes(from_code) == STATIONS.codes(to_code):
+                    continue
+                info = matrix.lookup(from_code, to_code) or {}
+                fare = info.get("RailFare", {})
+                fares.append((from_code, to_code, info.get("RailTime"), fare.get("PeakTime"),
+                              fare.get("OffPeakTime")))
+        return to_json(FareMatrixOut(fares=fares, not_found=unknown or None))
+
+    result = "💳 **Fares and Travel Times**\n"
+    for origin in origins:
+        if origin not in resolved:
+            continue
+        from_code = resolved[origin]
+        result += f"\n🚉 **From {STATIONS.name(from_code, origin)}:**\n"
+        for destination in destinations:
+            if destination not in resolved:
+                continue
+            to_code = resolved[destination]
+            to_name = STATIONS.name(to_code, destination)
+            if STATIONS.codes(from_code) == STATIONS.codes(to_code):
+                continue
+            info = matrix.lookup(from_code, to_code)
+            if info is None:
+                result += f"• {to_name}: no information available\n"
+                continue
+            fare = info["RailFare"]
+            result += f"• {to_name}: {info['RailTime']} min"
+            if "PeakTime" in fare:
+                result += f", ${fare['PeakTime']:.2f} peak"
+            if "OffPeakTime" in fare:
+                result += f", ${fare['OffPeakTime']:.2f} off-peak"
+            result += "\n"
+
+    if unknown:
+        result += f"\n❌ Not found: {', '.join(unknown)}"
+    return result
+
+@instrumented_tool()
 async def get_service_alerts() -> str:
     """
     Get current Metro service alerts and incidents.
@@ -470,65 +4048,543 @@ async def get_service_alerts() -> str:
     Returns:
         Current service disruptions and alerts
     """
-    url = f"{WMATA_API_BASE}/Incidents.svc/json/Incidents"
-    data = await make_wmata_request(url)
+    data, age = await get_feed("incidents")
 
     if not data or "Incidents" not in data:
         return "❌ Unable to get service alerts."
 
     incidents = data["Incidents"]
+    alert_tracker.load(data)
+
+    if JSON_OUTPUT:
+        return to_json(AlertsOut(alerts=[alert_out(incident) for incident in incidents], token=alert_tracker.token(),
+                                 **data_ages(data, age)))
     
     if not incidents:
-        return "✅ No current service alerts. All Metro services are operating normally."
+        return "✅ No current service alerts. All Metro services are operating normally." + format_stale_note(data)
 
-    alerts = []
-    for incident in incidents:
-        incident_type = incident.get("IncidentType", "Unknown")
-        description = incident.get("Description", "No description available")
-        lines_affected = incident.get("LinesAffected", "Unknown")
-        
-        alert = f"⚠️ **{incident_type}**"
-        if lines_affected and lines_affected != "Unknown":
-            line_names = [LINE_COLORS.get(line, line) for line in lines_affected.split(";")]
-            alert += f" - {', '.join(line_names)}"
-        alert += f"\n{description}\n"
-        alerts.append(alert)
+    alerts = [format_alert(incident) for incident in incidents]
+
+    return ("🚨 **Current Metro Service Alerts:**\n\n" + "\n".join(alerts)
+            + format_data_age(age) + format_stale_note(data)
+            + f"\n\n🔖 Change token: `{alert_tracker.token()}` (pass to get_service_alert_changes)")
+
+@instrumented_tool()
+async def get_service_alert_changes(since: str = "") -> str:
+    """
+    Get only the service alerts that changed since an earlier check.
+    
+    Cheaper than get_service_alerts for monitoring: pass the token from the
+    previous call and only added, updated and resolved incidents come back.
+    
+    Args:
+        since: Change token from get_service_alerts or a previous call; empty for everything
+    
+    Returns:
+        Added, updated and resolved alerts plus a token for the next call
+    """
+    data, age = await get_feed("incidents")
+
+    if not data or "Incidents" not in data:
+        return "❌ Unable to get service alerts."
+
+    alert_tracker.load(data)
+    changes = alert_tracker.changes_since(since)
+    token = alert_tracker.token()
+
+    if JSON_OUTPUT:
+        return to_json(AlertChangesOut(token=token, reset=changes.reset or None,
+                                       added=[alert_out(incident) for incident in changes.added] or None,
+                                       updated=[alert_out(incident) for incident in changes.updated] or None,
+                                       removed=[alert_out(incident) for incident in changes.removed] or None,
+                                       **data_ages(data, age)))
 
-    return "🚨 **Current Metro Service Alerts:**\n\n" + "\n".join(alerts)
+    footer = f"\n🔖 Next token: `{token}`" + format_data_age(age) + format_stale_note(data)
+    if not (changes.added or changes.updated or changes.removed):
+        if changes.reset:
+            return "✅ No current service alerts." + footer
+        return "✅ No alert changes since your last check." + footer
 
-@mcp.tool()
-async def get_elevator_outages() -> str:
+    result = "🔄 **Service alert changes**"
+    if changes.reset:
+        result += " (full list; the token was missing or expired)"
+    result += "\n"
+    for heading, incidents in (("🆕 **New:**", changes.added), ("✏️ **Updated:**", changes.updated),
+                               ("✅ **Resolved:**", changes.removed)):
+        if incidents:
+            result += f"\n{heading}\n" + "\n".join(format_alert(incident) for incident in incidents)
+    return result + footer
+
+@instrumented_tool()
+async def get_elevator_outages(station: str = "", line: str = "", unit_type: str = "") -> str:
     """
     Get current elevator and escalator outages affecting accessibility.
     
+    Filter by station, line or unit type to get just the outages that matter
+    instead of the full systemwide list.
+    
+    Args:
+        station: Optional station name or code (e.g., "Union Station", "B03")
+        line: Optional line code or color (e.g., "RD", "Blue")
+        unit_type: Optional "elevator" or "escalator"
+    
     Returns:
-        List of accessibility equipment outages
+        Matching accessibility equipment outages with counts
     """
-    url = f"{WMATA_API_BASE}/Incidents.svc/json/ElevatorIncidents"
-    data = await make_wmata_request(url)
+    station_code = None
+    if station.strip():
+        station_code = get_station_code(station)
+        if not station_code:
+            return f"❌ Station '{station}' not found." + suggest_stations(station)
+    line_code = None
+    if line.strip():
+        line_code = resolve_line(line)
+        if not line_code:
+            return f"❌ Unknown line '{line}'. Use a line code or color: {', '.join(LINE_COLORS)}."
+    if unit_type.strip() and OutageIndex.unit_type(unit_type) not in ("ELEVATOR", "ESCALATOR"):
+        return f"❌ Unknown unit type '{unit_type}'. Use \"elevator\" or \"escalator\"."
+
+    data, age = await get_feed("elevator_incidents")
 
     if not data or "ElevatorIncidents" not in data:
         return "❌ Unable to get elevator status information."
 
-    outages = data["ElevatorIncidents"]
+    outage_index.load(data)
+    outages = outage_index.find(station_code, line_code, unit_type.strip() or None)
+    counts = outage_index.counts(outages)
+
+    if JSON_OUTPUT:
+        return to_json(OutagesOut(total=len(outage_index.outages), counts=counts,
+                                  outages=[outage_row(outage) for outage in outages], **data_ages(data, age)))
+
+    scope = []
+    if station_code:
+        scope.append(f"at {STATIONS.name(station_code, station)}")
+    if line_code:
+        scope.append(f"on the {LINE_COLORS[line_code]}")
+    where = " " + " ".join(scope) if scope else ""
     
     if not outages:
-        return "✅ All elevators and escalators are currently operational."
+        if unit_type.strip():
+            return (f"✅ No {OutageIndex.unit_type(unit_type).lower()} outages{where}."
+                    + format_data_age(age) + format_stale_note(data))
+        return (f"✅ All elevators and escalators{where} are currently operational."
+                + format_data_age(age) + format_stale_note(data))
 
     accessibility_alerts = []
     for outage in outages:
-        station_code = outage.get("StationCode", "")
-        station_name = next((name for name, code in STATION_MAPPING.items() if code == station_code), 
-                           outage.get("StationName", "Unknown Station"))
-        unit_type = outage.get("UnitType", "Equipment")
+        outage_station = outage.get("StationCode", "")
+        station_name = STATIONS.name(outage_station, outage.get("StationName", "Unknown Station"))
+        outage_type = outage.get("UnitType", "Equipment")
         description = outage.get("SymptomDescription", "No details available")
         
-        alert = f"♿ **{station_name}** - {unit_type} Issue\n{description}\n"
+        alert = f"♿ **{station_name}** - {outage_type} Issue\n{description}\n"
         accessibility_alerts.append(alert)
 
-    return "🛗 **Elevator & Escalator Outages:**\n\n" + "\n".join(accessibility_alerts)
+    summary = ", ".join(f"{n} {kind.lower()}{'s' if n != 1 else ''}" for kind, n in sorted(counts.items()))
+    header = f"🛗 **Elevator & Escalator Outages{where}:** {summary}"
+    if scope or unit_type.strip():
+        header += f" ({len(outage_index.outages)} systemwide)"
+    return (header + "\n\n" + "\n".join(accessibility_alerts)
+            + format_data_age(age) + format_stale_note(data))
+
+@instrumented_tool()
+async def get_trains_between(from_station: str, to_station: str) -> str:
+    """
+    Get the trains currently running between two stations on the same line.
+    
+    Args:
+        from_station: Station name or code (e.g., "Rosslyn", "C05")
+        to_station: Station name or code on a shared line (e.g., "Foggy Bottom")
+    
+    Returns:
+        Trains between the stations in each direction, with where each one is
+        and roughly how many minutes it is from the station it is heading to
+    """
+    from_code = get_station_code(from_station)
+    if not from_code:
+        return f"❌ Station '{from_station}' not found." + suggest_stations(from_station)
+    to_code = get_station_code(to_station)
+    if not to_code:
+        return f"❌ Station '{to_station}' not found." + suggest_stations(to_station)
+    if STATIONS.codes(from_code) == STATIONS.codes(to_code):
+        return "❌ Origin and destination are the same station."
+    from_name, to_name = STATIONS.name(from_code, from_station), STATIONS.name(to_code, to_station)
+    lines = [line for line in STATIONS.lines(from_code) if line in STATIONS.lines(to_code)]
+    if not lines:
+        return (f"❌ {from_name} and {to_name} are not on the same line. "
+                f"Use get_station_to_station_info to plan a route between them.")
+
+    data, age = await refresh_train_positions()
+    if data is None:
+        return "❌ Unable to get train positions."
+
+    circuits = train_positions.circuits
+    # train id -> (train, heading to the destination, minutes away or None if it terminates first,
+    #              last station, next station, riding minutes to the end it is heading for)
+    found: Dict[str, tuple[TrainState, bool, float | None, str | None, str | None, float]] = {}
+    for line in lines:
+        start, end = circuits.offset(line, from_code), circuits.offset(line, to_code)
+        if start is None or end is None:
+            continue
+        forward = 1 if end > start else -1
+        for train in train_positions.between(line, min(start, end), max(start, end)):
+            if train.train_id in found or not train.in_service:
+                continue
+            position = circuits.positions[line][train.circuit]
+            # Compare headings on the train's own line, which may run the other way along shared track
+            own_start, own_end = circuits.offset(train.line, from_code), circuits.offset(train.line, to_code)
+            destination = circuits.offset(line, train.destination) if train.destination else None
+            if own_start is not None and own_end is not None and own_start != own_end:
+                toward = train.heading == (1 if own_end > own_start else -1)
+            elif destination is not None and destination != position:
+                toward = (destination > position) == (forward > 0)
+            else:
+                toward = train.heading == forward
+            heading = forward if toward else -forward
+            last_station, next_station = circuits.neighbours(line, position, heading)
+            if train.station:
+                last_station = next_station = train.station
+            distance = abs((end if toward else start) - position)
+            reaches = (own_end if toward else own_start) is not None
+            found[train.train_id] = (train, toward, distance if reaches else None, last_station, next_station,
+                                     distance)
+
+    toward_to = sorted((item for item in found.values() if item[1]), key=lambda item: item[5])
+    toward_from = sorted((item for item in found.values() if not item[1]), key=lambda item: item[5])
+
+    if JSON_OUTPUT:
+        def rows(items):
+            return [(train.number, train.line, train.destination, train.cars, last_station, next_station,
+                     None if minutes is None else round(minutes, 1))
+                    for train, _, minutes, last_station, next_station, _ in items]
+        return to_json(TrainsBetweenOut(origin=from_code, destination=to_code, toward_destination=rows(toward_to),
+                                        toward_origin=rows(toward_from), **data_ages(data, age)))
+
+    footer = format_data_age(age) + format_stale_note(data)
+    if not found:
+        return f"ℹ️ No trains are between {from_name} and {to_name} right now." + footer
+
+    def describe(train, minutes, last_station, next_station, target):
+        text = f"• {LINE_COLORS.get(train.line, train.line)} train"
+        if train.number:
+            text += f" {train.number}"
+        if train.destination:
+            text += f" to {STATIONS.name(train.destination, train.destination)}"
+        if train.cars:
+            text += f", {train.cars} cars"
+        if train.station:
+            text += f" - at {STATIONS.name(train.station, train.station)}"
+        elif last_station and next_station:
+            text += (f" - between {STATIONS.name(last_station, last_station)} "
+                     f"and {STATIONS.name(next_station, next_station)}")
+        if minutes is None:
+            return text + f", terminating before {target}\n"
+        return text + f", ~{max(1, round(minutes))} min from {target}\n"
+
+    line_names = ", ".join(LINE_COLORS[line].split()[0] for line in lines)
+    result = f"🚇 **Trains between {from_name} and {to_name}** ({line_names})\n"
+    for heading, items, target in (("➡️", toward_to, to_name), ("⬅️", toward_from, from_name)):
+        result += f"\n{heading} **Toward {target}:**\n"
+        if not items:
+            result += "• None right now\n"
+        for train, _, minutes, last_station, next_station, _ in items:
+            result += describe(train, minutes, last_station, next_station, target)
+    return result + footer
+
+@instrumented_tool()
+async def get_line_headways(line: str) -> str:
+    """
+    Get the current gaps between trains on a Metro line, in each direction.
+    
+    Headways are estimated from where every train is right now, using the
+    riding time between consecutive trains.
+    
+    Args:
+        line: Line code or color (e.g., "RD", "Blue")
+    
+    Returns:
+        Trains running, average headway and the longest gap in each direction
+    """
+    line_code = resolve_line(line)
+    if not line_code:
+        return f"❌ Unknown line '{line}'. Use a line code or color: {', '.join(LINE_COLORS)}."
+
+    data, age = await refresh_train_positions()
+    if data is None:
+        return "❌ Unable to get train positions."
+
+    codes = LINE_SEQUENCES[line_code]
+    headways = train_positions.headways(line_code)
+
+    if JSON_OUTPUT:
+        return to_json(HeadwaysOut(line=line_code, directions=[
+            HeadwayOut(toward=codes[-1] if headway.heading > 0 else codes[0], trains=headway.trains,
+                       average_min=round(headway.average, 1) if headway.gaps else None,
+                       longest_min=round(max(headway.gaps), 1) if headway.gaps else None,
+                       longest_between=list(headway.longest) if headway.longest else None)
+            for headway in headways
+        ], **data_ages(data, age)))
+
+    result = f"🚦 **{LINE_COLORS[line_code]} headways:**\n"
+    for headway in headways:
+        terminal = codes[-1] if headway.heading > 0 else codes[0]
+        result += f"\n{'➡️' if headway.heading > 0 else '⬅️'} **Toward {STATIONS.name(terminal, terminal)}:** "
+        if not headway.gaps:
+            result += f"{headway.trains} train{'s' if headway.trains != 1 else ''} running, too few to measure a headway\n"
+            continue
+        result += f"{headway.trains} trains, one every ~{headway.average:.1f} min on average\n"
+        gap = f"   Longest gap: ~{max(headway.gaps):.0f} min"
+        behind, ahead = headway.longest
+        if behind and ahead and behind != ahead:
+            gap += f", between {STATIONS.name(behind, behind)} and {STATIONS.name(ahead, ahead)}"
+        result += gap + "\n"
+    return result + format_data_age(age) + format_stale_note(data)
+
+def parse_clock(text: str) -> int | None:
+    """Minutes after midnight for a time such as "8", "08:30", "8am" or "5:30 pm" """
+    text = text.strip().lower().replace(" ", "").replace(".", "")
+    suffix = text[-2:] if text[-2:] in ("am", "pm") else ""
+    hours, _, minutes = text[:len(text) - len(suffix)].partition(":")
+    if not hours.isdigit() or (minutes and not (minutes.isdigit() and len(minutes) == 2)):
+        return None
+    hour, minute = int(hours), int(minutes or 0)
+    if suffix:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if suffix == "pm" else 0)
+    if hour > 24 or minute > 59 or hour * 60 + minute > 1440:
+        return None
+    return hour * 60 + minute
+
+def parse_time_window(start_time: str, end_time: str) -> tuple[int, int] | None | str:
+    """A (start, end) window in minutes after midnight, None for the whole day, or an error message"""
+    if not start_time.strip() and not end_time.strip():
+        return None
+    start = parse_clock(start_time) if start_time.strip() else 0
+    end = parse_clock(end_time) if end_time.strip() else 1440
+    for text, value in ((start_time, start), (end_time, end)):
+        if value is None:
+            return f"❌ Could not read the time '{text}'. Use a time such as 08:00, 8am or 5:30pm."
+    return start, end
+
+def format_window(window: tuple[int, int] | None) -> str | None:
+    if window is None:
+        return None
+    return "-".join(f"{minutes // 60:02d}:{minutes % 60:02d}" for minutes in window)
+
+def prediction_log_filters(station: str, line: str, start_time: str,
+                           end_time: str) -> tuple[str | None, str | None, tuple[int, int] | None, str | None]:
+    """Station code, line code and time window for a prediction log query, or an error message"""
+    if get_prediction_log() is None:
+        return None, None, None, ("❌ The prediction log is off. Set WMATA_PREDICTION_LOG=1 to start "
+                                  "recording predictions; these statistics need a few days of them.")
+    station_code = None
+    if station:
+        station_code = get_station_code(station)
+        if not station_code:
+            return None, None, None, f"❌ Station '{station}' not found." + suggest_stations(station)
+    line_code = None
+    if line:
+        line_code = resolve_line(line)
+        if not line_code:
+            return None, None, None, f"❌ Unknown line '{line}'. Use a line code or color: {', '.join(LINE_COLORS)}."
+    window = parse_time_window(start_time, end_time)
+    if isinstance(window, str):
+        return None, None, None, window
+    return station_code, line_code, window, None
+
+def describe_log_query(line_code: str | None, window: tuple[int, int] | None, weekdays_only: bool) -> str:
+    """The filters of a prediction log query as a short phrase"""
+    text = f" ({LINE_COLORS[line_code]})" if line_code else ""
+    if window is not None:
+        text += f", {format_window(window).replace('-', '–')}"
+    return text + (" on weekdays" if weekdays_only else "")
+
+@instrumented_tool()
+async def get_average_wait(station: str, line: str = "", start_time: str = "", end_time: str = "",
+                           days: int = 28, weekdays_only: bool = False) -> str:
+    """
+    Get the typical wait for a train at a station, measured from the prediction log.
+    
+    At every logged moment the wait is the minutes until the next train on
+    each platform; the figures summarise those moments over past days.
+    
+    Args:
+        station: Station name or code
+        line: Only count trains on this line, by code or color (optional)
+        start_time: Start of a time of day window, e.g. "8:00" or "8am" (optional)
+        end_time: End of the time of day window, e.g. "9:00" (optional)
+        days: How many past days to include (default 28)
+        weekdays_only: Only count Monday to Friday
+    
+    Returns:
+        Average, median and 90th percentile wait, and how much logged data they come from
+    """
+    station_code, line_code, window, error = prediction_log_filters(station, line, start_time, end_time)
+    if error:
+        return error
+    if not station_code:
+        return "❌ Name a station to measure waits at."
+
+    since = time.time() - max(1, days) * 86400
+    stats = prediction_log.wait_stats(since, STATIONS.codes(station_code), line_code, window, weekdays_only)
+    station_name = STATIONS.name(station_code, station)
+
+    if JSON_OUTPUT:
+        return to_json(AverageWaitOut(
+            station=station_code, line=line_code, window=format_window(window), weekdays_only=weekdays_only,
+            samples=stats.samples, days=stats.days,
+            average_min=round(stats.average, 1) if stats.samples else None,
+            median_min=stats.median, p90_min=stats.p90))
+
+    heading = f"⏱️ **Wait for a train at {station_name}{describe_log_query(line_code, window, weekdays_only)}:**\n"
+    if not stats.samples:
+        return heading + f"\nNo logged predictions match in the last {days} days yet."
+    return (heading
+            + f"• Average: {stats.average:.1f} min\n"
+            + f"• Median: {stats.median:.0f} min\n"
+            + f"• 9 times out of 10: {stats.p90:.0f} min or less\n"
+            + f"\n📊 From {stats.samples:,} logged moments on {stats.days} day{'s' if stats.days != 1 else ''}")
+
+@instrumented_tool()
+async def get_train_lengths(line: str = "", station: str = "", start_time: str = "", end_time: str = "",
+                            days: int = 28, weekdays_only: bool = False) -> str:
+    """
+    Get how often trains of each length (6 or 8 cars) have been running, from the prediction log.
+    
+    Args:
+        line: Only count trains on this line, by code or color (optional)
+        station: Only count trains seen at this station (optional)
+        start_time: Start of a time of day window, e.g. "7am" (optional)
+        end_time: End of the time of day window, e.g. "10am" (optional)
+        days: How many past days to include (default 28)
+        weekdays_only: Only count Monday to Friday
+    
+    Returns:
+        Share of trains by number of cars and how many trains were counted
+    """
+    station_code, line_code, window, error = prediction_log_filters(station, line, start_time, end_time)
+    if error:
+        return error
+
+    since = time.time() - max(1, days) * 86400
+    counts, days_seen = prediction_log.train_lengths(
+        since, STATIONS.codes(station_code) if station_code else None, line_code, window, weekdays_only)
+    trains = sum(counts.values())
+
+    if JSON_OUTPUT:
+        return to_json(TrainLengthsOut(
+            station=station_code, line=line_code, window=format_window(window), weekdays_only=weekdays_only,
+            trains=trains, days=days_seen,
+            cars={str(cars): round(100 * count / trains, 1) for cars, count in sorted(counts.items())}))
+
+    where = f" at {STATIONS.name(station_code, station)}" if station_code else ""
+    heading = f"🚃 **Train lengths{where}{describe_log_query(line_code, window, weekdays_only)}:**\n"
+    if not trains:
+        return heading + f"\nNo trains were logged boarding in the last {days} days yet."
+    result = heading
+    for cars, count in sorted(counts.items(), key=lambda item: -item[1]):
+        result += f"• {cars} cars: {100 * count / trains:.0f}% ({count:,} trains)\n"
+    return result + f"\n📊 Counted from trains seen boarding on {days_seen} day{'s' if days_seen != 1 else ''}"
+
+def resolve_stations(stations: List[str]) -> tuple[List[str], List[str]]:
+    """Station codes for the names that resolve, in order, and the names that do not"""
+    codes, unknown = [], []
+    for station in stations:
+        station_code = get_station_code(station)
+        if station_code:
+            codes.append(station_code)
+        else:
+            unknown.append(station)
+    return codes, unknown
+
+@instrumented_tool()
+async def get_reachable_stations(stations: List[str], minutes: float = 20) -> str:
+    """
+    Get every station reachable by train within a time budget from one or more starting stations.
+    
+    Times are riding minutes plus a penalty for each change of line, not
+    counting the wait for the first train.
+    
+    Args:
+        stations: Starting station names or codes (e.g., ["Rosslyn"] or ["Rosslyn", "Union Station"])
+        minutes: Time budget in minutes (default 20)
+    
+    Returns:
+        Reachable stations ordered by travel time, with the closest starting station for each
+    """
+    codes, unknown = resolve_stations(stations)
+    if not codes:
+        return f"❌ None of the requested stations were found: {', '.join(unknown)}"
+    if minutes <= 0:
+        return "❌ The time budget must be more than 0 minutes."
+
+    times = await get_travel_times()
+    found = [(code, travel, origin) for code, travel, origin in times.reachable(codes, minutes)
+             if STATIONS.codes(code) not in {STATIONS.codes(start) for start in codes}]
+
+    if JSON_OUTPUT:
+        return to_json(ReachableOut(
+            origins=codes, budget_min=minutes,
+            stations=[(code, round(travel, 1), codes[origin]) for code, travel, origin in found],
+            not_found=unknown or None))
+
+    origin_names = ", ".join(STATIONS.name(code, code) for code in dict.fromkeys(codes))
+    result = f"🗺️ **Within {minutes:g} min of {origin_names}:** {len(found)} station{'s' if len(found) != 1 else ''}\n"
+    if not found:
+        result += "\nNo other station is that close by train.\n"
+    band_start = None
+    for code, travel, origin in found:
+        band = int(travel // 5) * 5
+        if band != band_start:
+            band_start = band
+            result += f"\n**{band}–{band + 5} min:**\n"
+        source = f" from {STATIONS.name(codes[origin], codes[origin])}" if len(set(codes)) > 1 else ""
+        result += f"• {STATIONS.name(code, code)}: {travel:.0f} min{source}\n"
+    if unknown:
+        result += f"\n⚠️ Not found: {', '.join(unknown)}\n"
+    return result + "\n💡 Riding time plus transfers; add the wait for the first train."
+
+@instrumented_tool()
+async def find_meetup_station(stations: List[str], limit: int = 5) -> str:
+    """
+    Find the best stations for a group to meet when everyone starts from a different station.
+    
+    Ranks every station by the longest trip anyone in the group would make,
+    breaking ties by the group's total travel time.
+    
+    Args:
+        stations: Each person's starting station name or code; repeat a station for people starting together
+        limit: How many candidate stations to list (default 5)
+    
+    Returns:
+        The fairest meeting stations with each person's travel time
+    """
+    codes, unknown = resolve_stations(stations)
+    if unknown:
+        return f"❌ Stations not found: {', '.join(unknown)}" + suggest_stations(unknown[0])
+    if len(codes) < 2:
+        return "❌ Give at least two starting stations."
+
+    times = await get_travel_times()
+    candidates = times.meetup(codes, max(1, min(limit, 20)))
+    if not candidates:
+        return "❌ No station can be reached from all of those stations."
 
-@mcp.tool()
+    if JSON_OUTPUT:
+        return to_json(MeetupOut(origins=codes, candidates=[
+            (code, round(longest, 1), round(total, 1), [round(travel, 1) for travel in each])
+            for code, longest, total, each in candidates]))
+
+    result = f"🤝 **Best places for {len(codes)} people to meet:**\n"
+    for rank, (code, longest, total, each) in enumerate(candidates, 1):
+        result += f"\n{rank}. **{STATIONS.name(code, code)}**: longest trip {longest:.0f} min, {total:.0f} min in total\n"
+        result += "   " + ", ".join(f"{STATIONS.name(start, start)} {travel:.0f} min"
+                                   for start, travel in zip(codes, each)) + "\n"
+    return result + "\n💡 Riding time plus transfers; add the wait for the first train."
+
+@instrumented_tool()
 async def get_station_info(station: str) -> str:
     """
     Get detailed information about a Metro station including amenities and features.
@@ -542,40 +4598,36 @@ async def get_station_info(station: str) -> str:
     station_code = get_station_code(station)
     
     if not station_code:
-        return f"❌ Station '{station}' not found."
+        return f"❌ Station '{station}' not found." + suggest_stations(station)
 
-    url = f"{WMATA_API_BASE}/Rail.svc/json/jStationInfo"
-    params = {"StationCode": station_code}
-    
-    data = await make_wmata_request(url, params)
+    data = static_data.by_code.get(station_code) if static_data is not None else None
+    if data is None:
+        url = f"{WMATA_API_BASE}/Rail.svc/json/jStationInfo"
+        params = {"StationCode": station_code}
+        
+        data = await make_wmata_request(url, params)
 
     if not data:
         return "❌ Unable to get station information."
 
     station_name = data.get("Name", "Unknown Station")
     address = data.get("Address", {})
+
+    if JSON_OUTPUT:
+        parking = data.get("Parking") or {}
+        return to_json(StationInfoOut(code=station_code, name=station_name, address=format_address(address),
+                                      lines=STATIONS.lines(station_code), lat=data.get("Lat"), lon=data.get("Lon"),
+                                      parking_spaces=parking.get("TotalCount") or None))
     
     info = f"🚉 **{station_name}** Station Information\n\n"
     
     # Address information
-    if address:
-        street = address.get("Street", "")
-        city = address.get("City", "")
-        state = address.get("State", "")
-        zip_code = address.get("Zip", "")
-        
-        if street:
-            info += f"📍 **Address:** {street}"
-            if city:
-                info += f", {city}"
-            if state:
-                info += f", {state}"
-            if zip_code:
-                info += f" {zip_code}"
-            info += "\n"
+    street_address = format_address(address)
+    if street_address:
+        info += f"📍 **Address:** {street_address}\n"
 
     # Lines served
-    lines_served = STATION_LINES.get(station_code, [])
+    lines_served = STATIONS.lines(station_code)
     if lines_served:
         line_names = [LINE_COLORS[line] for line in lines_served]
         info += f"🚇 **Lines:** {', '.join(line_names)}\n"
@@ -599,7 +4651,7 @@ async def get_station_info(station: str) -> str:
 
     return info
 
-@mcp.tool()
+@instrumented_tool()
 async def get_all_stations() -> str:
     """
     Get a list of all Metro stations organized by line.
@@ -607,8 +4659,11 @@ async def get_all_stations() -> str:
     Returns:
         Complete list of Metro stations by line
     """
-    url = f"{WMATA_API_BASE}/Rail.svc/json/jStations"
-    data = await make_wmata_request(url)
+    if static_data is not None:
+        data = {"Stations": static_data.stations}
+    else:
+        url = f"{WMATA_API_BASE}/Rail.svc/json/jStations"
+        data = await make_wmata_request(url)
 
     if not data or "Stations" not in data:
         return "❌ Unable to get station list."
@@ -631,6 +4686,18 @@ async def get_all_stations() -> str:
                     lines[line_code] = []
                 lines[line_code].append(f"{station_name} ({station_code})")
 
+    if JSON_OUTPUT:
+        names, directory = {}, {}
+        for station in sorted(stations, key=lambda station: station.get("Name", "")):
+            station_code = station.get("Code", "")
+            names[station_code] = station.get("Name", "Unknown")
+            for i in range(1, 5):
+                line_code = station.get(f"LineCode{i}")
+                if line_code in LINE_COLORS:
+                    directory.setdefault(line_code, []).append(station_code)
+        return to_json(StationDirectoryOut(
+            stations=names, lines={line: directory[line] for line in LINE_COLORS if line in directory}))
+
     result = "🚇 **Metro Station Directory**\n\n"
     
     for line_code in ["RD", "OR", "SV", "BL", "YL", "GR"]:
@@ -649,6 +4716,95 @@ async def get_all_stations() -> str:
 
     return result
 
+@instrumented_tool()
+async def search_stations(query: str, limit: int = 5) -> str:
+    """
+    Search for Metro stations by partial name, landmark, abbreviation or misspelling.
+    
+    Use this when a station name is ambiguous (e.g., "center", "Farragut") to see
+    every likely match in one call.
+    
+    Args:
+        query: Text to search for (e.g., "gwu", "dulles", "rosslin")
+        limit: Maximum number of matches to return (default: 5)
+    
+    Returns:
+        Ranked matching stations with their codes, lines and match scores
+    """
+    matches = STATION_SEARCH.search(query, max(1, min(limit, 20)))
+    if not matches:
+        return f"❌ No stations match '{query}'."
+
+    if JSON_OUTPUT:
+        return to_json(SearchOut(matches=[
+            SearchMatchOut(code=match.code, name=match.name, lines=STATIONS.lines(match.code), score=match.score,
+                           matched=match.matched if match.matched != match.name else None)
+            for match in matches
+        ]))
+
+    result = f"🔎 **Stations matching '{query}':**\n\n"
+    for match in matches:
+        line_names = ", ".join(LINE_COLORS[line] for line in STATIONS.lines(match.code))
+        result += f"• **{match.name}** ({match.code}) - {line_names} [score {match.score:.2f}"
+        if match.matched != match.name:
+            result += f", matched \"{match.matched}\""
+        result += "]\n"
+    return result
+
+@instrumented_tool()
+async def find_nearest_stations(latitude: float, longitude: float, limit: int = 3,
+                                radius_meters: float = 0) -> str:
+    """
+    Find the Metro stations and station entrances closest to a location.
+    
+    Args:
+        latitude: Latitude in decimal degrees (e.g., 38.8977)
+        longitude: Longitude in decimal degrees (e.g., -77.0365)
+        limit: Maximum number of stations and of entrances to return (default: 3)
+        radius_meters: Only include results within this distance; 0 for no limit
+    
+    Returns:
+        Nearest stations with distance, walking time and lines, plus the nearest entrances
+    """
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return "❌ Invalid coordinates. Latitude must be between -90 and 90 and longitude between -180 and 180."
+
+    indexes = await get_spatial_indexes()
+    if indexes is None:
+        return "❌ Unable to get station locations."
+
+    station_index, entrance_index = indexes
+    limit = max(1, min(limit, 20))
+    radius = radius_meters if radius_meters > 0 else None
+    stations = station_index.nearest(latitude, longitude, limit, radius)
+    entrances = entrance_index.nearest(latitude, longitude, limit, radius)
+
+    if JSON_OUTPUT:
+        return to_json(NearbyOut(
+            stations=[(code, STATIONS.name(code, code), round(meters), STATIONS.lines(code))
+                      for meters, code in stations],
+            entrances=[(entrance.get("StationCode1") or "", entrance.get("Name") or "", round(meters),
+                        entrance["Lat"], entrance["Lon"], entrance.get("Description"))
+                       for meters, entrance in entrances]))
+
+    if not stations:
+        return f"ℹ️ No Metro stations within {radius_meters:.0f} m of ({latitude:.5f}, {longitude:.5f})."
+
+    result = f"📍 **Metro stations nearest ({latitude:.5f}, {longitude:.5f}):**\n\n"
+    for meters, code in stations:
+        line_names = ", ".join(LINE_COLORS[line] for line in STATIONS.lines(code))
+        result += (f"• **{STATIONS.name(code, code)}** ({code}) - {format_distance(meters)}, "
+                   f"~{max(1, round(meters / WALKING_METERS_PER_MINUTE))} min walk - {line_names}\n")
+
+    if entrances:
+        result += "\n🚪 **Closest entrances:**\n"
+        for meters, entrance in entrances:
+            result += f"• {entrance.get('Name', 'Entrance')} - {format_distance(meters)}"
+            if entrance.get("Description"):
+                result += f" ({entrance['Description']})"
+            result += "\n"
+    return result
+
 # === RESOURCES ===
 
 @mcp.resource("wmata://system/map")
@@ -723,6 +4879,33 @@ TIPS:
 • Mobile apps offer trip planning and real-time info
 """
 
+@mcp.resource("wmata://cache/stats")
+async def get_cache_stats() -> str:
+    """Provides response cache hit/miss counters as JSON"""
+    stats = response_cache.stats()
+    if shared_cache is not None:
+        stats["shared"] = await shared_cache.stats()
+    if traffic_replay is not None:
+        stats["replay"] = traffic_replay.stats()
+    elif traffic_recorder is not None:
+        stats["recorded"] = traffic_recorder.records
+    return json.dumps(stats, indent=2)
+
+@mcp.resource("wmata://metrics")
+def get_metrics() -> str:
+    """Provides tool latency, upstream call, cache and circuit breaker metrics as JSON"""
+    return json.dumps(metrics.snapshot(), indent=2)
+
+@mcp.resource("wmata://metrics/prometheus", mime_type="text/plain")
+def get_prometheus_metrics() -> str:
+    """Provides the same metrics in the Prometheus text exposition format"""
+    return metrics.prometheus()
+
+@mcp.resource("wmata://quota")
+def get_quota() -> str:
+    """Provides the remaining WMATA API rate limit budget as JSON"""
+    return json.dumps(upstream_scheduler.quota(), indent=2)
+
 # === PROMPTS ===
 
 @mcp.prompt()
@@ -738,11 +4921,9 @@ def plan_trip(origin: str, destination: str, departure_time: str = "now") -> str
     return f"""I need to plan a Metro trip from {origin} to {destination}, departing {departure_time}. 
 
 Please help me by:
-1. Finding the best route between these stations
-2. Checking current service alerts that might affect my trip
-3. Getting live train predictions for my starting station
-4. Providing any accessibility information if needed
-5. Suggesting the best exit/entrance to use at my destination
+1. Calling the plan_trip tool once; it returns the route, travel time, fares, live trains at my starting station, service alerts on my lines and elevator/escalator outages along the way
+2. Filling in anything it lists under "Not included" with the individual tools
+3. Suggesting the best exit/entrance to use at my destination
 
 Also let me know about:
 - Estimated travel time
@@ -760,7 +4941,7 @@ def check_accessibility(station: str) -> str:
     """
     return f"""I need accessibility information for {station} station. Please provide:
 
-1. Current elevator and escalator status
+1. Current elevator and escalator status (get_elevator_outages with station="{station}" returns just this station's outages)
 2. Accessible entrance locations  
 3. Platform accessibility features
 4. Any current outages affecting accessibility
@@ -814,8 +4995,8 @@ def rush_hour_strategy(origin: str, destination: str, time_of_day: str) -> str:
     """
     return f"""I need to travel from {origin} to {destination} during {time_of_day}. Please help optimize my trip by:
 
-1. Finding the best route with minimal transfers
-2. Checking current train predictions and frequencies
+1. Calling the plan_trip tool for the route with the fewest transfers, live trains and alerts in one step
+2. Checking how often trains are running with get_line_headways for the lines on my route
 3. Identifying less crowded cars or boarding spots
 4. Suggesting optimal departure time to avoid peak crowding  
 5. Providing backup routes in case of delays
@@ -823,5 +5004,64 @@ def rush_hour_strategy(origin: str, destination: str, time_of_day: str) -> str:
 
 I want to minimize travel time and avoid the worst crowds during rush hour."""
 
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def http_transport_security(host: str):
+    """Host/Origin checks for the HTTP transports when bound to host
+
+    FastMCP only accepts loopback Host headers when constructed for a loopback
+    address, which would turn away every remote client of a server bound to
+    another address. A named address and WMATA_ALLOWED_HOSTS are allowed
+    explicitly; a wildcard bind without allowed hosts turns the check off.
+    """
+    from mcp.server.transport_security import TransportSecuritySettings
+
+    if host in LOOPBACK_HOSTS:
+        return mcp.settings.transport_security
+    names = list(HTTP_ALLOWED_HOSTS)
+    if host not in ("0.0.0.0", "::", ""):
+        names.append(f"[{host}]" if ":" in host else host)
+    if not names:
+        return TransportSecuritySettings(enable_dns_rebinding_protection=False)
+    names += ["127.0.0.1", "localhost", "[::1]"]
+    return TransportSecuritySettings(
+        allowed_hosts=[pattern for name in names for pattern in (name, f"{name}:*")],
+        allowed_origins=[f"{scheme}://{name}{port}" for name in names
+                         for scheme in ("http", "https") for port in ("", ":*")],
+    )
+
+
+async def serve_http(transport: str) -> None:
+    """Serve any number of sessions from this process over streamable HTTP or SSE"""
+    # Hold the shared resources for the whole run so the client, poller and
+    # static data outlive every individual session
+    async with shared_resources():
+        if transport == "sse":
+            await mcp.run_sse_async()
+        else:
+            await mcp.run_streamable_http_async()
+
 if __name__ == "__main__":
-    mcp.run(transport='stdio')
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WMATA Metro MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default=TRANSPORT)
+    parser.add_argument("--host", default=HTTP_HOST)
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    parser.add_argument("--log-level", default=mcp.settings.log_level,
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
+    parser.add_argument("--record", metavar="PATH", default=RECORD_PATH,
+                        help="append every upstream request and response to this archive")
+    parser.add_argument("--replay", metavar="PATH", default=REPLAY_PATH,
+                        help="answer upstream requests from this archive instead of calling WMATA")
+    parser.add_argument("--replay-speed", type=float, default=REPLAY_SPEED,
+                        help="replay clock speed-up; 0 replays without delays")
+    args = parser.parse_args()
+    RECORD_PATH, REPLAY_PATH, REPLAY_SPEED = args.record, args.replay, args.replay_speed
+    if args.transport == "stdio":
+        mcp.run(transport='stdio')
+    else:
+        mcp.settings.host, mcp.settings.port, mcp.settings.log_level = args.host, args.port, args.log_level
+        mcp.settings.transport_security = http_transport_security(args.host)
+        asyncio.run(serve_http(args.transport))
\ No newline at end of file